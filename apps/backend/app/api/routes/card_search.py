@@ -10,14 +10,17 @@ from app.core.card_search import build_card_query
 from app.core.config import db_settings, elasticsearch_settings
 from app.core.db import Database, get_db
 from app.core.elasticsearch import get_es
+from app.data_pipeline.partitions import split_id_ranges
 from app.models.api import (
     CardSearchParams,
     CardSearchResponse,
     OperationMessageResponse,
 )
-from app.models.db import ScryfallCardRecord
 from app.models.scryfall import ScryfallCard
-from app.services.card_indexer import index_cards
+from app.services.card_indexer import index_card_id_range
+
+# Concurrent cursors reading `_id` ranges of the cards collection while indexing
+INDEX_READERS = 4
 
 router = APIRouter(
     prefix="/cards/search",
@@ -72,32 +75,22 @@ async def index_cards_from_db(
     for attempt in range(max_retries):
         try:
             cards_collection = db.get_collection(db_settings.cards_collection)
-            cursor = cards_collection.find({})
-
-            total_success = 0
-            total_failed = 0
-            batch_size = db_settings.batch_size
-            current_batch = []
-
-            for record in cursor:
-                try:
-                    # Parse MongoDB record into ScryfallCardRecord (which includes mongo_id)
-                    rec = ScryfallCardRecord.model_validate(record)
-                    current_batch.append(rec)
-                except Exception as e:
-                    logger.warning(f"Failed to parse MongoDB record: {e}")
-                    total_failed += 1
-
-                if len(current_batch) >= batch_size:
-                    success, failed = await index_cards(current_batch, es)
-                    total_success += success
-                    total_failed += failed
-                    current_batch = []
-
-            if current_batch:
-                success, failed = await index_cards(current_batch, es)
-                total_success += success
-                total_failed += failed
+            id_ranges = await asyncio.to_thread(
+                split_id_ranges, cards_collection, parts=INDEX_READERS
+            )
+            results = await asyncio.gather(
+                *(
+                    index_card_id_range(
+                        cards_collection,
+                        id_range,
+                        es,
+                        batch_size=db_settings.batch_size,
+                    )
+                    for id_range in id_ranges
+                )
+            )
+            total_success = sum(success for success, _ in results)
+            total_failed = sum(failed for _, failed in results)
 
             return OperationMessageResponse(
                 message=f"Indexing completed: {total_success} succeeded, {total_failed} failed."
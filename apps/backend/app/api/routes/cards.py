@@ -7,6 +7,7 @@ import asyncio
 import json
 import re
 
+from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Depends
 
 from app.core.db import Database, get_db
@@ -34,11 +35,19 @@ def _normalize_card_id(raw_id: str) -> str:
     return value
 
 
+def _card_lookup_query(card_id: str) -> dict:
+    # Cards are addressed by Scryfall `id` (unique index); Mongo `_id` is accepted too
+    clauses: list[dict] = [{"id": card_id}, {"_id": card_id}]
+    if ObjectId.is_valid(card_id):
+        clauses.append({"_id": ObjectId(card_id)})
+    return {"$or": clauses}
+
+
 @router.get("/{id}", response_model=ScryfallCardRecord)
 async def fetch_card(id: str, db: Database = Depends(get_db)) -> ScryfallCardRecord:
 
     normalized_id = _normalize_card_id(id)
-    query = {"_id": normalized_id}
+    query = _card_lookup_query(normalized_id)
     card = await asyncio.to_thread(db.cards_collection.find_one, query)
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
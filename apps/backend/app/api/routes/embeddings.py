@@ -3,7 +3,11 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, Form, HTTPException, Query
 from loguru import logger
 
-from app.core.chunk_mappings import extract_chunk_mapping_fields
+from app.core.chunk_mappings import (
+    extract_chunk_mapping_fields,
+    named_chunk_templates,
+    parse_chunk_templates,
+)
 from app.core.db import Database, get_db
 from app.data_pipeline.embeddings.create_chunks import (
     run_pipeline_create_embedding_chunks,
@@ -25,14 +29,27 @@ router = APIRouter(
 def __create_embedding_chunks_params(
     source_collection: Annotated[str, Form()],
     target_collection: Annotated[str, Form()],
-    chunk_mappings: Annotated[str, Form()],
+    chunk_mappings: Annotated[str | None, Form()] = None,
+    chunk_templates: Annotated[str | None, Form()] = None,
     limit: Annotated[int | None, Query()] = None,
+    server_side: Annotated[bool, Form()] = False,
+    incremental: Annotated[bool, Form()] = False,
 ) -> CreateEmbeddingChunksParams:
+    try:
+        named_templates = parse_chunk_templates(chunk_templates)
+        named_chunk_templates(
+            chunk_mappings=chunk_mappings, chunk_templates=named_templates
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return CreateEmbeddingChunksParams(
         source_collection=source_collection,
         target_collection=target_collection,
-        chunk_mappings=chunk_mappings,
+        chunk_mappings=chunk_mappings or None,
+        chunk_templates=named_templates,
         limit=limit,
+        server_side=server_side,
+        incremental=incremental,
     )
 
 
@@ -40,11 +57,13 @@ def __generate_embeddings_params(
     target_collection: Annotated[str, Form()],
     limit: Annotated[int | None, Query()] = None,
     normalize: Annotated[bool, Form()] = True,
+    missing_only: Annotated[bool, Form()] = False,
 ) -> GenerateEmbeddingsParams:
     return GenerateEmbeddingsParams(
         collection=target_collection,
         limit=limit,
         normalize_embeddings=normalize,
+        missing_only=missing_only,
     )
 
 
@@ -65,8 +84,11 @@ async def create_embedding_chunks(
         collection_properties = set(
             db.get_collection_properties(collection=params.source_collection)
         )
-        mapped_fields = extract_chunk_mapping_fields(
-            chunk_mappings=params.chunk_mappings
+        mapped_fields: set[str] = set().union(
+            *(
+                extract_chunk_mapping_fields(chunk_mappings=chunk_mappings)
+                for chunk_mappings in params.named_chunk_mappings.values()
+            )
         )
         missing_fields = sorted(mapped_fields - collection_properties)
         if missing_fields:
@@ -82,8 +104,10 @@ async def create_embedding_chunks(
         run_pipeline_create_embedding_chunks(
             source_collection=params.source_collection,
             target_collection=params.target_collection,
-            chunk_mappings=params.chunk_mappings,
+            chunk_templates=params.named_chunk_mappings,
             limit=params.limit,
+            server_side=params.server_side,
+            incremental=params.incremental,
         )
         return OperationMessageResponse(
             message="Embeddings creation completed successfully."
@@ -108,6 +132,7 @@ async def generate_embeddings_from_chunks(
             target_collection=params.collection,
             normalize_embeddings=params.normalize_embeddings,
             limit=params.limit,
+            missing_only=params.missing_only,
         )
         return OperationMessageResponse(
             message="Embeddings creation completed successfully."
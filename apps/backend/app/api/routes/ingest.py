@@ -1,32 +1,167 @@
-from typing import Annotated
+import asyncio
+import shutil
+import tempfile
+from pathlib import Path
+from typing import IO, Annotated
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from elasticsearch import AsyncElasticsearch
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
 from fastapi.params import Query
 from loguru import logger
+from pydantic import TypeAdapter, ValidationError
 
+from app.core.chunk_mappings import named_chunk_templates, parse_chunk_templates
+from app.core.config import db_settings
+from app.core.elasticsearch import get_es
+from app.data_pipeline.ingestion.dataset_formats import (
+    detect_dataset_format,
+    iter_dataset_records,
+)
 from app.data_pipeline.ingestion.json_records import (
     run_pipeline_insert_json_dataset,
+    run_pipeline_insert_json_stream,
+    run_pipeline_insert_ndjson_parallel,
+)
+from app.data_pipeline.ingestion.oracle_cards import (
+    OracleBuildInProgressError,
+    run_pipeline_build_oracle_cards,
+)
+from app.data_pipeline.refresh import run_pipeline_refresh
+from app.models.api import (
+    BuildOracleCardsParams,
+    BuildOracleCardsResponse,
+    IngestJsonDatasetParams,
+    IngestJsonDatasetResponse,
+    RefreshPipelineParams,
+    RefreshPipelineResponse,
+)
+from app.models.ingestion import (
+    IngestionMode,
+    IngestionResult,
+    RecordFilter,
+    RecordRules,
 )
-from app.models.api import IngestJsonDatasetParams, OperationMessageResponse
 
 router = APIRouter(
     prefix="/data-pipeline/ingestion",
     tags=["Data pipeline", "Ingestion"],
 )
 
+record_filters_adapter: TypeAdapter[list[RecordFilter]] = TypeAdapter(
+    list[RecordFilter]
+)
+
+
+def _parse_field_list(value: str | None) -> list[str]:
+    if not value:
+        return []
+    return [field.strip() for field in value.split(",") if field.strip()]
+
+
+def _parse_record_filters(value: str | None) -> list[RecordFilter]:
+    """
+    Parses filters given as a JSON list, e.g.
+    `[{"field": "lang", "op": "eq", "value": "en"}]`.
+    """
+    if not value:
+        return []
+    try:
+        return record_filters_adapter.validate_json(value)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+
+
+def _record_rules(
+    params: IngestJsonDatasetParams | RefreshPipelineParams,
+) -> RecordRules:
+    return RecordRules(
+        include_fields=params.include_fields,
+        exclude_fields=params.exclude_fields,
+        filters=params.filters,
+    )
+
+
+def _derived_fields(
+    params: IngestJsonDatasetParams | RefreshPipelineParams,
+) -> list[str] | None:
+    # None computes every registered derived field, an empty list none of them
+    return None if params.derive_fields else []
+
 
 def _ingest_json_dataset_params(
     collection: Annotated[str, Form()],
     limit: Annotated[int | None, Query()] = None,
+    mode: Annotated[IngestionMode, Form()] = "upsert",
+    parallel: Annotated[bool, Form()] = False,
+    include_fields: Annotated[str | None, Form()] = None,
+    exclude_fields: Annotated[str | None, Form()] = None,
+    filters: Annotated[str | None, Form()] = None,
+    derive_fields: Annotated[bool, Form()] = True,
 ) -> IngestJsonDatasetParams:
-    return IngestJsonDatasetParams(collection=collection, limit=limit)
+    return IngestJsonDatasetParams(
+        collection=collection,
+        limit=limit,
+        mode=mode,
+        parallel=parallel,
+        include_fields=_parse_field_list(include_fields),
+        exclude_fields=_parse_field_list(exclude_fields),
+        filters=_parse_record_filters(filters),
+        derive_fields=derive_fields,
+    )
 
 
-@router.post("/json-records", response_model=OperationMessageResponse)
+def _ingest_ndjson_upload_in_parallel(
+    file_obj: IO, *, params: IngestJsonDatasetParams
+) -> IngestionResult:
+    # Worker processes need a real path they can open and seek independently
+    with tempfile.NamedTemporaryFile(suffix=".ndjson") as dataset_file:
+        shutil.copyfileobj(file_obj, dataset_file)
+        dataset_file.flush()
+        return run_pipeline_insert_ndjson_parallel(
+            path=Path(dataset_file.name),
+            collection=params.collection,
+            mode=params.mode,
+            rules=_record_rules(params),
+            derived_fields=_derived_fields(params),
+        )
+
+
+def _ingest_json_dataset_response(result: IngestionResult) -> IngestJsonDatasetResponse:
+    return IngestJsonDatasetResponse(
+        message="Dataset ingestion completed successfully.",
+        inserted=result.inserted,
+        updated=result.updated,
+        unchanged=result.unchanged,
+        filtered=result.filtered,
+        duplicates=result.duplicates,
+    )
+
+
+def _ingest_json_stream_params(
+    collection: Annotated[str, Query()],
+    limit: Annotated[int | None, Query()] = None,
+    mode: Annotated[IngestionMode, Query()] = "upsert",
+    include_fields: Annotated[str | None, Query()] = None,
+    exclude_fields: Annotated[str | None, Query()] = None,
+    filters: Annotated[str | None, Query()] = None,
+    derive_fields: Annotated[bool, Query()] = True,
+) -> IngestJsonDatasetParams:
+    return IngestJsonDatasetParams(
+        collection=collection,
+        limit=limit,
+        mode=mode,
+        include_fields=_parse_field_list(include_fields),
+        exclude_fields=_parse_field_list(exclude_fields),
+        filters=_parse_record_filters(filters),
+        derive_fields=derive_fields,
+    )
+
+
+@router.post("/json-records", response_model=IngestJsonDatasetResponse)
 async def ingest_json_records(
     params: Annotated[IngestJsonDatasetParams, Depends(_ingest_json_dataset_params)],
     file: Annotated[UploadFile, File()],
-) -> OperationMessageResponse:
+) -> IngestJsonDatasetResponse:
     logger.info(f"Ingesting JSON dataset into collection: {params.collection}")
 
     if not file.filename:
@@ -35,22 +170,210 @@ async def ingest_json_records(
 
     logger.info(f"Received file: {file.filename}, content_type: {file.content_type}")
 
-    if not file.filename.endswith(".json"):
-        raise HTTPException(status_code=400, detail="Only JSON files are supported.")
+    try:
+        dataset_format = detect_dataset_format(
+            filename=file.filename, content_type=file.content_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if params.parallel and not dataset_format.is_splittable:
+        raise HTTPException(
+            status_code=400,
+            detail="Parallel ingestion requires an uncompressed NDJSON file.",
+        )
 
     try:
         # file.file is a SpooledTemporaryFile which is file-like
         # We need to ensure we're at the beginning of the file, though usually we are
         file.file.seek(0)
 
-        await run_pipeline_insert_json_dataset(
+        if params.parallel and params.limit is None:
+            # Copying the upload and waiting on the pool both block
+            result = await asyncio.to_thread(
+                _ingest_ndjson_upload_in_parallel, file.file, params=params
+            )
+            return _ingest_json_dataset_response(result)
+        if params.parallel:
+            logger.info(
+                "Limit requested: ingesting sequentially instead of in parallel"
+            )
+
+        result = await run_pipeline_insert_json_dataset(
             file_obj=file.file,
             collection=params.collection,
             limit=params.limit,
+            dataset_format=dataset_format,
+            mode=params.mode,
+            rules=_record_rules(params),
+            derived_fields=_derived_fields(params),
+        )
+        return _ingest_json_dataset_response(result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:  # noqa: BLE001
+        logger.error(f"Ingestion failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
+
+
+@router.post("/json-records/stream", response_model=IngestJsonDatasetResponse)
+async def ingest_json_records_stream(
+    params: Annotated[IngestJsonDatasetParams, Depends(_ingest_json_stream_params)],
+    request: Request,
+) -> IngestJsonDatasetResponse:
+    """
+    Ingests a JSON dataset sent as the raw request body.
+    Records are parsed while the body is received, so nothing is spooled to disk.
+
+    The layout is taken from the content type (`application/json` or
+    `application/x-ndjson`) and compression from `Content-Encoding` (gzip, zstd).
+    """
+    logger.info(f"Ingesting JSON stream into collection: {params.collection}")
+
+    try:
+        dataset_format = detect_dataset_format(
+            content_type=request.headers.get("content-type"),
+            content_encoding=request.headers.get("content-encoding"),
         )
-        return OperationMessageResponse(
-            message="Dataset ingestion completed successfully."
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        result = await run_pipeline_insert_json_stream(
+            chunks=request.stream(),
+            collection=params.collection,
+            limit=params.limit,
+            dataset_format=dataset_format,
+            mode=params.mode,
+            rules=_record_rules(params),
+            derived_fields=_derived_fields(params),
         )
-    except Exception as e:
+        return _ingest_json_dataset_response(result)
+    except ValueError as e:
+        # Malformed JSON or a corrupt compressed body
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:  # noqa: BLE001
         logger.error(f"Ingestion failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
+
+
+def _build_oracle_cards_params(
+    source_collection: Annotated[str | None, Form()] = None,
+    target_collection: Annotated[str | None, Form()] = None,
+) -> BuildOracleCardsParams:
+    return BuildOracleCardsParams(
+        source_collection=source_collection or db_settings.cards_collection,
+        target_collection=target_collection or db_settings.oracle_cards_collection,
+    )
+
+
+@router.post("/oracle-cards", response_model=BuildOracleCardsResponse)
+async def build_oracle_cards(
+    params: Annotated[BuildOracleCardsParams, Depends(_build_oracle_cards_params)],
+) -> BuildOracleCardsResponse:
+    """
+    Builds (or refreshes) the oracle-level collection: one document per
+    `oracle_id` with its canonical printing and references to all printings.
+    Point the chunk and embedding pipelines at it to embed each card text once.
+    """
+    try:
+        result = run_pipeline_build_oracle_cards(
+            source_collection=params.source_collection,
+            target_collection=params.target_collection,
+        )
+        return BuildOracleCardsResponse(
+            message="Oracle cards build completed successfully.",
+            oracle_cards=result.oracle_cards,
+            removed=result.removed,
+        )
+    except OracleBuildInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:  # noqa: BLE001
+        logger.error(f"Oracle cards build failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Oracle cards build failed: {e}")
+
+
+def _refresh_pipeline_params(
+    collection: Annotated[str | None, Form()] = None,
+    target_collection: Annotated[str | None, Form()] = None,
+    chunk_mappings: Annotated[str | None, Form()] = None,
+    chunk_templates: Annotated[str | None, Form()] = None,
+    limit: Annotated[int | None, Query()] = None,
+    include_fields: Annotated[str | None, Form()] = None,
+    exclude_fields: Annotated[str | None, Form()] = None,
+    filters: Annotated[str | None, Form()] = None,
+    derive_fields: Annotated[bool, Form()] = True,
+    normalize: Annotated[bool, Form()] = True,
+    index_cards: Annotated[bool, Form()] = True,
+) -> RefreshPipelineParams:
+    try:
+        named_templates = named_chunk_templates(
+            chunk_mappings=chunk_mappings,
+            chunk_templates=parse_chunk_templates(chunk_templates),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return RefreshPipelineParams(
+        collection=collection or db_settings.cards_collection,
+        target_collection=target_collection or db_settings.card_embeddings_collection,
+        chunk_templates=named_templates,
+        limit=limit,
+        include_fields=_parse_field_list(include_fields),
+        exclude_fields=_parse_field_list(exclude_fields),
+        filters=_parse_record_filters(filters),
+        derive_fields=derive_fields,
+        normalize_embeddings=normalize,
+        index_cards=index_cards,
+    )
+
+
+@router.post("/refresh", response_model=RefreshPipelineResponse)
+async def refresh_cards(
+    params: Annotated[RefreshPipelineParams, Depends(_refresh_pipeline_params)],
+    file: Annotated[UploadFile, File()],
+    es: Annotated[AsyncElasticsearch, Depends(get_es)],
+) -> RefreshPipelineResponse:
+    """
+    Ingests a dataset and streams every changed card through chunking, embedding
+    and Elasticsearch indexing in a single pass, replacing separate calls to the
+    ingest, chunks, generate-from-chunks and search index endpoints.
+    """
+    logger.info(f"Refreshing collection {params.collection} from: {file.filename}")
+
+    try:
+        dataset_format = detect_dataset_format(
+            filename=file.filename or "", content_type=file.content_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        file.file.seek(0)
+        result = await run_pipeline_refresh(
+            iter_dataset_records(file.file, dataset_format=dataset_format),
+            collection=params.collection,
+            target_collection=params.target_collection,
+            chunk_templates=params.chunk_templates,
+            es=es if params.index_cards else None,
+            limit=params.limit,
+            rules=_record_rules(params),
+            derived_fields=_derived_fields(params),
+            normalize_embeddings=params.normalize_embeddings,
+        )
+        return RefreshPipelineResponse(
+            message="Refresh completed successfully.",
+            inserted=result.ingestion.inserted,
+            updated=result.ingestion.updated,
+            unchanged=result.ingestion.unchanged,
+            filtered=result.ingestion.filtered,
+            duplicates=result.ingestion.duplicates,
+            chunks_embedded=result.chunks_embedded,
+            indexed=result.indexed,
+            index_failed=result.index_failed,
+        )
+    except ValueError as e:
+        # Malformed records, surfaced by whichever stage read them
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:  # noqa: BLE001
+        logger.error(f"Refresh failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Refresh failed: {e}")
@@ -1,14 +1,14 @@
-from typing import Any, Dict, List
+from typing import Any
 
 from app.models.api import CardSearchParams
 
 
-def build_card_query(params: CardSearchParams) -> Dict[str, Any]:
+def build_card_query(params: CardSearchParams) -> dict[str, Any]:
     """
     Translates CardSearchParams into an Elasticsearch DSL query.
     """
-    must_clauses: List[Dict[str, Any]] = []
-    filter_clauses: List[Dict[str, Any]] = []
+    must_clauses: list[dict[str, Any]] = []
+    filter_clauses: list[dict[str, Any]] = []
 
     if params.query:
         must_clauses.append(
@@ -24,14 +24,34 @@ def build_card_query(params: CardSearchParams) -> Dict[str, Any]:
         filter_clauses.append({"term": {"set": params.set}})
 
     if params.released_at_from or params.released_at_to:
-        date_range: Dict[str, Any] = {}
+        date_range: dict[str, Any] = {}
         if params.released_at_from:
             date_range["gte"] = params.released_at_from
         if params.released_at_to:
             date_range["lte"] = params.released_at_to
         filter_clauses.append({"range": {"released_at": date_range}})
 
-    query: Dict[str, Any] = {"bool": {"must": must_clauses, "filter": filter_clauses}}
+    # Derived fields are precomputed at ingest, so these are plain term/range filters
+    if params.legal_format:
+        filter_clauses.append({"term": {"derived.legal_formats": params.legal_format}})
+
+    if params.card_type:
+        filter_clauses.append({"term": {"derived.types": params.card_type}})
+
+    if params.price_usd_min is not None or params.price_usd_max is not None:
+        price_range: dict[str, Any] = {}
+        if params.price_usd_min is not None:
+            price_range["gte"] = params.price_usd_min
+        if params.price_usd_max is not None:
+            price_range["lte"] = params.price_usd_max
+        filter_clauses.append({"range": {"derived.price_usd": price_range}})
+
+    if params.power_min is not None:
+        filter_clauses.append(
+            {"range": {"derived.power_value": {"gte": params.power_min}}}
+        )
+
+    query: dict[str, Any] = {"bool": {"must": must_clauses, "filter": filter_clauses}}
 
     # Handle pagination
     from_offset = (params.page - 1) * params.page_size
@@ -1,36 +1,129 @@
 import re
-from typing import Any, Dict
+from collections.abc import Iterable, Mapping
+from functools import lru_cache
+from typing import Any
 
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from app.core.hashing import hash_text
 from app.models.db import MongoCollectionRecord
 
 FIELD_TOKEN_PATTERN = re.compile(r"\{([A-Za-z_][A-Za-z0-9_.]*)\}")
 
+chunk_templates_adapter: TypeAdapter[dict[str, str]] = TypeAdapter(dict[str, str])
+
+
+class CompiledChunkMapping:
+    """
+    Render plan for a chunk mapping template. The template is validated and split
+    once into pre-escaped literal segments and pre-split field paths, so rendering
+    a record only walks the referenced fields of the raw document.
+    """
+
+    def __init__(self, chunk_mappings: str) -> None:
+        _validate_chunk_mapping_syntax(chunk_mappings=chunk_mappings)
+        literals: list[str] = []
+        paths: list[tuple[str, ...]] = []
+        current_pos = 0
+        for match in FIELD_TOKEN_PATTERN.finditer(chunk_mappings):
+            start, end = match.span()
+            literals.append(
+                escape_template_literal(value=chunk_mappings[current_pos:start])
+            )
+            paths.append(tuple(match.group(1).split(".")))
+            current_pos = end
+        literals.append(escape_template_literal(value=chunk_mappings[current_pos:]))
+
+        self.template = chunk_mappings
+        self.template_hash = hash_text(chunk_mappings)
+        self.fields = frozenset(".".join(path) for path in paths)
+        self._head = literals[0]
+        self._steps = list(zip(paths, literals[1:]))
+
+    @property
+    def projection(self) -> dict[str, int]:
+        """
+        MongoDB projection of the referenced fields. Nested paths covered by a
+        referenced parent are dropped, as MongoDB rejects colliding paths.
+        """
+        return fields_projection(self.fields)
+
+    def to_mongo_expression(self) -> dict[str, Any]:
+        """
+        Aggregation expression rendering the template inside MongoDB. It matches
+        `render` only for string or missing fields; callers must check the data.
+        """
+        parts: list[Any] = [{"$literal": self._head}]
+        for path, literal in self._steps:
+            parts.append({"$ifNull": [f"${'.'.join(path)}", ""]})
+            parts.append({"$literal": literal})
+        return {"$concat": [part for part in parts if part != {"$literal": ""}]}
+
+    def render(self, source_record: Mapping[str, Any]) -> str:
+        output_parts = [self._head]
+        for path, literal in self._steps:
+            field_value = _get_path_value(source_record, path)
+            output_parts.append("" if field_value is None else str(field_value))
+            output_parts.append(literal)
+        return "".join(output_parts)
+
+
+def fields_projection(fields: Iterable[str]) -> dict[str, int]:
+    """MongoDB projection of dotted field paths, without colliding nested paths."""
+    projection: dict[str, int] = {}
+    for field in sorted(set(fields)):
+        parts = field.split(".")
+        if any(".".join(parts[:i]) in projection for i in range(1, len(parts))):
+            continue
+        projection[field] = 1
+    return projection
+
+
+@lru_cache(maxsize=128)
+def compile_chunk_mapping(chunk_mappings: str) -> CompiledChunkMapping:
+    return CompiledChunkMapping(chunk_mappings)
+
+
+def parse_chunk_templates(value: str | None) -> dict[str, str]:
+    """
+    Parses named templates given as a JSON object, e.g.
+    `{"name": "Name: {name}", "rules": "{type_line}\n{oracle_text}"}`.
+    """
+    if not value:
+        return {}
+    try:
+        chunk_templates = chunk_templates_adapter.validate_json(value)
+    except ValidationError as e:
+        raise ValueError(f"Invalid chunk_templates: {e}") from e
+    if not all(name and template for name, template in chunk_templates.items()):
+        raise ValueError("chunk_templates names and templates are required")
+    return chunk_templates
+
+
+def named_chunk_templates(
+    *, chunk_mappings: str | None, chunk_templates: Mapping[str, str]
+) -> dict[str | None, str]:
+    """
+    Templates by chunk name from exactly one of a single unnamed
+    `chunk_mappings` template or named `chunk_templates`.
+    """
+    if bool(chunk_mappings) == bool(chunk_templates):
+        raise ValueError("Provide either chunk_mappings or chunk_templates")
+    if chunk_mappings:
+        return {None: chunk_mappings}
+    return {name: template for name, template in chunk_templates.items()}
+
 
 def extract_chunk_mapping_fields(*, chunk_mappings: str) -> set[str]:
-    _validate_chunk_mapping_syntax(chunk_mappings=chunk_mappings)
-    return set(FIELD_TOKEN_PATTERN.findall(chunk_mappings))
+    return set(compile_chunk_mapping(chunk_mappings).fields)
 
 
 def render_chunk_mapping(
-    source_record: MongoCollectionRecord, chunk_mappings: str
+    source_record: MongoCollectionRecord | Mapping[str, Any], chunk_mappings: str
 ) -> str:
-    _validate_chunk_mapping_syntax(chunk_mappings=chunk_mappings)
-
-    output_parts: list[str] = []
-    current_pos = 0
-    for match in FIELD_TOKEN_PATTERN.finditer(chunk_mappings):
-        start, end = match.span()
-        literal_segment = chunk_mappings[current_pos:start]
-        field_name = match.group(1)
-
-        output_parts.append(escape_template_literal(value=literal_segment))
-
-        field_value = _get_nested_value(source_record, field_name=field_name)
-        output_parts.append("" if field_value is None else str(field_value))
-        current_pos = end
-
-    output_parts.append(escape_template_literal(value=chunk_mappings[current_pos:]))
-    return "".join(output_parts)
+    if isinstance(source_record, BaseModel):
+        source_record = source_record.model_dump()
+    return compile_chunk_mapping(chunk_mappings).render(source_record)
 
 
 def escape_template_literal(*, value: str) -> str:
@@ -53,12 +146,10 @@ def _validate_chunk_mapping_syntax(*, chunk_mappings: str) -> None:
         )
 
 
-def _get_nested_value(
-    source_record: MongoCollectionRecord, *, field_name: str
-) -> Any | None:
-    current: Dict[str, Any] | None = source_record.model_dump()
-    for part in field_name.split("."):
-        if not isinstance(current, dict):
+def _get_path_value(source_record: Mapping[str, Any], path: tuple[str, ...]) -> Any:
+    current: Any = source_record
+    for part in path:
+        if not isinstance(current, Mapping):
             return None
         current = current.get(part)
     return current
@@ -2,13 +2,19 @@ from functools import lru_cache
 from pathlib import Path
 from typing import Annotated, Literal
 
-from pydantic import AfterValidator, BaseModel, MongoDsn
+from pydantic import AfterValidator, BaseModel, Field, MongoDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from app.core.chunk_mappings import named_chunk_templates
+from app.models.ingestion import SUPPORTED_DATASET_SUFFIXES
+
 
 def _validate_json_file_type(value: Path) -> Path:
-    if value.suffix.lower() != ".json":
-        raise ValueError(f"Expected a .json file path, got: {value}")
+    if not value.name.lower().endswith(SUPPORTED_DATASET_SUFFIXES):
+        raise ValueError(
+            f"Expected a JSON dataset file ({', '.join(SUPPORTED_DATASET_SUFFIXES)}), "
+            f"got: {value}"
+        )
     return value
 
 
@@ -22,13 +28,18 @@ def _expand_optional_user_path(value: Path | None) -> Path | None:
     return value.expanduser()
 
 
-JsonFilePath = Annotated[Path, AfterValidator(_validate_json_file_type)]
+JsonFilePath = Annotated[
+    Path, AfterValidator(_expand_user_path), AfterValidator(_validate_json_file_type)
+]
 NormalizedPath = Annotated[Path, AfterValidator(_expand_user_path)]
 OptionalNormalizedPath = Annotated[
     Path | None, AfterValidator(_expand_optional_user_path)
 ]
 LlmProviderName = Literal["ollama", "zai", "llama_cpp"]
 EmbeddingProviderName = Literal["sentence_transformers", "openai"]
+EmbeddingBackendName = Literal["torch", "onnx"]
+# Instruction sets of the dynamic int8 quantization presets
+OnnxQuantizationName = Literal["arm64", "avx2", "avx512", "avx512_vnni"]
 
 
 class DatasetFileInput(BaseModel):
@@ -39,6 +50,7 @@ class DatabaseSettings(BaseModel):
     uri: MongoDsn
     name: str
     cards_collection: str
+    oracle_cards_collection: str
     card_embeddings_collection: str
     batch_size: int
 
@@ -49,6 +61,12 @@ class EmbeddingSettings(BaseModel):
     model_path: OptionalNormalizedPath
     model_dimensions: int
     vector_limit: int
+    cache_path: OptionalNormalizedPath
+    cache_max_mb: int
+    token_budget: int
+    backend: EmbeddingBackendName
+    onnx_quantization: OnnxQuantizationName | None
+    onnx_parity_min_similarity: float
 
 
 class LlmSettings(BaseModel):
@@ -65,6 +83,35 @@ class LlmSettings(BaseModel):
 class AppSettings(BaseModel):
     cors_origins: str
     embeddings_max_workers: int
+    embeddings_worker_memory_mb: int
+    pipeline_max_in_flight_batches: int | None
+    embeddings_dedup_cache_size: int
+
+
+class RefreshSettings(BaseModel):
+    """Concurrent workers per stage of the fused refresh pipeline."""
+
+    ingest_workers: int = Field(default=2, ge=1)
+    chunk_workers: int = Field(default=2, ge=1)
+    embed_workers: int = Field(default=1, ge=1)
+    index_workers: int = Field(default=2, ge=1)
+    # Batches buffered between two stages
+    queue_size: int = Field(default=4, ge=1)
+
+
+class LiveSyncSettings(BaseModel):
+    enabled: bool
+    chunk_mappings: str | None
+    chunk_templates: dict[str, str]
+    batch_size: int
+    max_await_ms: int
+
+    @property
+    def named_chunk_mappings(self) -> dict[str | None, str]:
+        """Templates by chunk name; an unnamed `chunk_mappings` has no name."""
+        return named_chunk_templates(
+            chunk_mappings=self.chunk_mappings, chunk_templates=self.chunk_templates
+        )
 
 
 class ElasticsearchSettings(BaseModel):
@@ -83,10 +130,17 @@ class Settings(BaseSettings):
 
     app_cors_origins: str = "http://localhost:3000"
     app_embeddings_max_workers: int = 4
+    # Memory budget of one embedding worker (model + batches), capped by cgroups
+    app_embeddings_worker_memory_mb: int = 1024
+    # Outstanding batches per pool run; defaults to two per worker process
+    app_pipeline_max_in_flight_batches: int | None = None
+    # Distinct summaries whose vectors each embedding worker keeps for a run
+    app_embeddings_dedup_cache_size: int = 20_000
 
     mongodb_uri: MongoDsn = MongoDsn("mongodb://localhost:27017/?directConnection=true&readPreference=primaryPreferred&serverSelectionTimeoutMS=5000")
     mongodb_db_name: str = "mtg"
     mongodb_cards_collection: str = "cards"
+    mongodb_oracle_cards_collection: str = "oracle_cards"
     mongodb_card_embeddings_collection: str = "card_embeddings"
     mongodb_batch_size: int = 500
 
@@ -97,6 +151,17 @@ class Settings(BaseSettings):
     )
     embedding_model_dimensions: int = 384
     embedding_vector_search_limit: int = 5
+    # Embeddings of previously seen texts, shared across runs; 0 MB disables it
+    embedding_cache_path: OptionalNormalizedPath = Path(
+        "models/cache/embeddings.sqlite3"
+    )
+    embedding_cache_max_mb: int = 1024
+    # Padded tokens per sentence_transformers forward pass (texts x longest text)
+    embedding_token_budget: int = 16_384
+    # sentence_transformers only: ONNX Runtime, optionally int8-quantized, for CPUs
+    embedding_backend: EmbeddingBackendName = "torch"
+    embedding_onnx_quantization: OnnxQuantizationName | None = None
+    embedding_onnx_parity_min_similarity: float = 0.98
 
     llm_rag_max_context_chars: int = 4000
     llm_provider: LlmProviderName
@@ -110,12 +175,25 @@ class Settings(BaseSettings):
     elasticsearch_url: str = "http://localhost:9200"
     elasticsearch_index_name: str = "cards"
 
+    refresh_ingest_workers: int = 2
+    refresh_chunk_workers: int = 2
+    refresh_embed_workers: int = 1
+    refresh_index_workers: int = 2
+    refresh_queue_size: int = 4
+
+    live_sync_enabled: bool = False
+    live_sync_chunk_mappings: str | None = None
+    live_sync_chunk_templates: dict[str, str] = {}
+    live_sync_batch_size: int = 100
+    live_sync_max_await_ms: int = 1000
+
     @property
     def database_settings(self) -> DatabaseSettings:
         return DatabaseSettings(
             uri=self.mongodb_uri,
             name=self.mongodb_db_name,
             cards_collection=self.mongodb_cards_collection,
+            oracle_cards_collection=self.mongodb_oracle_cards_collection,
             card_embeddings_collection=self.mongodb_card_embeddings_collection,
             batch_size=self.mongodb_batch_size,
         )
@@ -135,6 +213,12 @@ class Settings(BaseSettings):
             model_path=self.embedding_model_path,
             model_dimensions=self.embedding_model_dimensions,
             vector_limit=self.embedding_vector_search_limit,
+            cache_path=self.embedding_cache_path,
+            cache_max_mb=self.embedding_cache_max_mb,
+            token_budget=self.embedding_token_budget,
+            backend=self.embedding_backend,
+            onnx_quantization=self.embedding_onnx_quantization,
+            onnx_parity_min_similarity=self.embedding_onnx_parity_min_similarity,
         )
 
     @property
@@ -150,11 +234,34 @@ class Settings(BaseSettings):
             llm_api_key=self.llm_api_key,
         )
 
+    @property
+    def refresh_settings(self) -> RefreshSettings:
+        return RefreshSettings(
+            ingest_workers=self.refresh_ingest_workers,
+            chunk_workers=self.refresh_chunk_workers,
+            embed_workers=self.refresh_embed_workers,
+            index_workers=self.refresh_index_workers,
+            queue_size=self.refresh_queue_size,
+        )
+
+    @property
+    def live_sync_settings(self) -> LiveSyncSettings:
+        return LiveSyncSettings(
+            enabled=self.live_sync_enabled,
+            chunk_mappings=self.live_sync_chunk_mappings,
+            chunk_templates=self.live_sync_chunk_templates,
+            batch_size=self.live_sync_batch_size,
+            max_await_ms=self.live_sync_max_await_ms,
+        )
+
     @property
     def app_settings(self) -> AppSettings:
         return AppSettings(
             cors_origins=self.app_cors_origins,
             embeddings_max_workers=self.app_embeddings_max_workers,
+            embeddings_worker_memory_mb=self.app_embeddings_worker_memory_mb,
+            pipeline_max_in_flight_batches=self.app_pipeline_max_in_flight_batches,
+            embeddings_dedup_cache_size=self.app_embeddings_dedup_cache_size,
         )
 
 
@@ -169,3 +276,5 @@ db_settings = _settings.database_settings
 elasticsearch_settings = _settings.elasticsearch_settings
 embedding_settings = _settings.embedding_settings
 llm_settings = _settings.llm_settings
+refresh_settings = _settings.refresh_settings
+live_sync_settings = _settings.live_sync_settings
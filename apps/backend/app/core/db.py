@@ -1,12 +1,68 @@
 from loguru import logger
-from pymongo import MongoClient
+from pymongo import ASCENDING, MongoClient
 from fastapi import Request
-from pymongo.operations import SearchIndexModel
+from pymongo.operations import IndexModel, SearchIndexModel
 
 from app.core.config import db_settings, embedding_settings
+from app.core.hashing import CONTENT_HASH_FIELD
 from app.models.embedding import Similarity, similarity_to_mongo
 
 
+# Indexes every ingested records collection relies on: upserts and `/cards/{id}`
+# look records up by Scryfall `id`, delta ingestion by content hash.
+RECORD_INDEXES = [
+    IndexModel(
+        [("id", ASCENDING)],
+        name="id_unique",
+        unique=True,
+        partialFilterExpression={"id": {"$exists": True}},
+    ),
+    IndexModel([(CONTENT_HASH_FIELD, ASCENDING)], name="content_hash"),
+]
+
+ORACLE_ID_FIELD = "oracle_id"
+ORACLE_BUILD_ID_FIELD = "oracle_build_id"
+# Records whose `_id` is not a card's, e.g. oracle cards, name the card their
+# chunks point at so `source_id` resolves through `/cards/{id}`
+CHUNK_SOURCE_CARD_FIELD = "chunk_source_id"
+
+# `$merge` on `oracle_id` requires a unique index on it in the target collection
+ORACLE_CARD_INDEXES = [
+    IndexModel([(ORACLE_ID_FIELD, ASCENDING)], name="oracle_id_unique", unique=True),
+    IndexModel([("id", ASCENDING)], name="canonical_id"),
+    IndexModel([("printing_ids", ASCENDING)], name="printing_ids"),
+    IndexModel([(ORACLE_BUILD_ID_FIELD, ASCENDING)], name="oracle_build_id"),
+]
+
+
+CHUNK_SOURCE_ID_FIELD = "source_id"
+CHUNK_NAME_FIELD = "chunk_name"
+CHUNK_SUMMARY_HASH_FIELD = "summary_hash"
+# Set on chunks written without embeddings, unset once they are embedded
+EMBEDDINGS_PENDING_FIELD = "embeddings_pending"
+EMBEDDINGS_PENDING_INDEX = "embeddings_pending"
+
+# Live sync deletes and replaces the chunks of a source record by its id.
+# Resumable embedding runs read pending chunks in `_id` order; the partial index
+# only holds pending chunks, so it shrinks as a run progresses. Embedding runs
+# fan a vector out to the pending chunks sharing its summary hash. Search
+# lists the chunk names to query each template on its own.
+CHUNK_INDEXES = [
+    IndexModel([(CHUNK_SOURCE_ID_FIELD, ASCENDING)], name="source_id"),
+    IndexModel([(CHUNK_NAME_FIELD, ASCENDING)], name="chunk_name"),
+    IndexModel(
+        [(EMBEDDINGS_PENDING_FIELD, ASCENDING), ("_id", ASCENDING)],
+        name=EMBEDDINGS_PENDING_INDEX,
+        partialFilterExpression={EMBEDDINGS_PENDING_FIELD: True},
+    ),
+    IndexModel(
+        [(CHUNK_SUMMARY_HASH_FIELD, ASCENDING)],
+        name="pending_summary_hash",
+        partialFilterExpression={EMBEDDINGS_PENDING_FIELD: True},
+    ),
+]
+
+
 class Database:
     def __init__(self, db_client: MongoClient | None = None):
         if db_client is None:
@@ -23,6 +79,21 @@ class Database:
     def get_collection(self, name: str):
         return self.db[name]
 
+    def create_record_indexes(self, *, collection: str) -> None:
+        db_collection = self.get_collection(collection)
+        db_collection.create_indexes(RECORD_INDEXES)
+        logger.info(f"Ensured record indexes on collection: {collection}")
+
+    def create_oracle_card_indexes(self, *, collection: str) -> None:
+        db_collection = self.get_collection(collection)
+        db_collection.create_indexes(ORACLE_CARD_INDEXES)
+        logger.info(f"Ensured oracle card indexes on collection: {collection}")
+
+    def create_chunk_indexes(self, *, collection: str) -> None:
+        db_collection = self.get_collection(collection)
+        db_collection.create_indexes(CHUNK_INDEXES)
+        logger.info(f"Ensured chunk indexes on collection: {collection}")
+
     def get_collection_properties(
         self, *, collection: str, sample_size: int = 100
     ) -> list[str]:
@@ -52,7 +123,9 @@ class Database:
                         "numDimensions": num_dimensions,
                         "path": collection_embeddings_field,
                         "similarity": mongo_similarity,
-                    }
+                    },
+                    # Named chunk templates are searched one at a time
+                    {"type": "filter", "path": CHUNK_NAME_FIELD},
                 ]
             },
         )
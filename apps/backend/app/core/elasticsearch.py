@@ -43,6 +43,25 @@ CARD_INDEX_MAPPING = {
             "lang": {"type": "keyword"},
             "layout": {"type": "keyword"},
             "mana_cost": {"type": "keyword"},
+            "derived": {
+                "properties": {
+                    "mana_pips": {
+                        "properties": {
+                            color: {"type": "short"}
+                            for color in ("W", "U", "B", "R", "G", "C")
+                        }
+                    },
+                    "power_value": {"type": "float"},
+                    "toughness_value": {"type": "float"},
+                    "price_usd": {"type": "scaled_float", "scaling_factor": 100},
+                    "price_usd_foil": {"type": "scaled_float", "scaling_factor": 100},
+                    "price_eur": {"type": "scaled_float", "scaling_factor": 100},
+                    "legal_formats": {"type": "keyword"},
+                    "oracle_text_full": {"type": "text"},
+                    "types": {"type": "keyword"},
+                    "subtypes": {"type": "keyword"},
+                }
+            },
         }
     }
 }
@@ -60,6 +79,10 @@ async def init_elasticsearch(es: AsyncElasticsearch):
             await es.indices.create(index=index_name, body=CARD_INDEX_MAPPING)
         else:
             logger.info(f"Elasticsearch index already exists: {index_name}")
+            # New fields (e.g. derived ones) can be added to an existing mapping
+            await es.indices.put_mapping(
+                index=index_name, body=CARD_INDEX_MAPPING["mappings"]
+            )
     except Exception as e:
         logger.error(f"Failed to initialize Elasticsearch: {e}")
         # We don't want to crash the app if ES is not ready yet,
@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from loguru import logger
+
+from app.core.embeddings.provider import EmbeddingProvider, TokenCounter
+from app.core.hashing import hash_text
+
+# Key, timestamps and b-tree overhead of a cached vector, on top of its floats
+_ROW_OVERHEAD_BYTES = 160
+# Share of the entries evicted at once when the cache is full
+_EVICTION_FRACTION = 0.1
+# Share of the entries a process inserts between two checks of the cache size
+_EVICTION_CHECK_FRACTION = 0.01
+# Reads refresh an entry at most this often, so hits rarely need a write
+_TOUCH_INTERVAL_SECONDS = 3600.0
+
+
+class EmbeddingCache:
+    """
+    SQLite file of float32 vectors keyed by model and text hash. Reads refresh
+    the entry at most once per `_TOUCH_INTERVAL_SECONDS`, and the least
+    recently used entries are evicted once the cache holds more than
+    `max_entries`.
+    """
+
+    def __init__(self, path: Path, *, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._unchecked_inserts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite connections must not cross a fork: every process opens its own
+        if self._connection is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # Pool workers share the file: WAL lets readers run next to a writer
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model_key TEXT NOT NULL, text_hash TEXT NOT NULL, "
+                "vector BLOB NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (model_key, text_hash)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+            self._connection = connection
+            self._pid = os.getpid()
+            self._unchecked_inserts = 0
+        return self._connection
+
+    def get_many(
+        self, model_key: str, text_hashes: list[str]
+    ) -> dict[str, list[float]]:
+        if not text_hashes:
+            return {}
+        placeholders = ", ".join("?" for _ in text_hashes)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            rows = connection.execute(
+                "SELECT text_hash, vector, last_used FROM embeddings "
+                f"WHERE model_key = ? AND text_hash IN ({placeholders})",
+                [model_key, *text_hashes],
+            ).fetchall()
+            # Pool workers share the file: only stale entries take the write lock
+            stale = [
+                (now, model_key, text_hash)
+                for text_hash, _, last_used in rows
+                if now - last_used >= _TOUCH_INTERVAL_SECONDS
+            ]
+            if stale:
+                with connection:
+                    connection.executemany(
+                        "UPDATE embeddings SET last_used = ? "
+                        "WHERE model_key = ? AND text_hash = ?",
+                        stale,
+                    )
+        return {text_hash: array("f", vector).tolist() for text_hash, vector, _ in rows}
+
+    def put_many(self, model_key: str, vectors: dict[str, list[float]]) -> None:
+        if not vectors:
+            return
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings "
+                    "(model_key, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                    [
+                        (model_key, text_hash, array("f", vector).tobytes(), now)
+                        for text_hash, vector in vectors.items()
+                    ],
+                )
+                self._unchecked_inserts += len(vectors)
+                # Counting scans the table, so each process only counts after
+                # inserting a small share of the entries
+                if self._unchecked_inserts >= max(
+                    1, int(self.max_entries * _EVICTION_CHECK_FRACTION)
+                ):
+                    self._unchecked_inserts = 0
+                    self.__evict(connection)
+
+    def __evict(self, connection: sqlite3.Connection) -> None:
+        (entries,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if entries <= self.max_entries:
+            return
+        # Evicting a slice at once leaves room until the next count
+        evicted = (
+            entries - self.max_entries + int(self.max_entries * _EVICTION_FRACTION)
+        )
+        connection.execute(
+            "DELETE FROM embeddings WHERE (model_key, text_hash) IN ("
+            "SELECT model_key, text_hash FROM embeddings "
+            "ORDER BY last_used LIMIT ?)",
+            (evicted,),
+        )
+        logger.info(f"Evicted {evicted} least recently used cached embeddings")
+
+
+class CachedEmbeddingProvider(EmbeddingProvider):
+    """
+    Serves embeddings of texts seen before from an `EmbeddingCache` and only
+    sends the others to the wrapped provider.
+    """
+
+    def __init__(
+        self, provider: EmbeddingProvider, *, cache: EmbeddingCache, model_key: str
+    ) -> None:
+        self._provider = provider
+        self._cache = cache
+        self._model_key = model_key
+
+    @property
+    def max_tokens(self) -> int | None:
+        if isinstance(self._provider, TokenCounter):
+            return self._provider.max_tokens
+        return None
+
+    def embed_text(self, text: str, *, normalize: bool) -> list[float]:
+        vectors = self.embed_texts([text], normalize=normalize)
+        return vectors[0]
+
+    def embed_texts(self, texts: list[str], *, normalize: bool) -> list[list[float]]:
+        vectors, _ = self.embed_texts_counting_tokens(texts, normalize=normalize)
+        return vectors
+
+    def embed_texts_counting_tokens(
+        self, texts: list[str], *, normalize: bool
+    ) -> tuple[list[list[float]], list[int | None]]:
+        """
+        Token counts come from the wrapped provider's pass over the texts it
+        embeds: cached texts, and providers without a tokenizer, have none.
+        """
+        if not texts:
+            return [], []
+
+        model_key = f"{self._model_key}:normalize={normalize}"
+        text_hashes = [hash_text(text) for text in texts]
+        vectors = self._cache.get_many(model_key, list(dict.fromkeys(text_hashes)))
+
+        missing = {
+            text_hash: text
+            for text_hash, text in zip(text_hashes, texts, strict=True)
+            if text_hash not in vectors
+        }
+        token_counts: dict[str, int | None] = {}
+        if missing:
+            missing_texts = list(missing.values())
+            missing_counts: list[int | None]
+            if isinstance(self._provider, TokenCounter):
+                missing_vectors, missing_counts = (
+                    self._provider.embed_texts_counting_tokens(
+                        missing_texts, normalize=normalize
+                    )
+                )
+            else:
+                missing_vectors = self._provider.embed_texts(
+                    missing_texts, normalize=normalize
+                )
+                missing_counts = [None] * len(missing_texts)
+            embedded = dict(zip(missing, missing_vectors, strict=True))
+            self._cache.put_many(model_key, embedded)
+            vectors.update(embedded)
+            token_counts = dict(zip(missing, missing_counts, strict=True))
+
+        return (
+            [vectors[text_hash] for text_hash in text_hashes],
+            [token_counts.get(text_hash) for text_hash in text_hashes],
+        )
+
+
+def embedding_cache_entries(*, max_mb: int, dimensions: int) -> int:
+    """Vectors of `dimensions` float32 values that fit in `max_mb`."""
+    return max_mb * 2**20 // (dimensions * 4 + _ROW_OVERHEAD_BYTES)
@@ -0,0 +1,27 @@
+def plan_length_batches(
+    token_counts: list[int], *, token_budget: int, max_batch_size: int
+) -> list[list[int]]:
+    """
+    Groups text positions into batches of similar token length, longest first,
+    so each batch is padded to about its own length instead of the longest
+    text of the whole input. A batch grows while its padded size (texts x
+    longest text) fits `token_budget`, so short texts share large batches;
+    a text longer than the budget gets a batch of its own.
+    """
+    # Stable: texts of equal length keep their input order
+    order = sorted(range(len(token_counts)), key=lambda i: -token_counts[i])
+    batches: list[list[int]] = []
+    batch: list[int] = []
+    longest = 1
+    for position in order:
+        if batch and (
+            (len(batch) + 1) * longest > token_budget or len(batch) >= max_batch_size
+        ):
+            batches.append(batch)
+            batch = []
+        if not batch:
+            longest = max(token_counts[position], 1)
+        batch.append(position)
+    if batch:
+        batches.append(batch)
+    return batches
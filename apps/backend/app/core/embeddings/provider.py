@@ -1,9 +1,24 @@
-from typing import Protocol
+from typing import Protocol, runtime_checkable
 
 
 class EmbeddingProvider(Protocol):
-    def embed_text(self, text: str, *, normalize: bool) -> list[float]:
-        ...
+    def embed_text(self, text: str, *, normalize: bool) -> list[float]: ...
 
-    def embed_texts(self, texts: list[str], *, normalize: bool) -> list[list[float]]:
-        ...
+    def embed_texts(
+        self, texts: list[str], *, normalize: bool
+    ) -> list[list[float]]: ...
+
+
+@runtime_checkable
+class TokenCounter(Protocol):
+    """
+    Providers that report the tokens of the texts they embed, from the same
+    tokenizer pass, and whose inputs are cut at `max_tokens`.
+    """
+
+    @property
+    def max_tokens(self) -> int | None: ...
+
+    def embed_texts_counting_tokens(
+        self, texts: list[str], *, normalize: bool
+    ) -> tuple[list[list[float]], list[int | None]]: ...
@@ -1,3 +1,8 @@
+import json
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
 from functools import lru_cache
 from pathlib import Path
 
@@ -5,8 +10,116 @@ import torch as torch_module
 from loguru import logger
 from sentence_transformers import SentenceTransformer
 
+from app.core.config import EmbeddingBackendName, OnnxQuantizationName
+from app.core.embeddings.length_batching import plan_length_batches
 from app.core.embeddings.provider import EmbeddingProvider
 
+# Texts per forward pass, however short they are
+_MAX_BATCH_SIZE = 256
+
+# Short and long card texts the ONNX export is compared on against torch
+_PARITY_TEXTS = [
+    "Forest",
+    "Flying, vigilance",
+    "Lightning Bolt deals 3 damage to any target.",
+    "Draw two cards, then discard a card. Flashback {2}{U}",
+    (
+        "Creature — Elf Druid. {T}: Add {G}. Whenever you cast a creature spell with "
+        "mana value 4 or greater, you may search your library for a basic land card, "
+        "put it onto the battlefield tapped, then shuffle."
+    ),
+    (
+        "+1: Scry 2. −3: Return target creature to its owner's hand. −8: You get an "
+        'emblem with "Whenever an opponent casts their first spell each turn, '
+        'counter that spell."'
+    ),
+]
+
+
+def onnx_model_path(model_path: Path) -> Path:
+    """Directory of the ONNX export, next to the torch model."""
+    return model_path.with_name(f"{model_path.name}-onnx")
+
+
+def onnx_file_name(quantization: OnnxQuantizationName | None) -> str:
+    if quantization is None:
+        return "onnx/model.onnx"
+    return f"onnx/model_qint8_{quantization}.onnx"
+
+
+def _parity_failure_path(export_path: Path, *, file_name: str) -> Path:
+    """Marker of an export of `file_name` that failed the parity check."""
+    return export_path / f"{file_name}.parity-failed.json"
+
+
+def _raise_on_recorded_parity_failure(
+    failure_path: Path, *, model_name: str, parity_min_similarity: float
+) -> None:
+    """
+    Raises if the same model failed the parity check at this threshold, so a
+    restart does not export it again; a new model or a lower threshold does.
+    """
+    if not failure_path.exists():
+        return
+    failure = json.loads(failure_path.read_text())
+    if (
+        failure["model_name"] == model_name
+        and failure["similarity"] < parity_min_similarity
+    ):
+        raise RuntimeError(
+            "ONNX embedding model does not match the torch model: cosine "
+            f"similarity {failure['similarity']:.4f} < {parity_min_similarity} "
+            f"(recorded in {failure_path}; delete it to export again)"
+        )
+
+
+@contextmanager
+def _export_lock(export_path: Path) -> Iterator[None]:
+    """Exclusive lock on the ONNX export across processes, such as pool workers."""
+    import fcntl
+
+    export_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(export_path.with_name(f"{export_path.name}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _publish_export(staging_path: Path, export_path: Path, *, file_name: str) -> None:
+    """
+    Moves the checked export into place file by file. The model file goes last,
+    so a process that finds it also finds the tokenizer and config next to it.
+    """
+    model_file = Path(file_name)
+    files = [
+        path.relative_to(staging_path)
+        for path in staging_path.rglob("*")
+        if path.is_file()
+    ]
+    # Other ONNX variants written by the export were not checked
+    files = [path for path in files if path.suffix != ".onnx" or path == model_file]
+    for path in sorted(files, key=lambda path: path == model_file):
+        (export_path / path).parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staging_path / path, export_path / path)
+
+
+def parity_similarity(
+    reference: SentenceTransformer, candidate: SentenceTransformer
+) -> float:
+    """Lowest cosine similarity between the two models' vectors of `_PARITY_TEXTS`."""
+    reference_vectors, candidate_vectors = (
+        model.encode(
+            _PARITY_TEXTS,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        ).tolist()
+        for model in (reference, candidate)
+    )
+    return min(
+        sum(a * b for a, b in zip(expected, actual, strict=True))
+        for expected, actual in zip(reference_vectors, candidate_vectors, strict=True)
+    )
+
 
 class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
     def __init__(
@@ -15,9 +128,24 @@ class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
         model_name: str,
         model_path: Path | None,
         model_dimensions: int,
+        token_budget: int = 16_384,
+        backend: EmbeddingBackendName = "torch",
+        onnx_quantization: OnnxQuantizationName | None = None,
+        onnx_parity_min_similarity: float = 0.98,
     ) -> None:
         self._model_dimensions = model_dimensions
-        self._model = self._load_transformer(model_name=model_name, model_path=model_path)
+        self._token_budget = token_budget
+        if backend == "onnx":
+            self._model = self._load_onnx_transformer(
+                model_name=model_name,
+                model_path=model_path,
+                quantization=onnx_quantization,
+                parity_min_similarity=onnx_parity_min_similarity,
+            )
+        else:
+            self._model = self._load_transformer(
+                model_name=model_name, model_path=model_path
+            )
 
     @staticmethod
     @lru_cache(maxsize=8)
@@ -48,6 +176,149 @@ class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
         model.save(str(resolved_path))
         return model
 
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _load_onnx_transformer(
+        *,
+        model_name: str,
+        model_path: Path | None,
+        quantization: OnnxQuantizationName | None,
+        parity_min_similarity: float,
+    ) -> SentenceTransformer:
+        if model_path is None:
+            raise RuntimeError(
+                "EMBEDDING_MODEL_PATH is required for EMBEDDING_BACKEND=onnx"
+            )
+        try:
+            import onnxruntime  # type: ignore[import-not-found]
+        except ImportError as exc:  # pragma: no cover - depends on install
+            raise RuntimeError(
+                "onnxruntime is required for EMBEDDING_BACKEND=onnx: install "
+                '"sentence-transformers[onnx]"'
+            ) from exc
+
+        SentenceTransformerEmbeddingProvider.ensure_onnx_export(
+            model_name=model_name,
+            model_path=Path(model_path),
+            quantization=quantization,
+            parity_min_similarity=parity_min_similarity,
+        )
+        export_path = onnx_model_path(Path(model_path))
+        file_name = onnx_file_name(quantization)
+
+        # Uses the threads the worker pool granted this process, like torch
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = torch_module.get_num_threads()
+        logger.info(f"Loading ONNX embedding model: {export_path / file_name}")
+        return SentenceTransformer(
+            str(export_path),
+            device="cpu",
+            backend="onnx",
+            model_kwargs={
+                "file_name": file_name,
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options,
+            },
+        )
+
+    @staticmethod
+    def ensure_onnx_export(
+        *,
+        model_name: str,
+        model_path: Path,
+        quantization: OnnxQuantizationName | None,
+        parity_min_similarity: float,
+    ) -> None:
+        """
+        Exports the model to ONNX unless a checked export exists. Called before
+        a worker pool starts, so a failing export ends the run once instead of
+        in every worker.
+        """
+        export_path = onnx_model_path(model_path)
+        file_name = onnx_file_name(quantization)
+        if (export_path / file_name).exists():
+            return
+        # Processes starting together: one exports while the others wait
+        with _export_lock(export_path):
+            if (export_path / file_name).exists():
+                return
+            _raise_on_recorded_parity_failure(
+                _parity_failure_path(export_path, file_name=file_name),
+                model_name=model_name,
+                parity_min_similarity=parity_min_similarity,
+            )
+            # Not cached: only the export compares against the torch model
+            load_reference = (
+                SentenceTransformerEmbeddingProvider._load_transformer.__wrapped__
+            )
+            SentenceTransformerEmbeddingProvider._export_onnx(
+                reference=load_reference(model_name=model_name, model_path=model_path),
+                model_name=model_name,
+                model_path=model_path,
+                quantization=quantization,
+                parity_min_similarity=parity_min_similarity,
+            )
+
+    @staticmethod
+    def _export_onnx(
+        *,
+        reference: SentenceTransformer,
+        model_name: str,
+        model_path: Path,
+        quantization: OnnxQuantizationName | None,
+        parity_min_similarity: float,
+    ) -> None:
+        """
+        Exports the torch model at `model_path` to ONNX, optionally with dynamic
+        int8 quantization, and keeps the export only if its vectors match the
+        torch ones. The export is written and checked in a staging directory,
+        so processes loading the current export never see a partial or
+        rejected one. A rejected export is recorded next to where it would
+        have gone.
+        """
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        export_path = onnx_model_path(model_path)
+        file_name = onnx_file_name(quantization)
+        logger.info(f"Exporting embedding model to ONNX: {export_path / file_name}")
+        with tempfile.TemporaryDirectory(
+            dir=export_path.parent, prefix=f".{export_path.name}-"
+        ) as staging_dir:
+            onnx_model = SentenceTransformer(
+                str(model_path), device="cpu", backend="onnx"
+            )
+            onnx_model.save(staging_dir)
+            if quantization is not None:
+                export_dynamic_quantized_onnx_model(
+                    onnx_model,
+                    quantization,
+                    staging_dir,
+                    file_suffix=f"qint8_{quantization}",
+                )
+
+            candidate = SentenceTransformer(
+                staging_dir,
+                device="cpu",
+                backend="onnx",
+                model_kwargs={"file_name": file_name},
+            )
+            similarity = parity_similarity(reference, candidate)
+            failure_path = _parity_failure_path(export_path, file_name=file_name)
+            if similarity < parity_min_similarity:
+                failure_path.parent.mkdir(parents=True, exist_ok=True)
+                failure_path.write_text(
+                    json.dumps({"model_name": model_name, "similarity": similarity})
+                )
+                raise RuntimeError(
+                    "ONNX embedding model does not match the torch model: cosine "
+                    f"similarity {similarity:.4f} < {parity_min_similarity}"
+                )
+            _publish_export(Path(staging_dir), export_path, file_name=file_name)
+            failure_path.unlink(missing_ok=True)
+        logger.info(
+            f"ONNX export matches the torch model (min cosine similarity {similarity:.4f})"
+        )
+
     def _validate_dimensions(self, vectors: list[list[float]]) -> None:
         for vector in vectors:
             if len(vector) != self._model_dimensions:
@@ -56,20 +327,56 @@ class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
                     f"expected {self._model_dimensions}, got {len(vector)}"
                 )
 
+    @property
+    def max_tokens(self) -> int | None:
+        return self._model.max_seq_length
+
+    def count_tokens(self, texts: list[str]) -> list[int]:
+        """Tokens of each text including special tokens, before truncation."""
+        input_ids = self._model.tokenizer(
+            texts,
+            add_special_tokens=True,
+            truncation=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )["input_ids"]
+        return [len(ids) for ids in input_ids]
+
     def embed_text(self, text: str, *, normalize: bool) -> list[float]:
         vectors = self.embed_texts([text], normalize=normalize)
         return vectors[0]
 
     def embed_texts(self, texts: list[str], *, normalize: bool) -> list[list[float]]:
+        vectors, _ = self.embed_texts_counting_tokens(texts, normalize=normalize)
+        return vectors
+
+    def embed_texts_counting_tokens(
+        self, texts: list[str], *, normalize: bool
+    ) -> tuple[list[list[float]], list[int | None]]:
+        """Embeds `texts`, also returning the tokens of each one before truncation."""
         if not texts:
-            return []
+            return [], []
 
-        embeddings = self._model.encode(
-            texts,
-            show_progress_bar=False,
-            convert_to_numpy=True,
-            normalize_embeddings=normalize,
-        )
-        vectors = embeddings.tolist()
+        token_counts = self.count_tokens(texts)
+        # Inputs are truncated to the model limit, so padding never exceeds it
+        max_tokens = self.max_tokens
+        batch_lengths = [
+            min(count, max_tokens) if max_tokens else count for count in token_counts
+        ]
+        vectors: list[list[float]] = [[] for _ in texts]
+        for batch in plan_length_batches(
+            batch_lengths,
+            token_budget=self._token_budget,
+            max_batch_size=_MAX_BATCH_SIZE,
+        ):
+            embeddings = self._model.encode(
+                [texts[position] for position in batch],
+                batch_size=len(batch),
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=normalize,
+            )
+            for position, vector in zip(batch, embeddings.tolist(), strict=True):
+                vectors[position] = vector
         self._validate_dimensions(vectors)
-        return vectors
+        return vectors, list(token_counts)
@@ -1,6 +1,11 @@
 from functools import lru_cache
 
 from app.core.config import llm_settings, embedding_settings
+from app.core.embeddings.cache import (
+    CachedEmbeddingProvider,
+    EmbeddingCache,
+    embedding_cache_entries,
+)
 from app.core.embeddings.openai import OpenAIEmbeddingProvider
 from app.core.embeddings.provider import EmbeddingProvider
 from app.core.embeddings.sentence_transformers import (
@@ -10,6 +15,61 @@ from app.core.embeddings.sentence_transformers import (
 
 @lru_cache(maxsize=1)
 def get_embedding_provider() -> EmbeddingProvider:
+    provider = _create_embedding_provider()
+    if embedding_settings.cache_path is None or embedding_settings.cache_max_mb <= 0:
+        return provider
+
+    model_key = (
+        f"{embedding_settings.provider}:{embedding_settings.model_name}:"
+        f"{embedding_settings.model_dimensions}"
+    )
+    if (
+        embedding_settings.provider == "sentence_transformers"
+        and embedding_settings.backend != "torch"
+    ):
+        # Exported and quantized models return slightly different vectors
+        model_key += (
+            f":{embedding_settings.backend}:"
+            f"{embedding_settings.onnx_quantization or 'fp32'}"
+        )
+
+    return CachedEmbeddingProvider(
+        provider,
+        cache=EmbeddingCache(
+            embedding_settings.cache_path,
+            max_entries=embedding_cache_entries(
+                max_mb=embedding_settings.cache_max_mb,
+                dimensions=embedding_settings.model_dimensions,
+            ),
+        ),
+        model_key=model_key,
+    )
+
+
+def prepare_embedding_model() -> None:
+    """
+    Runs the one-off ONNX export and its parity check before a worker pool
+    starts, where a failure would otherwise be repeated by every worker.
+    """
+    if (
+        embedding_settings.provider != "sentence_transformers"
+        or embedding_settings.backend != "onnx"
+    ):
+        return
+    if embedding_settings.model_path is None:
+        raise RuntimeError(
+            "EMBEDDING_MODEL_PATH is required for EMBEDDING_BACKEND=onnx"
+        )
+
+    SentenceTransformerEmbeddingProvider.ensure_onnx_export(
+        model_name=embedding_settings.model_name,
+        model_path=embedding_settings.model_path,
+        quantization=embedding_settings.onnx_quantization,
+        parity_min_similarity=embedding_settings.onnx_parity_min_similarity,
+    )
+
+
+def _create_embedding_provider() -> EmbeddingProvider:
     provider = embedding_settings.provider
 
     if provider == "sentence_transformers":
@@ -17,6 +77,10 @@ def get_embedding_provider() -> EmbeddingProvider:
             model_name=embedding_settings.model_name,
             model_path=embedding_settings.model_path,
             model_dimensions=embedding_settings.model_dimensions,
+            token_budget=embedding_settings.token_budget,
+            backend=embedding_settings.backend,
+            onnx_quantization=embedding_settings.onnx_quantization,
+            onnx_parity_min_similarity=embedding_settings.onnx_parity_min_similarity,
         )
 
     if provider == "openai":
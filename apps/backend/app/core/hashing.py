@@ -0,0 +1,27 @@
+import hashlib
+import json
+from collections.abc import Iterable
+from typing import Any
+
+CONTENT_HASH_FIELD = "content_hash"
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_record(record: dict[str, Any], *, exclude: Iterable[str] = ()) -> str:
+    """
+    Stable hash of a JSON-like record: keys are sorted so field order in the
+    source dataset does not change the result.
+    """
+    excluded = {"_id", CONTENT_HASH_FIELD, *exclude}
+    payload = {key: value for key, value in record.items() if key not in excluded}
+    canonical = json.dumps(
+        payload,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hash_text(canonical)
@@ -1,4 +1,5 @@
 import json
+import time
 from typing import Any, Iterator
 
 from fastapi import Depends
@@ -6,7 +7,7 @@ from fastapi import Depends
 from loguru import logger
 
 from app.core.config import llm_settings, embedding_settings
-from app.core.db import Database, get_db
+from app.core.db import CHUNK_NAME_FIELD, Database, get_db
 from app.core.embeddings.utils import get_embedding_provider
 from app.core.llms.utils import (
     get_llm_provider,
@@ -25,48 +26,133 @@ from app.models.api import (
 from app.models.embedding import CardEmbeddingVectorSearchResult
 
 
+# Reciprocal rank fusion constant; damps the weight of the very first ranks
+RRF_K = 60
+# Chunk names only change when chunks are rebuilt, so queries share them
+CHUNK_NAMES_TTL_SECONDS = 300.0
+
+_chunk_names_cache: dict[str, tuple[float, list[str | None]]] = {}
+
+
+def fuse_chunk_results(
+    chunk_results: list[CardEmbeddingVectorSearchResult], *, limit: int
+) -> list[SearchResult]:
+    """
+    Fuses chunk matches into one result per source card with reciprocal rank
+    fusion: every chunk name (e.g. name, rules, type) is ranked on its own and
+    a card scores `sum(1 / (RRF_K + rank))` over the chunks it matched with.
+    Chunks are expected in descending score order per chunk name, as
+    `$vectorSearch` returns them. The summaries of a card's matched chunks are
+    joined, best first. `score` stays the card's best chunk similarity and the
+    fusion score, which orders the results, is `fused_score`.
+    """
+    ranks: dict[str | None, int] = {}
+    fused_scores: dict[str, float] = {}
+    scores: dict[str, float] = {}
+    summaries: dict[str, list[str]] = {}
+    for chunk in chunk_results:
+        rank = ranks.get(chunk.chunk_name, 0) + 1
+        ranks[chunk.chunk_name] = rank
+        fused_scores[chunk.source_id] = fused_scores.get(chunk.source_id, 0.0) + 1 / (
+            RRF_K + rank
+        )
+        scores[chunk.source_id] = max(
+            scores.get(chunk.source_id, chunk.score), chunk.score
+        )
+        card_summaries = summaries.setdefault(chunk.source_id, [])
+        if chunk.summary not in card_summaries:
+            card_summaries.append(chunk.summary)
+
+    ranked_ids = sorted(
+        fused_scores, key=lambda source_id: fused_scores[source_id], reverse=True
+    )
+    return [
+        SearchResult(
+            source_id=source_id,
+            summary="\n".join(summaries[source_id]),
+            score=scores[source_id],
+            fused_score=fused_scores[source_id],
+        )
+        for source_id in ranked_ids[:limit]
+    ]
+
+
 class RagSearch:
     def __init__(self, db: Database):
         self.db = db
 
-    def __vector_search(
-        self,
-        query_vector: list[float],
-    ) -> list[SearchResult]:
-        vector_limit = embedding_settings.vector_limit
+    def __chunk_names(self) -> list[str | None]:
+        collection = self.db.embeddings_collection
+        cached = _chunk_names_cache.get(collection.name)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        # Served from the `chunk_name` index
+        chunk_names = collection.distinct(CHUNK_NAME_FIELD)
+        _chunk_names_cache[collection.name] = (
+            time.monotonic() + CHUNK_NAMES_TTL_SECONDS,
+            chunk_names,
+        )
+        return chunk_names
 
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "vector_index",
-                    "queryVector": query_vector,
-                    "path": "embeddings",
-                    "exact": True,
-                    "limit": vector_limit,
-                }
-            },
+    @staticmethod
+    def __chunk_search(
+        query_vector: list[float], *, chunk_filter: dict[str, Any] | None
+    ) -> list[dict[str, Any]]:
+        vector_search: dict[str, Any] = {
+            "index": "vector_index",
+            "queryVector": query_vector,
+            "path": "embeddings",
+            "exact": True,
+            "limit": embedding_settings.vector_limit,
+        }
+        if chunk_filter is not None:
+            vector_search["filter"] = chunk_filter
+        return [
+            {"$vectorSearch": vector_search},
             {
                 "$project": {
                     "_id": 0,
                     "source_id": 1,
+                    "chunk_name": 1,
                     "summary": 1,
                     "score": {"$meta": "vectorSearchScore"},
                 }
             },
         ]
-        raw_results = list(self.db.embeddings_collection.aggregate(pipeline))
-        results: list[SearchResult] = []
-        for raw_result in raw_results:
-            embedding_record = CardEmbeddingVectorSearchResult.model_validate(
-                raw_result
-            )
-            results.append(
-                SearchResult(
-                    source_id=embedding_record.source_id,
-                    summary=embedding_record.summary,
-                    score=embedding_record.score,
-                )
-            )
+
+    def __vector_search(
+        self,
+        query_vector: list[float],
+    ) -> list[SearchResult]:
+        collection = self.db.embeddings_collection
+
+        # Each template gets its own top k, so a card's name, type and rules
+        # chunks do not compete for the same slots. Unnamed chunks, which may
+        # lack the field altogether, are matched by the null filter.
+        chunk_names = self.__chunk_names()
+        chunk_filters: list[dict[str, Any] | None] = [None]
+        if len(chunk_names) > 1:
+            chunk_filters = [
+                {CHUNK_NAME_FIELD: {"$eq": chunk_name}}
+                for chunk_name in dict.fromkeys([*chunk_names, None])
+            ]
+
+        # One round trip: the other templates' searches join the first one
+        first_search, *other_searches = (
+            self.__chunk_search(query_vector, chunk_filter=chunk_filter)
+            for chunk_filter in chunk_filters
+        )
+        pipeline = first_search + [
+            {"$unionWith": {"coll": collection.name, "pipeline": search}}
+            for search in other_searches
+        ]
+        chunk_results = [
+            CardEmbeddingVectorSearchResult.model_validate(raw_result)
+            for raw_result in collection.aggregate(pipeline)
+        ]
+        results = fuse_chunk_results(
+            chunk_results, limit=embedding_settings.vector_limit
+        )
         logger.debug(results)
         return results
 
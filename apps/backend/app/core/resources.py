@@ -0,0 +1,64 @@
+import math
+import os
+from pathlib import Path
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# cgroup v1 reports "no limit" as a page-aligned value close to 2**63
+_UNLIMITED_MEMORY_BYTES = 2**60
+
+
+def _read_cgroup_file(*names: str) -> str | None:
+    for name in names:
+        try:
+            return (CGROUP_ROOT / name).read_text().strip()
+        except OSError:
+            continue
+    return None
+
+
+def cgroup_cpu_limit() -> float | None:
+    """CPU quota of the container in cores, or None when unlimited."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read_cgroup_file("cpu.max")
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota == "max":
+            return None
+        return int(quota) / int(period or 100_000)
+
+    # cgroup v1: a quota of -1 means unlimited
+    cfs_quota = _read_cgroup_file(
+        "cpu/cpu.cfs_quota_us", "cpu,cpuacct/cpu.cfs_quota_us"
+    )
+    cfs_period = _read_cgroup_file(
+        "cpu/cpu.cfs_period_us", "cpu,cpuacct/cpu.cfs_period_us"
+    )
+    if cfs_quota is None or cfs_period is None or int(cfs_quota) <= 0:
+        return None
+    return int(cfs_quota) / int(cfs_period)
+
+
+def cgroup_memory_limit() -> int | None:
+    """Memory limit of the container in bytes, or None when unlimited."""
+    limit = _read_cgroup_file("memory.max", "memory/memory.limit_in_bytes")
+    if limit is None or limit == "max":
+        return None
+    limit_bytes = int(limit)
+    return None if limit_bytes >= _UNLIMITED_MEMORY_BYTES else limit_bytes
+
+
+def available_cpus() -> int:
+    """
+    Cores this process may use: the CPU affinity mask capped by the cgroup
+    quota. `os.cpu_count()` reports the host cores inside containers.
+    """
+    cpus = (
+        len(os.sched_getaffinity(0))
+        if hasattr(os, "sched_getaffinity")
+        else os.cpu_count() or 1
+    )
+    quota = cgroup_cpu_limit()
+    if quota is not None:
+        cpus = min(cpus, math.floor(quota))
+    return max(cpus, 1)
@@ -1,20 +1,37 @@
 import multiprocessing
-import os
+from collections.abc import Iterator
 from functools import partial
-from typing import Iterator, Optional
+from typing import Any
 
+from bson import ObjectId
 from loguru import logger
-from pymongo import ReplaceOne
-
-from app.core.chunk_mappings import render_chunk_mapping
-from app.core.config import db_settings
-from app.core.db import Database
-from app.models.db import (
-    EmptyEmbeddingRecord,
-    MongoCollectionRecord,
+from pymongo import ReplaceOne, UpdateOne
+
+from app.core.chunk_mappings import (
+    CompiledChunkMapping,
+    compile_chunk_mapping,
+    fields_projection,
+)
+from app.core.config import app_settings, db_settings
+from app.core.db import (
+    CHUNK_SOURCE_CARD_FIELD,
+    EMBEDDINGS_PENDING_FIELD,
+    Database,
+)
+from app.core.hashing import hash_text
+from app.data_pipeline.partitions import IdRange, iter_id_range_batches, split_id_ranges
+from app.data_pipeline.workers import (
+    BoundedImap,
+    default_max_in_flight,
+    initialize_worker,
+    plan_worker_pool,
 )
+from app.models.db import EmptyEmbeddingRecord
 
-_db_instance: Optional[Database] = None
+_db_instance: Database | None = None
+
+# BSON types a server-side `$concat` renders exactly like the Python path
+_SERVER_SIDE_TYPES = ["string", "missing", "null"]
 
 
 def _get_db() -> Database:
@@ -24,12 +41,18 @@ def _get_db() -> Database:
     return _db_instance
 
 
+def _reset_db_instance() -> None:
+    # MongoClient is not fork-safe: every worker process opens its own connection
+    global _db_instance
+    _db_instance = None
+
+
 def __upsert_records(
     collection: str,
     records: list[EmptyEmbeddingRecord],
-) -> None:
+) -> list[EmptyEmbeddingRecord]:
     if not records:
-        return
+        return []
 
     db_collection = _get_db().get_collection(collection)
 
@@ -44,24 +67,93 @@ def __upsert_records(
 
     db_collection.bulk_write(operations, ordered=False)
     logger.info(f"Upserted {len(records)} records ready for embeddings")
+    return records
+
+
+def __upsert_changed_records(
+    collection: str,
+    records: list[EmptyEmbeddingRecord],
+) -> list[EmptyEmbeddingRecord]:
+    """
+    Rewrites only chunks whose rendered summary changed, which resets their
+    embeddings. Unchanged chunks keep their embeddings; if only the template
+    changed, just the stored template hash is updated. Returns the rewritten
+    chunks.
+    """
+    if not records:
+        return []
+
+    db_collection = _get_db().get_collection(collection)
+    stored_chunks = {
+        doc["_id"]: doc
+        for doc in db_collection.find(
+            {"_id": {"$in": [rec.mongo_id for rec in records]}},
+            {"summary": 1, "summary_hash": 1, "template_hash": 1},
+        )
+    }
+
+    operations: list[ReplaceOne | UpdateOne] = []
+    rewritten: list[EmptyEmbeddingRecord] = []
+    for rec in records:
+        stored = stored_chunks.get(rec.mongo_id)
+        if stored is None or _stored_summary_hash(stored) != rec.summary_hash:
+            rewritten.append(rec)
+            operations.append(
+                ReplaceOne(
+                    {"_id": rec.mongo_id},
+                    rec.model_dump(by_alias=True, exclude_none=True),
+                    upsert=True,
+                )
+            )
+        elif stored.get("template_hash") != rec.template_hash:
+            operations.append(
+                UpdateOne(
+                    {"_id": rec.mongo_id},
+                    {"$set": {"template_hash": rec.template_hash}},
+                )
+            )
+
+    if operations:
+        db_collection.bulk_write(operations, ordered=False)
+    logger.info(
+        f"Updated {len(operations)} of {len(records)} chunks "
+        f"({len(records) - len(operations)} unchanged)"
+    )
+    return rewritten
+
+
+def _stored_summary_hash(stored_chunk: dict[str, Any]) -> str | None:
+    # Chunks rendered server-side store no hash; compare their summary instead
+    summary_hash = stored_chunk.get("summary_hash")
+    if summary_hash is None and isinstance(stored_chunk.get("summary"), str):
+        return hash_text(stored_chunk["summary"])
+    return summary_hash
 
 
 def __load_db_records(
-    source_collection: str, *, limit: Optional[int] = None
-) -> Iterator[list[MongoCollectionRecord]]:
+    source_collection: str,
+    *,
+    projection: dict[str, int],
+    limit: int | None = None,
+) -> Iterator[list[dict[str, Any]]]:
+    """
+    Loads raw source documents in batches, projected server-side to the fields
+    the chunk mapping references, so only those are transferred, decoded and
+    pickled to the pool workers.
+    """
     db_collection = _get_db().get_collection(source_collection)
     logger.debug(
-        f"Loading records from collection: {source_collection} with limit {limit}"
+        f"Loading records from collection: {source_collection} with limit {limit} "
+        f"and projection {projection}"
     )
-    cursor = db_collection.find()
+    cursor = db_collection.find({}, projection)
 
     if limit is not None:
         cursor = cursor.limit(limit)
 
-    batch: list[MongoCollectionRecord] = []
+    batch: list[dict[str, Any]] = []
     for record in cursor:
-        mongo_rec = MongoCollectionRecord.model_validate(record, extra="allow")
-        batch.append(mongo_rec)
+        batch.append(record)
         if len(batch) >= db_settings.batch_size:
             yield batch
             batch = []
@@ -70,54 +162,288 @@ def __load_db_records(
         yield batch
 
 
+def _source_projection(chunk_templates: dict[str | None, str]) -> dict[str, int]:
+    fields = set().union(
+        *(
+            compile_chunk_mapping(template).fields
+            for template in chunk_templates.values()
+        )
+    )
+    return {**fields_projection(fields), CHUNK_SOURCE_CARD_FIELD: 1}
+
+
+def chunk_id(source_id: ObjectId, chunk_name: str | None) -> ObjectId:
+    """
+    Unnamed chunks keep the `_id` of their source record. Named chunks get an
+    id derived from the source id and the name, so re-runs replace them.
+    """
+    if chunk_name is None:
+        return source_id
+    return ObjectId(hash_text(f"{source_id}:{chunk_name}")[:24])
+
+
 def __create_empty_embedding_chunks(
-    source_record: MongoCollectionRecord, chunk_mappings: str
+    source_record: dict[str, Any],
+    chunk_mapping: CompiledChunkMapping,
+    *,
+    chunk_name: str | None = None,
 ) -> EmptyEmbeddingRecord:
-    summary = render_chunk_mapping(
-        chunk_mappings=chunk_mappings,
-        source_record=source_record,
-    )
+    summary = chunk_mapping.render(source_record)
     return EmptyEmbeddingRecord(
-        _id=source_record.mongo_id, summary=summary, embeddings=[]
+        _id=chunk_id(source_record["_id"], chunk_name),
+        source_id=str(
+            source_record.get(CHUNK_SOURCE_CARD_FIELD) or source_record["_id"]
+        ),
+        chunk_name=chunk_name,
+        summary=summary,
+        summary_hash=hash_text(summary),
+        template_hash=chunk_mapping.template_hash,
+        embeddings=[],
     )
 
 
+def render_chunks(
+    records: list[dict[str, Any]], *, chunk_templates: dict[str | None, str]
+) -> list[EmptyEmbeddingRecord]:
+    """Renders every template (keyed by chunk name) for each record in one pass."""
+    chunks: list[EmptyEmbeddingRecord] = []
+    for chunk_name, chunk_mappings in chunk_templates.items():
+        # Compiled once per worker process thanks to the cache
+        chunk_mapping = compile_chunk_mapping(chunk_mappings)
+        chunks.extend(
+            __create_empty_embedding_chunks(
+                db_record, chunk_mapping=chunk_mapping, chunk_name=chunk_name
+            )
+            for db_record in records
+        )
+    return chunks
+
+
+def write_chunks(
+    chunks: list[EmptyEmbeddingRecord],
+    *,
+    target_collection: str,
+    incremental: bool = False,
+) -> list[EmptyEmbeddingRecord]:
+    """Writes rendered chunks and returns those that need (new) embeddings."""
+    if incremental:
+        return __upsert_changed_records(target_collection, chunks)
+    return __upsert_records(target_collection, chunks)
+
+
 def process_batch_empty_embeddings(
-    records: list[MongoCollectionRecord],
+    records: list[dict[str, Any]],
     *,
     target_collection: str,
-    chunk_mappings: str,
-):
-    chunks = [
-        __create_empty_embedding_chunks(
-            db_record,
-            chunk_mappings=chunk_mappings,
+    chunk_templates: dict[str | None, str],
+    incremental: bool = False,
+) -> None:
+    chunks = render_chunks(records, chunk_templates=chunk_templates)
+    write_chunks(chunks, target_collection=target_collection, incremental=incremental)
+
+
+def process_id_range_empty_embeddings(
+    id_range: IdRange,
+    *,
+    source_collection: str,
+    target_collection: str,
+    chunk_templates: dict[str | None, str],
+    incremental: bool = False,
+) -> None:
+    """
+    Reads one `_id` range of the source with this worker's own cursor and
+    writes its chunks, so nothing is fanned out from the parent process.
+    """
+    for batch in iter_id_range_batches(
+        _get_db().get_collection(source_collection),
+        id_range,
+        batch_size=db_settings.batch_size,
+        projection=_source_projection(chunk_templates),
+    ):
+        process_batch_empty_embeddings(
+            batch,
+            target_collection=target_collection,
+            chunk_templates=chunk_templates,
+            incremental=incremental,
         )
-        for db_record in records
+
+
+def __can_render_server_side(
+    source_collection: str, *, chunk_mapping: CompiledChunkMapping
+) -> bool:
+    """
+    `$concat` only accepts strings and `$toString` formats values differently
+    from Python, so every mapped field must be a string (or missing) everywhere.
+    """
+    if not chunk_mapping.fields:
+        return True
+    non_string_conditions = [
+        {"$not": [{"$in": [{"$type": f"${field}"}, _SERVER_SIDE_TYPES]}]}
+        for field in sorted(chunk_mapping.fields)
     ]
-    __upsert_records(target_collection, chunks)
+    db_collection = _get_db().get_collection(source_collection)
+    non_string_field = db_collection.find_one(
+        {"$expr": {"$or": non_string_conditions}}, {"_id": 1}
+    )
+    return non_string_field is None
+
+
+def __create_chunks_server_side(
+    *,
+    source_collection: str,
+    target_collection: str,
+    chunk_mapping: CompiledChunkMapping,
+    limit: int | None,
+    incremental: bool,
+) -> None:
+    """
+    SHA-256 is not available in aggregation expressions, so server-side chunks
+    store no summary hash and incremental runs compare the summary text instead.
+    """
+    when_matched: str | list[dict[str, Any]] = "replace"
+    if incremental:
+        when_matched = [
+            {
+                "$replaceWith": {
+                    "$cond": [
+                        {"$eq": ["$summary", "$$new.summary"]},
+                        {
+                            "$mergeObjects": [
+                                "$$ROOT",
+                                {"template_hash": "$$new.template_hash"},
+                            ]
+                        },
+                        "$$new",
+                    ]
+                }
+            }
+        ]
+
+    pipeline: list[dict[str, Any]] = []
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    pipeline.extend(
+        [
+            {
+                "$project": {
+                    "_id": 1,
+                    "source_id": {
+                        "$toString": {
+                            "$ifNull": [f"${CHUNK_SOURCE_CARD_FIELD}", "$_id"]
+                        }
+                    },
+                    "summary": chunk_mapping.to_mongo_expression(),
+                    "template_hash": {"$literal": chunk_mapping.template_hash},
+                    "embeddings": {"$literal": []},
+                    EMBEDDINGS_PENDING_FIELD: {"$literal": True},
+                }
+            },
+            {
+                "$merge": {
+                    "into": target_collection,
+                    "on": "_id",
+                    "whenMatched": when_matched,
+                    "whenNotMatched": "insert",
+                }
+            },
+        ]
+    )
+    _get_db().get_collection(source_collection).aggregate(pipeline, allowDiskUse=True)
+    logger.info(f"Rendered chunks server-side into collection: {target_collection}")
 
 
 def run_pipeline_create_embedding_chunks(
     *,
     source_collection: str,
     target_collection: str,
-    chunk_mappings: str,
-    limit: Optional[int] = None,
+    chunk_templates: dict[str | None, str],
+    limit: int | None = None,
+    server_side: bool = False,
+    incremental: bool = False,
 ) -> None:
+    """
+    Renders the chunk templates for every source record into the target
+    collection. Chunks store the source record id and hashes of their summary
+    and template.
+
+    Templates are keyed by chunk name; an unnamed template is keyed by None.
+    Named chunks are stored next to each other (e.g. a name-only and a
+    rules-text chunk per card) and embedded separately. The source is read
+    once and every template is rendered for each batch.
+
+    With `incremental`, only chunks whose rendered summary changed are rewritten
+    (and lose their embeddings); unchanged chunks keep their embeddings.
+
+    With `server_side`, a single unnamed template is translated into an
+    aggregation that renders and `$merge`s the chunks inside MongoDB. Templates
+    over non-string fields cannot be translated faithfully and fall back to the
+    Python path, as do named chunks, whose ids are hashes MongoDB cannot compute.
+    """
     logger.info(
-        "Starting embeddings pipeline. Creating record chunks:",
-        f"source={source_collection}, target={target_collection}, limit={limit}",
+        "Starting embeddings pipeline. Creating record chunks: "
+        f"source={source_collection}, target={target_collection}, limit={limit}, "
+        f"chunks={list(chunk_templates)}, server_side={server_side}, "
+        f"incremental={incremental}"
     )
 
-    with multiprocessing.Pool(processes=os.cpu_count()) as pool:
+    if server_side and list(chunk_templates) != [None]:
+        logger.info("Named chunks are rendered in Python")
+    elif server_side:
+        chunk_mapping = compile_chunk_mapping(chunk_templates[None])
+        if __can_render_server_side(source_collection, chunk_mapping=chunk_mapping):
+            __create_chunks_server_side(
+                source_collection=source_collection,
+                target_collection=target_collection,
+                chunk_mapping=chunk_mapping,
+                limit=limit,
+                incremental=incremental,
+            )
+            return
+        logger.info(
+            "Mapped fields contain non-string values: rendering chunks in Python"
+        )
+
+    plan = plan_worker_pool(max_workers=app_settings.embeddings_max_workers)
+    processes = plan.processes
+    initargs = (plan.threads_per_worker, _reset_db_instance)
+    if limit is None:
+        # A few ranges per worker keeps the pool busy when ranges render unevenly
+        id_ranges = split_id_ranges(
+            _get_db().get_collection(source_collection), parts=processes * 4
+        )
+        logger.info(f"Rendering chunks from {len(id_ranges)} partitioned cursors")
+        with multiprocessing.Pool(
+            processes=processes, initializer=initialize_worker, initargs=initargs
+        ) as pool:
+            range_worker = partial(
+                process_id_range_empty_embeddings,
+                source_collection=source_collection,
+                target_collection=target_collection,
+                chunk_templates=chunk_templates,
+                incremental=incremental,
+            )
+            list(pool.imap_unordered(range_worker, id_ranges))
+        return
+
+    # A limit applies to the collection as a whole, so a single cursor is used
+    with multiprocessing.Pool(
+        processes=processes, initializer=initialize_worker, initargs=initargs
+    ) as pool:
         partial_worker = partial(
             process_batch_empty_embeddings,
             target_collection=target_collection,
-            chunk_mappings=chunk_mappings,
+            chunk_templates=chunk_templates,
+            incremental=incremental,
         )
         list(
-            pool.imap_unordered(
-                partial_worker, __load_db_records(source_collection, limit=limit)
+            BoundedImap(
+                pool,
+                partial_worker,
+                __load_db_records(
+                    source_collection,
+                    projection=_source_projection(chunk_templates),
+                    limit=limit,
+                ),
+                max_in_flight=default_max_in_flight(processes),
             )
         )
@@ -0,0 +1,92 @@
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Callable
+
+from pydantic import BaseModel
+
+from app.core.hashing import hash_text
+
+EmbedTexts = Callable[[list[str]], list[list[float]]]
+
+
+class SummaryEmbeddingCache:
+    """
+    Vectors of recently embedded summaries by summary hash, kept for one run.
+    The least recently used entry is evicted once `max_size` is reached.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # float32 arrays take a sixth of the memory of lists of Python floats
+        self._vectors: OrderedDict[str, array] = OrderedDict()
+        # Refresh embeds batches from several threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def get(self, summary_hash: str) -> list[float] | None:
+        with self._lock:
+            vector = self._vectors.get(summary_hash)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end(summary_hash)
+            self.hits += 1
+        return vector.tolist()
+
+    def put(self, summary_hash: str, vector: list[float]) -> None:
+        if self.max_size < 1:
+            return
+        with self._lock:
+            self._vectors[summary_hash] = array("f", vector)
+            self._vectors.move_to_end(summary_hash)
+            while len(self._vectors) > self.max_size:
+                self._vectors.popitem(last=False)
+
+
+class DedupedEmbeddings(BaseModel):
+    """Vectors aligned with the input summaries, and the hashes embedded anew."""
+
+    vectors: list[list[float]]
+    summary_hashes: list[str]
+    embedded_hashes: list[str]
+
+
+def embed_distinct(
+    summaries: list[str],
+    *,
+    embed_texts: EmbedTexts,
+    cache: SummaryEmbeddingCache | None = None,
+) -> DedupedEmbeddings:
+    """
+    Embeds each distinct summary once, skipping the ones already in `cache`,
+    and fans the vectors back out to every position sharing the summary.
+    """
+    summary_hashes = [hash_text(summary) for summary in summaries]
+    vectors_by_hash: dict[str, list[float]] = {}
+    texts_to_embed: dict[str, str] = {}
+    for summary_hash, summary in zip(summary_hashes, summaries, strict=True):
+        if summary_hash in vectors_by_hash or summary_hash in texts_to_embed:
+            continue
+        cached = cache.get(summary_hash) if cache is not None else None
+        if cached is not None:
+            vectors_by_hash[summary_hash] = cached
+        else:
+            texts_to_embed[summary_hash] = summary
+
+    if texts_to_embed:
+        embedded = embed_texts(list(texts_to_embed.values()))
+        for summary_hash, vector in zip(texts_to_embed, embedded, strict=True):
+            vectors_by_hash[summary_hash] = vector
+            if cache is not None:
+                cache.put(summary_hash, vector)
+
+    return DedupedEmbeddings(
+        vectors=[vectors_by_hash[summary_hash] for summary_hash in summary_hashes],
+        summary_hashes=summary_hashes,
+        embedded_hashes=list(texts_to_embed),
+    )
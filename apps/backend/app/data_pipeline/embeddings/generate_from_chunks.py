@@ -1,20 +1,39 @@
 import multiprocessing
-import os
+from collections.abc import Iterator
+from datetime import UTC, datetime
 from functools import partial
-from typing import Iterator, Optional
+from typing import Any
 
 from loguru import logger
-from pymongo import ReplaceOne
+from pymongo import UpdateMany, UpdateOne
 
-from app.core.config import db_settings, embedding_settings
-from app.core.db import Database
-from app.core.embeddings.utils import get_embedding_provider
+from app.core.config import app_settings, db_settings, embedding_settings
+from app.core.db import (
+    CHUNK_SUMMARY_HASH_FIELD,
+    EMBEDDINGS_PENDING_FIELD,
+    EMBEDDINGS_PENDING_INDEX,
+    Database,
+)
+from app.core.embeddings.provider import TokenCounter
+from app.core.embeddings.utils import get_embedding_provider, prepare_embedding_model
+from app.data_pipeline.embeddings.dedup import SummaryEmbeddingCache, embed_distinct
+from app.data_pipeline.partitions import IdRange, iter_id_range_batches, split_id_ranges
+from app.data_pipeline.workers import (
+    BoundedImap,
+    default_max_in_flight,
+    initialize_worker,
+    plan_embedding_worker_pool,
+)
 from app.models.db import (
     EmptyEmbeddingRecord,
     GeneratedEmbeddingRecord,
 )
 
-_db_instance: Optional[Database] = None
+_db_instance: Database | None = None
+# Vectors of the summaries this pool worker embedded; workers last a single run
+_worker_summary_cache: SummaryEmbeddingCache | None = None
+
+EMBEDDING_CHECKPOINTS_COLLECTION = "embedding_checkpoints"
 
 
 def _get_db() -> Database:
@@ -24,36 +43,156 @@ def _get_db() -> Database:
     return _db_instance
 
 
+def _reset_db_instance() -> None:
+    # MongoClient is not fork-safe: every worker process opens its own connection
+    global _db_instance
+    _db_instance = None
+
+
+def new_summary_cache() -> SummaryEmbeddingCache:
+    """Cache of the summaries embedded during one run, shared by its batches."""
+    return SummaryEmbeddingCache(app_settings.embeddings_dedup_cache_size)
+
+
+def _reset_worker_state() -> None:
+    global _worker_summary_cache
+    _reset_db_instance()
+    _worker_summary_cache = new_summary_cache()
+
+
+def _chunk_query(*, missing_only: bool) -> dict:
+    # Chunks keep their embeddings until their summary changes; pending chunks
+    # are read from the partial index instead of scanning the collection
+    return {EMBEDDINGS_PENDING_FIELD: True} if missing_only else {}
+
+
+def __ensure_pending_index(collection: str) -> None:
+    db_collection = _get_db().get_collection(collection)
+    if EMBEDDINGS_PENDING_INDEX not in db_collection.index_information():
+        # Chunks written before the pending flag existed: flag the ones that
+        # have no embeddings once, before the index takes over
+        flagged = db_collection.update_many(
+            {
+                "embeddings.0": {"$exists": False},
+                EMBEDDINGS_PENDING_FIELD: {"$exists": False},
+            },
+            {"$set": {EMBEDDINGS_PENDING_FIELD: True}},
+        ).modified_count
+        logger.info(f"Flagged {flagged} chunks without embeddings in {collection}")
+    _get_db().create_chunk_indexes(collection=collection)
+
+
+def __start_checkpoint(collection: str, *, missing_only: bool) -> None:
+    now = datetime.now(UTC)
+    pending = (
+        _get_db()
+        .get_collection(collection)
+        .count_documents(_chunk_query(missing_only=True))
+    )
+    _get_db().get_collection(EMBEDDING_CHECKPOINTS_COLLECTION).update_one(
+        {"_id": collection},
+        {
+            "$set": {
+                "status": "running",
+                "missing_only": missing_only,
+                "pending_at_start": pending,
+                "embedded": 0,
+                "started_at": now,
+                "updated_at": now,
+            },
+            "$unset": {"error": ""},
+        },
+        upsert=True,
+    )
+    logger.info(f"{pending} chunks in {collection} are waiting for embeddings")
+
+
+def __advance_checkpoint(collection: str, embedded: int) -> None:
+    _get_db().get_collection(EMBEDDING_CHECKPOINTS_COLLECTION).update_one(
+        {"_id": collection},
+        {
+            "$inc": {"embedded": embedded},
+            "$set": {"updated_at": datetime.now(UTC)},
+        },
+    )
+
+
+def __finish_checkpoint(collection: str, *, error: BaseException | None) -> None:
+    update: dict = {
+        "status": "completed" if error is None else "failed",
+        "updated_at": datetime.now(UTC),
+    }
+    if error is not None:
+        update["error"] = repr(error)
+    _get_db().get_collection(EMBEDDING_CHECKPOINTS_COLLECTION).update_one(
+        {"_id": collection}, {"$set": update}
+    )
+
+
+def __embedding_update(record: GeneratedEmbeddingRecord) -> dict[str, Any]:
+    fields: dict[str, Any] = {"embeddings": record.embeddings}
+    if record.token_count is not None:
+        fields["token_count"] = record.token_count
+        fields["truncated"] = record.truncated
+    return {"$set": fields, "$unset": {EMBEDDINGS_PENDING_FIELD: ""}}
+
+
 def __upsert_records(
     collection: str,
     records: list[GeneratedEmbeddingRecord],
-) -> None:
+    *,
+    fan_out: dict[str, GeneratedEmbeddingRecord] | None = None,
+) -> int:
+    """Stores the embeddings, returning the count of chunks that received them."""
     if not records:
-        return
+        return 0
 
     db_collection = _get_db().get_collection(collection)
 
-    operations = [
-        ReplaceOne(
-            {"_id": rec.mongo_id},
-            rec.model_dump(by_alias=True, exclude_none=True),
-            upsert=True,
+    # Only the embeddings are set, so chunk hashes survive. Matching on the summary
+    # skips chunks re-rendered after they were loaded, which stay pending.
+    operations: list[UpdateOne | UpdateMany] = [
+        UpdateOne(
+            {"_id": rec.mongo_id, "summary": rec.summary},
+            __embedding_update(rec),
         )
         for rec in records
     ]
+    # Pending chunks elsewhere in the collection with the same summary (reprints,
+    # tokens, basic lands) get the vector now instead of being embedded again.
+    # The batch's own chunks are excluded so no chunk is matched twice.
+    batch_ids: dict[str, list[Any]] = {}
+    for rec in records:
+        batch_ids.setdefault(rec.summary, []).append(rec.mongo_id)
+    operations.extend(
+        UpdateMany(
+            {
+                CHUNK_SUMMARY_HASH_FIELD: summary_hash,
+                EMBEDDINGS_PENDING_FIELD: True,
+                "summary": rec.summary,
+                "_id": {"$nin": batch_ids[rec.summary]},
+            },
+            __embedding_update(rec),
+        )
+        for summary_hash, rec in (fan_out or {}).items()
+    )
 
-    db_collection.bulk_write(operations, ordered=False)
-    logger.info(f"Upserted {len(records)} records ready for embeddings")
+    stored = db_collection.bulk_write(operations, ordered=False).matched_count
+    logger.info(f"Stored embeddings of {stored} chunks for a batch of {len(records)}")
+    return stored
 
 
 def __load_db_records(
-    source_collection: str, *, limit: Optional[int] = None
+    source_collection: str,
+    *,
+    limit: int | None = None,
+    missing_only: bool = False,
 ) -> Iterator[list[EmptyEmbeddingRecord]]:
     collection = _get_db().get_collection(source_collection)
     logger.debug(
         f"Loading records with chunks from collection: {source_collection} with limit {limit}"
     )
-    cursor = collection.find()
+    cursor = collection.find(_chunk_query(missing_only=missing_only))
 
     if limit is not None:
         cursor = cursor.limit(limit)
@@ -74,6 +213,8 @@ def __generate_and_create_embeddings(
     record: EmptyEmbeddingRecord,
     *,
     embedding_vector: list[float],
+    token_count: int | None = None,
+    max_tokens: int | None = None,
 ) -> GeneratedEmbeddingRecord:
     """
     Resource intensive operation due to generating embeddings.
@@ -82,61 +223,239 @@ def __generate_and_create_embeddings(
         _id=record.mongo_id,
         summary=record.summary,
         embeddings=embedding_vector,
+        token_count=token_count,
+        truncated=(
+            token_count > max_tokens
+            if token_count is not None and max_tokens is not None
+            else None
+        ),
     )
 
 
+def __embed_counting_tokens(
+    summaries: list[str],
+    *,
+    embedder: TokenCounter,
+    normalize: bool,
+    token_counts: dict[str, int],
+) -> list[list[float]]:
+    # Counted by the tokenizer pass that embeds them: summaries served from a
+    # cache are not tokenized again, and keep no count
+    vectors, counts = embedder.embed_texts_counting_tokens(
+        summaries, normalize=normalize
+    )
+    token_counts.update(
+        (summary, count)
+        for summary, count in zip(summaries, counts, strict=True)
+        if count is not None
+    )
+    return vectors
+
+
 def process_batch(
     records: list[EmptyEmbeddingRecord],
     *,
     target_collection: str,
     normalize_embeddings: bool = True,
-):
+    summary_cache: SummaryEmbeddingCache | None = None,
+) -> int:
+    """
+    Embeds a batch of chunks, sending each distinct summary to the model once:
+    duplicates within the batch and summaries already in the run's
+    `summary_cache` reuse the vector. Chunks sent to a model with a local
+    tokenizer record their token count and whether it truncated them.
+
+    Returns the count of chunks that received embeddings, including pending
+    chunks outside the batch that share a newly embedded summary.
+    """
     embedder = get_embedding_provider()
-    summaries = [record.summary for record in records]
-    embedding_vectors = embedder.embed_texts(summaries, normalize=normalize_embeddings)
+    token_counts: dict[str, int] = {}
+    max_tokens: int | None = None
+    embed_texts = partial(embedder.embed_texts, normalize=normalize_embeddings)
+    if isinstance(embedder, TokenCounter):
+        max_tokens = embedder.max_tokens
+        embed_texts = partial(
+            __embed_counting_tokens,
+            embedder=embedder,
+            normalize=normalize_embeddings,
+            token_counts=token_counts,
+        )
+    deduped = embed_distinct(
+        [record.summary for record in records],
+        embed_texts=embed_texts,
+        cache=summary_cache,
+    )
 
     embeddings = [
         __generate_and_create_embeddings(
             db_record,
             embedding_vector=embedding_vector,
+            token_count=token_counts.get(db_record.summary),
+            max_tokens=max_tokens,
         )
-        for db_record, embedding_vector in zip(records, embedding_vectors, strict=True)
+        for db_record, embedding_vector in zip(records, deduped.vectors, strict=True)
     ]
-    __upsert_records(target_collection, embeddings)
+    truncated = sum(1 for embedding in embeddings if embedding.truncated)
+    if truncated:
+        logger.warning(
+            f"{truncated} of {len(embeddings)} chunks exceed the model limit of "
+            f"{max_tokens} tokens and were truncated"
+        )
+    embedded_hashes = set(deduped.embedded_hashes)
+    fan_out = {
+        summary_hash: embedding
+        for summary_hash, embedding in zip(
+            deduped.summary_hashes, embeddings, strict=True
+        )
+        if summary_hash in embedded_hashes
+    }
+    stored = __upsert_records(target_collection, embeddings, fan_out=fan_out)
+    logger.debug(
+        f"Embedded {len(deduped.embedded_hashes)} distinct summaries "
+        f"for {len(records)} chunks"
+    )
+    return stored
 
 
-def run_pipeline_generate_embeddings_from_chunks(
+def process_id_range(
+    id_range: IdRange,
     *,
     target_collection: str,
     normalize_embeddings: bool = True,
-    limit: Optional[int] = None,
-) -> None:
-    logger.info(
-        "Starting embeddings pipeline: Generate embeddings from chunks"
-        f"target collection={target_collection}, limit={limit}, normalize embeddings={normalize_embeddings}"
-    )
+    missing_only: bool = False,
+    summary_cache: SummaryEmbeddingCache | None = None,
+) -> int:
+    """
+    Embeds the chunks of one `_id` range, read with this worker's own cursor.
+    """
+    embedded = 0
+    for batch in iter_id_range_batches(
+        _get_db().get_collection(target_collection),
+        id_range,
+        batch_size=db_settings.batch_size,
+        query=_chunk_query(missing_only=missing_only),
+    ):
+        embedded += process_batch(
+            [
+                EmptyEmbeddingRecord.model_validate(record, extra="ignore")
+                for record in batch
+            ],
+            target_collection=target_collection,
+            normalize_embeddings=normalize_embeddings,
+            summary_cache=summary_cache,
+        )
+    return embedded
+
+
+def _process_batch_in_worker(records: list[EmptyEmbeddingRecord], **kwargs) -> int:
+    return process_batch(records, summary_cache=_worker_summary_cache, **kwargs)
+
 
+def _process_id_range_in_worker(id_range: IdRange, **kwargs) -> int:
+    return process_id_range(id_range, summary_cache=_worker_summary_cache, **kwargs)
+
+
+def __run_embeddings(
+    *,
+    target_collection: str,
+    normalize_embeddings: bool,
+    limit: int | None,
+    missing_only: bool,
+) -> Iterator[int]:
+    """Embeds the selected chunks, yielding the count of each finished task."""
     if embedding_settings.provider != "sentence_transformers":
         logger.info(
             "Using sequential embeddings generation for provider "
             f"{embedding_settings.provider} to reduce remote rate limit risk"
         )
-        for batch in __load_db_records(target_collection, limit=limit):
-            process_batch(
+        summary_cache = new_summary_cache()
+        for batch in __load_db_records(
+            target_collection, limit=limit, missing_only=missing_only
+        ):
+            yield process_batch(
                 batch,
                 target_collection=target_collection,
                 normalize_embeddings=normalize_embeddings,
+                summary_cache=summary_cache,
+            )
+        return
+
+    # Exported here once: a failing export or parity check ends the run before
+    # any worker starts
+    prepare_embedding_model()
+    plan = plan_embedding_worker_pool()
+    processes = plan.processes
+    # Workers load the model on their first task, where a failure ends the run
+    initargs = (plan.threads_per_worker, _reset_worker_state, True)
+    if limit is None:
+        id_ranges = split_id_ranges(
+            _get_db().get_collection(target_collection),
+            parts=processes * 4,
+            query=_chunk_query(missing_only=missing_only),
+        )
+        logger.info(f"Embedding chunks from {len(id_ranges)} partitioned cursors")
+        with multiprocessing.Pool(
+            processes=processes, initializer=initialize_worker, initargs=initargs
+        ) as pool:
+            range_worker = partial(
+                _process_id_range_in_worker,
+                target_collection=target_collection,
+                normalize_embeddings=normalize_embeddings,
+                missing_only=missing_only,
             )
+            yield from pool.imap_unordered(range_worker, id_ranges)
         return
 
-    with multiprocessing.Pool(processes=os.cpu_count()) as pool:
+    # A limit applies to the collection as a whole, so a single cursor is used
+    with multiprocessing.Pool(
+        processes=processes, initializer=initialize_worker, initargs=initargs
+    ) as pool:
         partial_worker = partial(
-            process_batch,
+            _process_batch_in_worker,
             target_collection=target_collection,
             normalize_embeddings=normalize_embeddings,
         )
-        list(
-            pool.imap_unordered(
-                partial_worker, __load_db_records(target_collection, limit=limit)
-            )
+        yield from BoundedImap(
+            pool,
+            partial_worker,
+            __load_db_records(
+                target_collection, limit=limit, missing_only=missing_only
+            ),
+            max_in_flight=default_max_in_flight(processes),
         )
+
+
+def run_pipeline_generate_embeddings_from_chunks(
+    *,
+    target_collection: str,
+    normalize_embeddings: bool = True,
+    limit: int | None = None,
+    missing_only: bool = False,
+) -> None:
+    """
+    Embeds chunk summaries. With `missing_only`, only chunks still waiting for
+    embeddings are read, through a partial index: chunks embedded by an earlier
+    run, including one that crashed or was stopped, are skipped, so a re-run
+    only costs the remaining work. Progress is checkpointed per finished task
+    in the `embedding_checkpoints` collection.
+    """
+    logger.info(
+        "Starting embeddings pipeline: Generate embeddings from chunks"
+        f"target collection={target_collection}, limit={limit}, normalize embeddings={normalize_embeddings}"
+    )
+
+    __ensure_pending_index(target_collection)
+    __start_checkpoint(target_collection, missing_only=missing_only)
+    try:
+        for embedded in __run_embeddings(
+            target_collection=target_collection,
+            normalize_embeddings=normalize_embeddings,
+            limit=limit,
+            missing_only=missing_only,
+        ):
+            __advance_checkpoint(target_collection, embedded)
+    except BaseException as e:
+        # Also on KeyboardInterrupt: finished batches are already stored
+        __finish_checkpoint(target_collection, error=e)
+        raise
+    __finish_checkpoint(target_collection, error=None)
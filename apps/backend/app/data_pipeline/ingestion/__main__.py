@@ -0,0 +1,128 @@
+"""
+Ingests a local dataset file without going through the HTTP upload route:
+
+    python -m app.data_pipeline.ingestion ~/data/default-cards.ndjson --limit 100
+"""
+
+import argparse
+import asyncio
+import sys
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.core.config import DatasetFileInput, db_settings
+from app.data_pipeline.ingestion.dataset_formats import detect_dataset_format
+from app.data_pipeline.ingestion.json_records import (
+    run_pipeline_insert_json_file,
+    run_pipeline_insert_ndjson_parallel,
+)
+from app.models.ingestion import IngestionResult, RecordFilter, RecordRules
+
+record_filters_adapter: TypeAdapter[list[RecordFilter]] = TypeAdapter(
+    list[RecordFilter]
+)
+
+
+def _positive_int(value: str) -> int:
+    parsed = int(value)
+    if parsed < 1:
+        raise argparse.ArgumentTypeError(f"Expected a positive integer, got: {value}")
+    return parsed
+
+
+def _field_list(value: str) -> list[str]:
+    return [field.strip() for field in value.split(",") if field.strip()]
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.data_pipeline.ingestion",
+        description="Ingest a local JSON/NDJSON dataset (optionally gzip/zstd).",
+    )
+    parser.add_argument("dataset_file", help="Path to the dataset file")
+    parser.add_argument(
+        "--collection",
+        default=db_settings.cards_collection,
+        help="Target collection (default: %(default)s)",
+    )
+    parser.add_argument("--limit", type=_positive_int, default=None)
+    parser.add_argument(
+        "--batch-size",
+        type=_positive_int,
+        default=db_settings.batch_size,
+        help="Records per bulk write (default: %(default)s)",
+    )
+    parser.add_argument("--mode", choices=["upsert", "bulk_load"], default="upsert")
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Parse byte ranges in a process pool (uncompressed NDJSON only)",
+    )
+    parser.add_argument("--processes", type=_positive_int, default=None)
+    parser.add_argument("--include-fields", type=_field_list, default=[])
+    parser.add_argument("--exclude-fields", type=_field_list, default=[])
+    parser.add_argument(
+        "--filters",
+        default=None,
+        help='JSON list, e.g. \'[{"field": "lang", "op": "eq", "value": "en"}]\'',
+    )
+    parser.add_argument(
+        "--no-derive-fields",
+        dest="derive_fields",
+        action="store_false",
+        help="Skip computing the derived fields",
+    )
+    return parser
+
+
+def run(argv: list[str] | None = None) -> IngestionResult:
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        dataset_file = DatasetFileInput(dataset_file=args.dataset_file).dataset_file
+        dataset_format = detect_dataset_format(filename=dataset_file.name)
+        filters = (
+            record_filters_adapter.validate_json(args.filters) if args.filters else []
+        )
+    except (ValidationError, ValueError) as e:
+        parser.error(str(e))
+    if not dataset_file.is_file():
+        parser.error(f"Dataset file not found: {dataset_file}")
+    if args.parallel and not dataset_format.is_splittable:
+        parser.error("--parallel requires an uncompressed NDJSON file")
+
+    rules = RecordRules(
+        include_fields=args.include_fields,
+        exclude_fields=args.exclude_fields,
+        filters=filters,
+    )
+    derived_fields: list[str] | None = None if args.derive_fields else []
+
+    if args.parallel and args.limit is None:
+        return run_pipeline_insert_ndjson_parallel(
+            path=dataset_file,
+            collection=args.collection,
+            mode=args.mode,
+            rules=rules,
+            derived_fields=derived_fields,
+            processes=args.processes,
+            batch_size=args.batch_size,
+        )
+    return asyncio.run(
+        run_pipeline_insert_json_file(
+            path=dataset_file,
+            collection=args.collection,
+            limit=args.limit,
+            dataset_format=dataset_format,
+            mode=args.mode,
+            rules=rules,
+            derived_fields=derived_fields,
+            batch_size=args.batch_size,
+        )
+    )
+
+
+if __name__ == "__main__":
+    result = run()
+    sys.stdout.write(result.model_dump_json() + "\n")
@@ -0,0 +1,92 @@
+import mmap
+import os
+from collections.abc import Iterator
+from itertools import pairwise
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from app.data_pipeline.ingestion.json_stream import DEFAULT_READ_SIZE
+
+# Ranges smaller than this are not worth a separate task
+MIN_RANGE_BYTES = 4 * 1024 * 1024
+
+
+class ByteRange(BaseModel):
+    start: int
+    end: int
+
+
+def split_line_ranges(
+    path: Path, *, parts: int, min_range_bytes: int = MIN_RANGE_BYTES
+) -> list[ByteRange]:
+    """
+    Splits a newline-delimited file into roughly equal byte ranges. Every range
+    starts at the beginning of a line and ends right after a newline (or at EOF),
+    so ranges can be parsed independently.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    parts = max(1, min(parts, size // max(min_range_bytes, 1)))
+    boundaries = [0]
+    with open(path, "rb") as file_obj:
+        for part in range(1, parts):
+            target = size * part // parts
+            if target <= boundaries[-1]:
+                continue
+            file_obj.seek(target)
+            file_obj.readline()
+            boundary = file_obj.tell()
+            if boundary >= size:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    boundaries.append(size)
+
+    return [
+        ByteRange(start=start, end=end)
+        for start, end in pairwise(boundaries)
+        if end > start
+    ]
+
+
+def iter_mmap_chunks(
+    path: Path,
+    byte_range: ByteRange | None = None,
+    *,
+    read_size: int = DEFAULT_READ_SIZE,
+) -> Iterator[memoryview]:
+    """
+    Yields views over a memory-mapped file (or one byte range of it). Pages are
+    read by the kernel on access instead of through `read()` buffers; the
+    parsers still copy each view into `bytes`/`str` while decoding it.
+
+    Each view is released once the consumer moves on, so it must not be kept.
+    """
+    with open(path, "rb") as file_obj:
+        size = os.fstat(file_obj.fileno()).st_size
+        start, end = 0, size
+        if byte_range is not None:
+            start, end = byte_range.start, min(byte_range.end, size)
+        # Empty files cannot be mapped
+        if end <= start:
+            return
+        with mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(start, end, read_size):
+                    chunk = view[offset : min(offset + read_size, end)]
+                    try:
+                        yield chunk
+                    finally:
+                        chunk.release()
+            finally:
+                view.release()
+
+
+def iter_range_chunks(
+    path: Path, byte_range: ByteRange, *, read_size: int = DEFAULT_READ_SIZE
+) -> Iterator[memoryview]:
+    return iter_mmap_chunks(path, byte_range, read_size=read_size)
@@ -0,0 +1,237 @@
+import zlib
+from collections.abc import Iterable, Iterator
+from typing import IO, Protocol
+
+from pydantic import BaseModel
+
+from app.data_pipeline.ingestion.json_stream import (
+    DEFAULT_READ_SIZE,
+    JsonArrayStreamParser,
+    NdjsonStreamParser,
+    json_type,
+)
+from app.models.ingestion import (
+    DATASET_COMPRESSION_SUFFIXES,
+    DATASET_LAYOUT_SUFFIXES,
+    SUPPORTED_DATASET_SUFFIXES,
+    DatasetCompression,
+    DatasetLayout,
+)
+
+_COMPRESSION_CONTENT_TYPES: dict[str, DatasetCompression] = {
+    "application/gzip": "gzip",
+    "application/x-gzip": "gzip",
+    "application/zstd": "zstd",
+}
+_LAYOUT_CONTENT_TYPES: dict[str, DatasetLayout] = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson",
+}
+_CONTENT_ENCODINGS: dict[str, DatasetCompression] = {
+    "gzip": "gzip",
+    "x-gzip": "gzip",
+    "zstd": "zstd",
+}
+
+
+class DatasetFormat(BaseModel):
+    layout: DatasetLayout = "json"
+    compression: DatasetCompression = "none"
+
+    @property
+    def is_splittable(self) -> bool:
+        """Whether the file can be split into byte ranges parsed independently."""
+        return self.layout == "ndjson" and self.compression == "none"
+
+
+class _RecordParser(Protocol):
+    def feed(self, chunk: bytes | memoryview) -> Iterator[json_type]: ...
+
+    def close(self) -> Iterator[json_type]: ...
+
+
+class _Decompressor(Protocol):
+    def decompress(self, chunk: bytes | memoryview) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+def _media_type(content_type: str | None) -> str:
+    if not content_type:
+        return ""
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def detect_dataset_format(
+    *,
+    filename: str | None = None,
+    content_type: str | None = None,
+    content_encoding: str | None = None,
+) -> DatasetFormat:
+    """
+    Detects the dataset layout and compression from a file name suffix
+    (e.g. `cards.ndjson.zst`), falling back to the content type and encoding.
+    """
+    compression: DatasetCompression | None = None
+    layout: DatasetLayout | None = None
+
+    if filename:
+        name = filename.lower()
+        for suffix, suffix_compression in DATASET_COMPRESSION_SUFFIXES.items():
+            if name.endswith(suffix):
+                compression = suffix_compression
+                name = name[: -len(suffix)]
+                break
+        for suffix, suffix_layout in DATASET_LAYOUT_SUFFIXES.items():
+            if name.endswith(suffix):
+                layout = suffix_layout
+                break
+        if layout is None:
+            raise ValueError(
+                f"Unsupported dataset file: {filename}. "
+                f"Expected one of: {', '.join(SUPPORTED_DATASET_SUFFIXES)}"
+            )
+
+    media_type = _media_type(content_type)
+    if compression is None:
+        compression = _COMPRESSION_CONTENT_TYPES.get(media_type)
+    if compression is None and content_encoding:
+        encoding = content_encoding.strip().lower()
+        if encoding not in _CONTENT_ENCODINGS and encoding != "identity":
+            raise ValueError(f"Unsupported content encoding: {content_encoding}")
+        compression = _CONTENT_ENCODINGS.get(encoding)
+    if layout is None:
+        layout = _LAYOUT_CONTENT_TYPES.get(media_type)
+        if layout is None and media_type not in _COMPRESSION_CONTENT_TYPES:
+            raise ValueError(f"Unsupported dataset content type: {content_type}")
+
+    return DatasetFormat(layout=layout or "json", compression=compression or "none")
+
+
+class _GzipDecompressor:
+    """Streaming gzip decompressor that also handles multi-member archives."""
+
+    def __init__(self) -> None:
+        self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+
+    def decompress(self, chunk: bytes | memoryview) -> bytes:
+        try:
+            output = [self._decompressor.decompress(chunk)]
+            while self._decompressor.eof and self._decompressor.unused_data:
+                remaining = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+                output.append(self._decompressor.decompress(remaining))
+        except zlib.error as exc:
+            # A client error, like malformed JSON
+            raise ValueError(f"Invalid gzip dataset: {exc}") from exc
+        return b"".join(output)
+
+    def flush(self) -> bytes:
+        if not self._decompressor.eof:
+            raise ValueError("Unexpected end of gzip dataset")
+        return self._decompressor.flush()
+
+
+class _ZstdDecompressor:
+    """Streaming zstd decompressor that also handles multi-frame files (pzstd)."""
+
+    def __init__(self) -> None:
+        try:
+            import zstandard  # type: ignore[import-not-found]
+        except ImportError as exc:  # pragma: no cover - depends on install
+            # A client error: the dataset uses a codec this install cannot read
+            raise ValueError(
+                "zstd-compressed datasets require the optional zstandard package "
+                "(install the `zstd` extra)"
+            ) from exc
+
+        self._zstandard = zstandard
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, chunk: bytes | memoryview) -> bytes:
+        output = []
+        data: bytes | memoryview = chunk
+        while data:
+            # A decompression object stops at the end of its frame and cannot
+            # be fed again: the next frame needs a new one
+            if self._decompressor.eof:
+                self._decompressor = self._zstandard.ZstdDecompressor().decompressobj()
+            try:
+                output.append(self._decompressor.decompress(data))
+            except self._zstandard.ZstdError as exc:
+                raise ValueError(f"Invalid zstd dataset: {exc}") from exc
+            data = self._decompressor.unused_data if self._decompressor.eof else b""
+        return b"".join(output)
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def _create_decompressor(compression: DatasetCompression) -> _Decompressor | None:
+    if compression == "gzip":
+        return _GzipDecompressor()
+    if compression == "zstd":
+        return _ZstdDecompressor()
+    return None
+
+
+def _create_parser(layout: DatasetLayout) -> _RecordParser:
+    if layout == "ndjson":
+        return NdjsonStreamParser()
+    return JsonArrayStreamParser()
+
+
+class DatasetRecordDecoder:
+    """
+    Push-style decoder turning raw (optionally compressed) dataset bytes into
+    records, usable both for file reads and for async request body chunks.
+    """
+
+    def __init__(self, dataset_format: DatasetFormat) -> None:
+        self._decompressor = _create_decompressor(dataset_format.compression)
+        self._parser = _create_parser(dataset_format.layout)
+
+    def feed(self, chunk: bytes | memoryview) -> Iterator[json_type]:
+        if self._decompressor is not None:
+            chunk = self._decompressor.decompress(chunk)
+        if chunk:
+            yield from self._parser.feed(chunk)
+
+    def close(self) -> Iterator[json_type]:
+        if self._decompressor is not None:
+            tail = self._decompressor.flush()
+            if tail:
+                yield from self._parser.feed(tail)
+        yield from self._parser.close()
+
+
+def iter_decoded_records(
+    chunks: Iterable[bytes | memoryview], *, dataset_format: DatasetFormat
+) -> Iterator[json_type]:
+    """
+    Yields the records decoded from raw dataset chunks, e.g. memory-mapped views.
+    """
+    decoder = DatasetRecordDecoder(dataset_format)
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.close()
+
+
+def iter_dataset_records(
+    file_obj: IO,
+    *,
+    dataset_format: DatasetFormat,
+    read_size: int = DEFAULT_READ_SIZE,
+) -> Iterator[json_type]:
+    """
+    Yields the records of a dataset file one at a time, decompressing on the fly.
+    """
+
+    def chunks() -> Iterator[bytes]:
+        while chunk := file_obj.read(read_size):
+            yield chunk
+
+    yield from iter_decoded_records(chunks(), dataset_format=dataset_format)
@@ -0,0 +1,163 @@
+import re
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from app.data_pipeline.ingestion.json_stream import json_type
+
+DERIVED_FIELD = "derived"
+
+DerivedFieldFn = Callable[[json_type], Any]
+
+_DERIVED_FIELDS: dict[str, DerivedFieldFn] = {}
+
+MANA_SYMBOL_PATTERN = re.compile(r"\{([^}]+)\}")
+PIP_COLORS = ("W", "U", "B", "R", "G", "C")
+
+
+def register_derived_field(name: str) -> Callable[[DerivedFieldFn], DerivedFieldFn]:
+    """
+    Registers a function computing one derived field from a raw record.
+    Derived values are stored under `derived.<name>`.
+    """
+
+    def decorator(fn: DerivedFieldFn) -> DerivedFieldFn:
+        _DERIVED_FIELDS[name] = fn
+        return fn
+
+    return decorator
+
+
+def get_derived_field_names() -> list[str]:
+    return list(_DERIVED_FIELDS)
+
+
+def _card_faces(record: json_type) -> list[json_type]:
+    faces = record.get("card_faces")
+    if not isinstance(faces, list):
+        return []
+    return [face for face in faces if isinstance(face, dict)]
+
+
+def _face_values(record: json_type, field: str) -> list[Any]:
+    """Top-level value if present, otherwise the value of every card face."""
+    value = record.get(field)
+    if value is not None:
+        return [value]
+    return [face[field] for face in _card_faces(record) if face.get(field) is not None]
+
+
+def _to_float(value: Any) -> float | None:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@register_derived_field("mana_pips")
+def _mana_pips(record: json_type) -> dict[str, int]:
+    pips = dict.fromkeys(PIP_COLORS, 0)
+    for mana_cost in _face_values(record, "mana_cost"):
+        for symbol in MANA_SYMBOL_PATTERN.findall(str(mana_cost)):
+            # Hybrid and Phyrexian symbols, e.g. {W/U} or {G/P}, count for each color
+            for part in symbol.upper().split("/"):
+                if part in pips:
+                    pips[part] += 1
+    return pips
+
+
+@register_derived_field("power_value")
+def _power_value(record: json_type) -> float | None:
+    return next(
+        (
+            parsed
+            for value in _face_values(record, "power")
+            if (parsed := _to_float(value)) is not None
+        ),
+        None,
+    )
+
+
+@register_derived_field("toughness_value")
+def _toughness_value(record: json_type) -> float | None:
+    return next(
+        (
+            parsed
+            for value in _face_values(record, "toughness")
+            if (parsed := _to_float(value)) is not None
+        ),
+        None,
+    )
+
+
+@register_derived_field("price_usd")
+def _price_usd(record: json_type) -> float | None:
+    prices = record.get("prices")
+    return _to_float(prices.get("usd")) if isinstance(prices, dict) else None
+
+
+@register_derived_field("price_usd_foil")
+def _price_usd_foil(record: json_type) -> float | None:
+    prices = record.get("prices")
+    return _to_float(prices.get("usd_foil")) if isinstance(prices, dict) else None
+
+
+@register_derived_field("price_eur")
+def _price_eur(record: json_type) -> float | None:
+    prices = record.get("prices")
+    return _to_float(prices.get("eur")) if isinstance(prices, dict) else None
+
+
+@register_derived_field("legal_formats")
+def _legal_formats(record: json_type) -> list[str]:
+    legalities = record.get("legalities")
+    if not isinstance(legalities, dict):
+        return []
+    return sorted(fmt for fmt, status in legalities.items() if status == "legal")
+
+
+@register_derived_field("oracle_text_full")
+def _oracle_text_full(record: json_type) -> str | None:
+    texts = [str(text) for text in _face_values(record, "oracle_text") if text]
+    return "\n//\n".join(texts) if texts else None
+
+
+def _split_type_line(record: json_type) -> tuple[list[str], list[str]]:
+    types: list[str] = []
+    subtypes: list[str] = []
+    for type_line in _face_values(record, "type_line"):
+        for face_type_line in str(type_line).split("//"):
+            main, _, sub = face_type_line.partition("—")
+            types.extend(main.split())
+            subtypes.extend(sub.split())
+    return list(dict.fromkeys(types)), list(dict.fromkeys(subtypes))
+
+
+@register_derived_field("types")
+def _types(record: json_type) -> list[str]:
+    return _split_type_line(record)[0]
+
+
+@register_derived_field("subtypes")
+def _subtypes(record: json_type) -> list[str]:
+    return _split_type_line(record)[1]
+
+
+class DerivedFieldStage:
+    """
+    Computes the selected derived fields once per record at ingest time, so
+    searches can use plain term/range filters instead of parsing raw strings.
+    """
+
+    def __init__(self, names: Iterable[str] | None = None) -> None:
+        selected = get_derived_field_names() if names is None else list(names)
+        unknown = sorted(set(selected) - set(_DERIVED_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown derived fields: {', '.join(unknown)}")
+        self._fields = [(name, _DERIVED_FIELDS[name]) for name in selected]
+
+    def apply(self, record: json_type) -> json_type:
+        if self._fields:
+            record[DERIVED_FIELD] = {name: fn(record) for name, fn in self._fields}
+        return record
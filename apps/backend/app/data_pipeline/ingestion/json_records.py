@@ -1,36 +1,61 @@
-import json
-from typing import IO, Any, Dict, Iterator, Optional
+import multiprocessing
+from collections.abc import AsyncIterator, Iterator
+from functools import partial
+from pathlib import Path
+from typing import IO
 
 from loguru import logger
-from pymongo import UpdateOne
+from pymongo import UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError, OperationFailure
 
 from app.core.config import db_settings
 from app.core.db import Database
+from app.core.hashing import CONTENT_HASH_FIELD, hash_record
+from app.core.resources import available_cpus
+from app.data_pipeline.ingestion.byte_ranges import (
+    ByteRange,
+    iter_mmap_chunks,
+    iter_range_chunks,
+    split_line_ranges,
+)
+from app.data_pipeline.ingestion.dataset_formats import (
+    DatasetFormat,
+    DatasetRecordDecoder,
+    iter_dataset_records,
+    iter_decoded_records,
+)
+from app.data_pipeline.ingestion.derived_fields import DerivedFieldStage
+from app.data_pipeline.ingestion.json_stream import (
+    NdjsonStreamParser,
+    get_fast_json_loads,
+    json_type,
+)
+from app.data_pipeline.ingestion.record_rules import RecordRuleSet
+from app.models.ingestion import IngestionMode, IngestionResult, RecordRules
 
-json_type = Dict[str, Any]
+_db_instance: Database | None = None
 
-_db_instance: Optional[Database] = None
+# Spawned workers start clean instead of forking the API process, its threads
+# and its MongoClient
+_pool_context = multiprocessing.get_context("spawn")
 
+_DUPLICATE_KEY_ERROR = 11000
 
-def __load_json_file_as_list(file_obj: IO) -> list[json_type]:
-    logger.info("Loading dataset from stream into list of JSON records")
 
-    data = json.load(file_obj)
-    if not isinstance(data, list):
-        raise ValueError(f"Expected record list, got {type(data)}")
-    return data
+async def __iter_records(records: Iterator[json_type]) -> AsyncIterator[json_type]:
+    for record in records:
+        yield record
 
 
-def __parse_dataset(
-    dataset: list[json_type], *, limit: Optional[int]
-) -> Iterator[json_type]:
-    logger.debug(f"Parsing dataset (limit={limit})")
-    yielded = 0
-    for data in dataset:
-        yield data
-        yielded += 1
-        if limit is not None and yielded >= limit:
-            return
+async def __iter_body_records(
+    chunks: AsyncIterator[bytes], *, dataset_format: DatasetFormat
+) -> AsyncIterator[json_type]:
+    decoder = DatasetRecordDecoder(dataset_format)
+    async for chunk in chunks:
+        for record in decoder.feed(chunk):
+            yield record
+    for record in decoder.close():
+        yield record
 
 
 def _get_db() -> Database:
@@ -40,59 +65,453 @@ def _get_db() -> Database:
     return _db_instance
 
 
-async def __upsert_records(
+def _prepare_record(record: json_type) -> str:
+    """
+    Stamps the content hash on a record and makes sure it has an `id`.
+    For Scryfall cards, we use 'id' as the unique identifier; records without one
+    are keyed by their content hash so re-ingesting them is idempotent.
+    """
+    content_hash = hash_record(record)
+    record[CONTENT_HASH_FIELD] = content_hash
+    if not record.get("id"):
+        record["id"] = content_hash
+    return str(record["id"])
+
+
+def __upsert_changed_records(
     *, records: list[json_type], collection: str
-) -> bool:
+) -> tuple[IngestionResult, list[str]]:
     """
-    Upserts records into MongoDB.
+    Upserts records into MongoDB, skipping records whose content hash matches
+    the stored one so unchanged documents are never rewritten. Returns the
+    counts along with the ids of the records that were written.
     """
+    result = IngestionResult()
+    changed_ids: list[str] = []
     if not records:
-        return False
+        return result, changed_ids
+
+    # Deduplicate within the batch (last record wins) and hash each record
+    keyed_records: dict[str, json_type] = {}
+    for record in records:
+        keyed_records[_prepare_record(record)] = record
+    result.duplicates = len(records) - len(keyed_records)
+
+    db_collection = _get_db().get_collection(collection)
+
+    cursor = db_collection.find(
+        {"id": {"$in": [record["id"] for record in keyed_records.values()]}},
+        {"_id": 0, "id": 1, CONTENT_HASH_FIELD: 1},
+    )
+    stored_hashes: dict[str, str | None] = {
+        str(doc["id"]): doc.get(CONTENT_HASH_FIELD) for doc in cursor
+    }
 
     # Prepare MongoDB operations
     operations = []
 
-    for record in records:
-        # For Scryfall cards, we use 'id' as the unique identifier
-        record_id = record.get("id")
-        if record_id:
-            operations.append(
-                UpdateOne({"id": record_id}, {"$set": record}, upsert=True)
-            )
+    for record_id, record in keyed_records.items():
+        if record_id not in stored_hashes:
+            result.inserted += 1
+        elif stored_hashes[record_id] != record[CONTENT_HASH_FIELD]:
+            result.updated += 1
         else:
-            # Fallback for non-Scryfall records if any
-            operations.append(UpdateOne(record, {"$set": record}, upsert=True))
+            result.unchanged += 1
+            continue
+        changed_ids.append(record_id)
+        operations.append(
+            UpdateOne({"id": record["id"]}, {"$set": record}, upsert=True)
+        )
+
+    if operations:
+        try:
+            db_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            __count_concurrent_inserts(exc, result=result, changed_ids=changed_ids)
+    logger.info(
+        f"Upserted {len(operations)} of {len(records)} records into MongoDB "
+        f"collection: {collection} (inserted={result.inserted}, "
+        f"updated={result.updated}, unchanged={result.unchanged}, "
+        f"duplicates={result.duplicates})"
+    )
+
+    return result, changed_ids
+
+
+def __count_concurrent_inserts(
+    exc: BulkWriteError, *, result: IngestionResult, changed_ids: list[str]
+) -> None:
+    """
+    Counts upserts that lost an insert race on the unique `id` index, e.g. when
+    the same id appears in two byte ranges written by different workers. The
+    record the other writer stored wins; any other write error is re-raised.
+    """
+    write_errors = exc.details.get("writeErrors", [])
+    if any(error["code"] != _DUPLICATE_KEY_ERROR for error in write_errors):
+        raise exc
+    # Ops and changed ids are built in the same order, and only inserts can race
+    failed = {error["index"] for error in write_errors}
+    changed_ids[:] = [
+        record_id for index, record_id in enumerate(changed_ids) if index not in failed
+    ]
+    result.inserted -= len(failed)
+    result.duplicates += len(failed)
+    logger.warning(f"Skipped {len(failed)} records inserted concurrently elsewhere")
+
+
+def __upsert_records(*, records: list[json_type], collection: str) -> IngestionResult:
+    result, _changed_ids = __upsert_changed_records(
+        records=records, collection=collection
+    )
+    return result
+
+
+def upsert_record_batch(
+    *, records: list[json_type], collection: str
+) -> tuple[IngestionResult, list[str]]:
+    """
+    Upserts one batch, for pipelines that pass the changed records onward.
+    Only this batch's changed ids are returned, so memory stays bounded by
+    the batch size however large the dataset is.
+    """
+    return __upsert_changed_records(records=records, collection=collection)
+
+
+def _staging_collection_name(collection: str) -> str:
+    return f"{collection}__staging"
+
+
+def __prepare_staging_collection(collection: str) -> str:
+    staging_collection = _staging_collection_name(collection)
+    # Drop leftovers from a previously interrupted bulk load
+    _get_db().db.drop_collection(staging_collection)
+    logger.info(f"Bulk loading into staging collection: {staging_collection}")
+    return staging_collection
+
+
+def __insert_staging_records(
+    *, records: list[json_type], collection: str
+) -> IngestionResult:
+    """
+    Appends records to a staging collection with plain inserts. The staging
+    collection has no indexes yet and nobody reads it, so acknowledgement from the
+    primary without journaling is enough.
+    """
+    result = IngestionResult()
+    if not records:
+        return result
+
+    for record in records:
+        _prepare_record(record)
 
     db_collection = _get_db().get_collection(collection)
-    db_collection.bulk_write(operations, ordered=False)
-    logger.info(f"Upserted {len(records)} records into MongoDB collection: {collection}")
+    db_collection.with_options(write_concern=WriteConcern(w=1, j=False)).insert_many(
+        records, ordered=False
+    )
+    result.inserted = len(records)
+    logger.info(
+        f"Inserted {len(records)} records into staging collection: {collection}"
+    )
+    return result
+
+
+def __swap_staging_collection(*, staging_collection: str, collection: str) -> None:
+    """
+    Builds the record indexes on the fully loaded staging collection, then renames
+    it over the target in a single step so readers never see a partial load.
+    """
+    db = _get_db()
+    try:
+        db.create_record_indexes(collection=staging_collection)
+    except OperationFailure as exc:
+        raise ValueError(
+            f"Failed to index bulk loaded records (duplicate ids?): {exc}"
+        ) from exc
+
+    db.get_collection(staging_collection).rename(collection, dropTarget=True)
+    logger.info(f"Swapped staging collection {staging_collection} into {collection}")
 
-    return True
+
+async def __insert_records(
+    records: AsyncIterator[json_type],
+    *,
+    collection: str,
+    limit: int | None,
+    mode: IngestionMode = "upsert",
+    rules: RecordRules | None = None,
+    derived_fields: list[str] | None = None,
+    batch_size: int | None = None,
+) -> IngestionResult:
+    logger.debug(f"Parsing dataset (limit={limit}, mode={mode}, rules={rules})")
+    batch_size = batch_size or db_settings.batch_size
+    rule_set = RecordRuleSet(rules or RecordRules())
+    derived_stage = DerivedFieldStage(derived_fields)
+
+    total_records_processed = 0
+    record_batch: list[json_type] = []
+    result = IngestionResult()
+
+    target_collection = collection
+    write_records = __upsert_records
+    if mode == "upsert":
+        # Upserts filter on `id`; without the index each one scans the collection
+        _get_db().create_record_indexes(collection=collection)
+    else:
+        target_collection = __prepare_staging_collection(collection)
+        write_records = __insert_staging_records
+
+    try:
+        async for parsed_record in records:
+            if not rule_set.matches(parsed_record):
+                result.filtered += 1
+                continue
+            total_records_processed += 1
+            # Derived fields read the full record, before the projection
+            record_batch.append(rule_set.project(derived_stage.apply(parsed_record)))
+            if len(record_batch) >= batch_size:
+                result.merge(
+                    write_records(records=record_batch, collection=target_collection)
+                )
+                record_batch.clear()
+            if limit is not None and total_records_processed >= limit:
+                break
+
+        if record_batch:
+            result.merge(
+                write_records(records=record_batch, collection=target_collection)
+            )
+            record_batch.clear()
+
+        if mode == "bulk_load":
+            __swap_staging_collection(
+                staging_collection=target_collection, collection=collection
+            )
+    except Exception:
+        if mode == "bulk_load":
+            _get_db().db.drop_collection(target_collection)
+        raise
+
+    logger.info(
+        f"Total records processed: {total_records_processed} "
+        f"(inserted={result.inserted}, updated={result.updated}, "
+        f"unchanged={result.unchanged}, filtered={result.filtered}, "
+        f"duplicates={result.duplicates})"
+    )
+    return result
 
 
 async def run_pipeline_insert_json_dataset(
     *,
     file_obj: IO,
     collection: str,
-    limit: Optional[int],
-) -> None:
+    limit: int | None,
+    dataset_format: DatasetFormat | None = None,
+    mode: IngestionMode = "upsert",
+    rules: RecordRules | None = None,
+    derived_fields: list[str] | None = None,
+) -> IngestionResult:
     """
     Inserts a JSON dataset into a MongoDB collection.
+
+    Records are streamed from the file and written in batches of
+    `mongodb_batch_size`, so the dataset is never fully loaded into memory.
+    The file may be a JSON array or NDJSON, optionally gzip/zstd compressed.
+
+    Each record is stored with a content hash; only new or changed records are
+    written, and the returned result counts them.
+
+    In `bulk_load` mode the dataset is inserted into a fresh staging collection
+    which then atomically replaces the target, for fast full reloads.
+
+    `rules` filter and project records while streaming, before anything is written.
+
+    `derived_fields` selects the derived fields computed from each kept record
+    and stored under `derived` (all registered fields by default, none if empty).
     """
+    dataset_format = dataset_format or DatasetFormat()
+    logger.info(
+        "Streaming dataset records from file "
+        f"(layout={dataset_format.layout}, compression={dataset_format.compression})"
+    )
+    return await __insert_records(
+        __iter_records(iter_dataset_records(file_obj, dataset_format=dataset_format)),
+        collection=collection,
+        limit=limit,
+        mode=mode,
+        rules=rules,
+        derived_fields=derived_fields,
+    )
 
-    total_records_processed = 0
+
+async def run_pipeline_insert_json_stream(
+    *,
+    chunks: AsyncIterator[bytes],
+    collection: str,
+    limit: int | None,
+    dataset_format: DatasetFormat | None = None,
+    mode: IngestionMode = "upsert",
+    rules: RecordRules | None = None,
+    derived_fields: list[str] | None = None,
+) -> IngestionResult:
+    """
+    Inserts a JSON dataset into a MongoDB collection straight from a byte stream,
+    e.g. a raw request body, without spooling it to disk first.
+    """
+    dataset_format = dataset_format or DatasetFormat()
+    logger.info(
+        "Streaming dataset records from request body "
+        f"(layout={dataset_format.layout}, compression={dataset_format.compression})"
+    )
+    return await __insert_records(
+        __iter_body_records(chunks, dataset_format=dataset_format),
+        collection=collection,
+        limit=limit,
+        mode=mode,
+        rules=rules,
+        derived_fields=derived_fields,
+    )
+
+
+async def run_pipeline_insert_json_file(
+    *,
+    path: Path,
+    collection: str,
+    limit: int | None,
+    dataset_format: DatasetFormat,
+    mode: IngestionMode = "upsert",
+    rules: RecordRules | None = None,
+    derived_fields: list[str] | None = None,
+    batch_size: int | None = None,
+) -> IngestionResult:
+    """
+    Inserts a JSON dataset from a local file. The file is memory-mapped and
+    parsed straight from the mapping, without an upload or a temporary copy.
+    """
+    logger.info(
+        f"Streaming dataset records from memory-mapped file: {path} "
+        f"(layout={dataset_format.layout}, compression={dataset_format.compression})"
+    )
+    return await __insert_records(
+        __iter_records(
+            iter_decoded_records(iter_mmap_chunks(path), dataset_format=dataset_format)
+        ),
+        collection=collection,
+        limit=limit,
+        mode=mode,
+        rules=rules,
+        derived_fields=derived_fields,
+        batch_size=batch_size,
+    )
+
+
+def _reset_db_instance() -> None:
+    # MongoClient is not fork-safe: every worker process opens its own connection
+    global _db_instance
+    _db_instance = None
+
+
+def process_ndjson_byte_range(
+    byte_range: ByteRange,
+    *,
+    path: Path,
+    collection: str,
+    mode: IngestionMode,
+    rules: RecordRules,
+    derived_fields: list[str] | None = None,
+    batch_size: int | None = None,
+) -> IngestionResult:
+    """
+    Parses one line-aligned byte range of an NDJSON file and writes its records
+    in batches through this worker's own MongoDB connection.
+    """
+    write_records = __upsert_records if mode == "upsert" else __insert_staging_records
+    batch_size = batch_size or db_settings.batch_size
+    rule_set = RecordRuleSet(rules)
+    derived_stage = DerivedFieldStage(derived_fields)
+    parser = NdjsonStreamParser(loads=get_fast_json_loads())
+    result = IngestionResult()
     record_batch: list[json_type] = []
 
-    dataset = __load_json_file_as_list(file_obj)
-    for parsed_record in __parse_dataset(dataset, limit=limit):
-        total_records_processed += 1
-        record_batch.append(parsed_record)
-        if len(record_batch) >= db_settings.batch_size:
-            await __upsert_records(records=record_batch, collection=collection)
+    def records() -> Iterator[json_type]:
+        for chunk in iter_range_chunks(path, byte_range):
+            yield from parser.feed(chunk)
+        yield from parser.close()
+
+    for record in records():
+        if not rule_set.matches(record):
+            result.filtered += 1
+            continue
+        record_batch.append(rule_set.project(derived_stage.apply(record)))
+        if len(record_batch) >= batch_size:
+            result.merge(write_records(records=record_batch, collection=collection))
             record_batch.clear()
 
     if record_batch:
-        await __upsert_records(records=record_batch, collection=collection)
-        record_batch.clear()
+        result.merge(write_records(records=record_batch, collection=collection))
+
+    return result
+
+
+def run_pipeline_insert_ndjson_parallel(
+    *,
+    path: Path,
+    collection: str,
+    mode: IngestionMode = "upsert",
+    rules: RecordRules | None = None,
+    derived_fields: list[str] | None = None,
+    processes: int | None = None,
+    batch_size: int | None = None,
+) -> IngestionResult:
+    """
+    Inserts an uncompressed NDJSON file using a process pool. The file is split
+    into line-aligned byte ranges and every worker parses its ranges and writes
+    them with its own `bulk_write`, so throughput scales with the number of cores.
+    """
+    processes = processes or available_cpus()
+    # A few ranges per worker keeps the pool busy when ranges parse unevenly
+    byte_ranges = split_line_ranges(path, parts=processes * 4)
+    logger.info(
+        f"Starting parallel NDJSON ingestion: path={path}, "
+        f"collection={collection}, mode={mode}, ranges={len(byte_ranges)}, "
+        f"processes={processes}"
+    )
+
+    target_collection = collection
+    if mode == "upsert":
+        _get_db().create_record_indexes(collection=collection)
+    else:
+        target_collection = __prepare_staging_collection(collection)
+
+    result = IngestionResult()
+    try:
+        with _pool_context.Pool(
+            processes=processes, initializer=_reset_db_instance
+        ) as pool:
+            partial_worker = partial(
+                process_ndjson_byte_range,
+                path=path,
+                collection=target_collection,
+                mode=mode,
+                rules=rules or RecordRules(),
+                derived_fields=derived_fields,
+                batch_size=batch_size,
+            )
+            for range_result in pool.imap_unordered(partial_worker, byte_ranges):
+                result.merge(range_result)
+
+        if mode == "bulk_load":
+            __swap_staging_collection(
+                staging_collection=target_collection, collection=collection
+            )
+    except Exception:
+        if mode == "bulk_load":
+            _get_db().db.drop_collection(target_collection)
+        raise
 
-    logger.info(f"Total records processed: {total_records_processed}")
+    logger.info(
+        f"Total records processed: {result.total} "
+        f"(inserted={result.inserted}, updated={result.updated}, "
+        f"unchanged={result.unchanged}, filtered={result.filtered}, "
+        f"duplicates={result.duplicates})"
+    )
+    return result
@@ -0,0 +1,202 @@
+import codecs
+import json
+from collections.abc import Callable, Iterator
+from typing import IO, Any
+
+json_type = dict[str, Any]
+JsonLoads = Callable[[bytes], Any]
+
+DEFAULT_READ_SIZE = 1024 * 1024
+# Upper bound for a single buffered record, so a malformed dataset fails fast
+# instead of buffering the rest of the upload while waiting for a closing brace.
+MAX_RECORD_CHARS = 64 * 1024 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+class RecordTypeError(ValueError):
+    """A dataset record is valid JSON but not an object."""
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for a top-level JSON array of objects.
+
+    Bytes are pushed in with `feed` as they arrive and complete records are yielded
+    as soon as their closing brace is seen, so memory is bounded by the largest
+    single record rather than by the size of the dataset.
+    """
+
+    def __init__(self, *, max_record_chars: int = MAX_RECORD_CHARS) -> None:
+        self._max_record_chars = max_record_chars
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._expect_value = True
+        self._record_count = 0
+
+    def feed(self, chunk: bytes | memoryview | str) -> Iterator[json_type]:
+        if isinstance(chunk, str):
+            self._buffer += chunk
+        else:
+            self._buffer += self._text_decoder.decode(chunk)
+        yield from self._drain(final=False)
+
+    def close(self) -> Iterator[json_type]:
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        yield from self._drain(final=True)
+        if not self._finished:
+            raise ValueError("Unexpected end of JSON dataset: unterminated array")
+
+    def _skip_whitespace(self) -> None:
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+
+    def _compact(self) -> None:
+        if self._pos:
+            self._buffer = self._buffer[self._pos :]
+            self._pos = 0
+
+    def _drain(self, *, final: bool) -> Iterator[json_type]:
+        while True:
+            self._skip_whitespace()
+            if self._pos >= len(self._buffer):
+                self._compact()
+                return
+
+            if self._finished:
+                raise ValueError("Unexpected data after the end of the JSON array")
+
+            char = self._buffer[self._pos]
+            if not self._started:
+                if char != "[":
+                    raise ValueError(
+                        f"Expected record list, got JSON starting with {char!r}"
+                    )
+                self._started = True
+                self._pos += 1
+                continue
+
+            if char == "]":
+                if self._expect_value and self._record_count > 0:
+                    raise ValueError("Unexpected ']' after ',' in JSON array")
+                self._finished = True
+                self._pos += 1
+                continue
+
+            if char == ",":
+                if self._expect_value:
+                    raise ValueError("Unexpected ',' in JSON array")
+                self._expect_value = True
+                self._pos += 1
+                continue
+
+            if not self._expect_value:
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+
+            try:
+                record, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # The record is split across chunks; wait for more data.
+                self._compact()
+                if len(self._buffer) > self._max_record_chars:
+                    raise ValueError(
+                        "JSON record exceeds the maximum supported size of "
+                        f"{self._max_record_chars} characters"
+                    )
+                return
+
+            if not isinstance(record, dict):
+                raise RecordTypeError(
+                    f"Expected JSON object record, got {type(record)}"
+                )
+
+            self._pos = end
+            self._expect_value = False
+            self._record_count += 1
+            yield record
+
+
+def get_fast_json_loads() -> JsonLoads:
+    """
+    Returns `orjson.loads` when the optional orjson package is installed,
+    falling back to the standard library decoder.
+    """
+    try:
+        import orjson  # type: ignore[import-not-found]
+    except ImportError:
+        return json.loads
+    return orjson.loads
+
+
+class NdjsonStreamParser:
+    """
+    Incremental parser for newline-delimited JSON (one object per line).
+    Blank lines are skipped.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_record_chars: int = MAX_RECORD_CHARS,
+        loads: JsonLoads = json.loads,
+    ) -> None:
+        self._max_record_chars = max_record_chars
+        self._loads = loads
+        self._buffer = b""
+        self._line_number = 0
+
+    def feed(self, chunk: bytes | memoryview | str) -> Iterator[json_type]:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        self._buffer += chunk
+        lines = self._buffer.split(b"\n")
+        self._buffer = lines.pop()
+        if len(self._buffer) > self._max_record_chars:
+            raise ValueError(
+                "NDJSON record exceeds the maximum supported size of "
+                f"{self._max_record_chars} characters"
+            )
+        for line in lines:
+            yield from self._parse_line(line)
+
+    def close(self) -> Iterator[json_type]:
+        line, self._buffer = self._buffer, b""
+        yield from self._parse_line(line)
+
+    def _parse_line(self, line: bytes) -> Iterator[json_type]:
+        self._line_number += 1
+        if not line.strip():
+            return
+        try:
+            record = self._loads(line)
+        except ValueError as exc:
+            raise ValueError(
+                f"Invalid JSON on NDJSON line {self._line_number}: {exc}"
+            ) from exc
+        if not isinstance(record, dict):
+            raise RecordTypeError(
+                f"Expected JSON object on NDJSON line {self._line_number}, "
+                f"got {type(record)}"
+            )
+        yield record
+
+
+def iter_json_array_records(
+    file_obj: IO, *, read_size: int = DEFAULT_READ_SIZE
+) -> Iterator[json_type]:
+    """
+    Yields the records of a JSON array file one at a time.
+    """
+    parser = JsonArrayStreamParser()
+    while True:
+        chunk = file_obj.read(read_size)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
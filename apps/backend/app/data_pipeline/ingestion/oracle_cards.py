@@ -0,0 +1,182 @@
+import uuid
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from loguru import logger
+from pymongo.errors import DuplicateKeyError
+
+from app.core.db import (
+    CHUNK_SOURCE_CARD_FIELD,
+    ORACLE_BUILD_ID_FIELD,
+    ORACLE_ID_FIELD,
+    Database,
+)
+from app.core.hashing import CONTENT_HASH_FIELD
+from app.models.ingestion import OracleCardsResult
+
+_db_instance: Database | None = None
+
+ORACLE_BUILD_LOCKS_COLLECTION = "oracle_card_build_locks"
+# A crashed build releases its target once the lease runs out
+_BUILD_LEASE = timedelta(hours=1)
+
+
+class OracleBuildInProgressError(RuntimeError):
+    pass
+
+
+# Printings are ranked so the first one per oracle_id becomes the canonical one:
+# English paper printings first, then non-promo and non-variant, newest first.
+_CANONICAL_SORT = {
+    "_is_english": -1,
+    "digital": 1,
+    "promo": 1,
+    "variation": 1,
+    "released_at": -1,
+    "id": 1,
+}
+
+
+def _get_db() -> Database:
+    global _db_instance
+    if _db_instance is None:
+        _db_instance = Database()
+    return _db_instance
+
+
+def _oracle_cards_pipeline(
+    *, target_collection: str, build_id: str
+) -> list[dict[str, Any]]:
+    return [
+        {
+            "$addFields": {
+                # Reversible cards only carry the oracle_id on their faces
+                "_oracle_id": {
+                    "$ifNull": [
+                        f"${ORACLE_ID_FIELD}",
+                        {"$first": f"$card_faces.{ORACLE_ID_FIELD}"},
+                    ]
+                },
+                "_is_english": {"$eq": ["$lang", "en"]},
+            }
+        },
+        {"$match": {"_oracle_id": {"$type": "string"}}},
+        {"$sort": _CANONICAL_SORT},
+        {
+            "$group": {
+                "_id": "$_oracle_id",
+                "canonical": {"$first": "$$ROOT"},
+                "printing_ids": {"$push": "$id"},
+                "sets": {"$addToSet": "$set"},
+                "printings_count": {"$sum": 1},
+            }
+        },
+        {
+            "$replaceRoot": {
+                "newRoot": {
+                    "$mergeObjects": [
+                        "$canonical",
+                        {
+                            ORACLE_ID_FIELD: "$_id",
+                            "canonical_id": "$canonical.id",
+                            CHUNK_SOURCE_CARD_FIELD: {"$toString": "$canonical._id"},
+                            "printing_ids": "$printing_ids",
+                            "sets": "$sets",
+                            "printings_count": "$printings_count",
+                            ORACLE_BUILD_ID_FIELD: build_id,
+                        },
+                    ]
+                }
+            }
+        },
+        # Without `_id`, matched documents keep theirs, so ids referenced by
+        # chunks and embeddings stay stable across rebuilds
+        {"$unset": ["_id", "_oracle_id", "_is_english", CONTENT_HASH_FIELD]},
+        {
+            "$merge": {
+                "into": target_collection,
+                "on": ORACLE_ID_FIELD,
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+
+
+def __acquire_build_lock(target_collection: str, *, build_id: str) -> None:
+    """
+    Leases the target collection to one build. Concurrent builds would each
+    delete the documents merged by the other, as their build ids differ.
+    """
+    now = datetime.now(UTC)
+    try:
+        # An active lease does not match, so the upsert collides on `_id`
+        _get_db().get_collection(ORACLE_BUILD_LOCKS_COLLECTION).update_one(
+            {"_id": target_collection, "expires_at": {"$lt": now}},
+            {
+                "$set": {
+                    ORACLE_BUILD_ID_FIELD: build_id,
+                    "expires_at": now + _BUILD_LEASE,
+                }
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError as exc:
+        raise OracleBuildInProgressError(
+            f"An oracle cards build into {target_collection} is already running."
+        ) from exc
+
+
+def __release_build_lock(target_collection: str, *, build_id: str) -> None:
+    _get_db().get_collection(ORACLE_BUILD_LOCKS_COLLECTION).delete_one(
+        {"_id": target_collection, ORACLE_BUILD_ID_FIELD: build_id}
+    )
+
+
+def run_pipeline_build_oracle_cards(
+    *, source_collection: str, target_collection: str
+) -> OracleCardsResult:
+    """
+    Builds an oracle-level collection with one document per `oracle_id`.
+
+    Each document is a copy of the canonical printing plus `canonical_id`,
+    `printing_ids`, `sets` and `printings_count`, so chunk mappings written for
+    printings work unchanged. Chunks of oracle cards point at the canonical
+    printing's `_id`. The aggregation runs entirely in MongoDB and
+    merges into the target; oracle cards no longer present in the source are
+    removed afterwards. Only one build per target runs at a time.
+    """
+    db = _get_db()
+    build_id = uuid.uuid4().hex
+    logger.info(
+        "Building oracle cards: "
+        f"source={source_collection}, target={target_collection}, build={build_id}"
+    )
+
+    __acquire_build_lock(target_collection, build_id=build_id)
+    try:
+        db.create_oracle_card_indexes(collection=target_collection)
+        db.get_collection(source_collection).aggregate(
+            _oracle_cards_pipeline(
+                target_collection=target_collection, build_id=build_id
+            ),
+            allowDiskUse=True,
+        )
+
+        db_collection = db.get_collection(target_collection)
+        removed = db_collection.delete_many(
+            {ORACLE_BUILD_ID_FIELD: {"$ne": build_id}}
+        ).deleted_count
+        result = OracleCardsResult(
+            oracle_cards=db_collection.count_documents(
+                {ORACLE_BUILD_ID_FIELD: build_id}
+            ),
+            removed=removed,
+        )
+    finally:
+        __release_build_lock(target_collection, build_id=build_id)
+    logger.info(
+        f"Built {result.oracle_cards} oracle cards into {target_collection} "
+        f"(removed={result.removed})"
+    )
+    return result
@@ -0,0 +1,120 @@
+from typing import Any
+
+from app.data_pipeline.ingestion.derived_fields import DERIVED_FIELD
+from app.data_pipeline.ingestion.json_stream import json_type
+from app.models.ingestion import RecordFilter, RecordRules
+
+_MISSING = object()
+
+# Always kept so records can still be keyed and upserted
+_REQUIRED_FIELDS = ("id",)
+
+
+def _split_path(field: str) -> tuple[str, ...]:
+    return tuple(field.split("."))
+
+
+def _get_path(record: json_type, path: tuple[str, ...]) -> Any:
+    current: Any = record
+    for part in path:
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _copy_path(source: json_type, target: json_type, path: tuple[str, ...]) -> None:
+    value = _get_path(source, path)
+    if value is _MISSING:
+        return
+    current = target
+    for part in path[:-1]:
+        current = current.setdefault(part, {})
+        if not isinstance(current, dict):
+            return
+    current[path[-1]] = value
+
+
+def _delete_path(record: json_type, path: tuple[str, ...]) -> None:
+    current: Any = record
+    for part in path[:-1]:
+        if not isinstance(current, dict):
+            return
+        current = current.get(part)
+    if isinstance(current, dict):
+        current.pop(path[-1], None)
+
+
+def _matches(value: Any, record_filter: RecordFilter) -> bool:
+    op = record_filter.op
+    expected = record_filter.value
+    if op == "exists":
+        return (value is not _MISSING) == expected
+    if op == "eq":
+        return value is not _MISSING and value == expected
+    if op == "ne":
+        return value is _MISSING or value != expected
+    if op == "in":
+        return value is not _MISSING and value in expected
+    if op == "not_in":
+        return value is _MISSING or value not in expected
+
+    contains = False
+    if isinstance(value, (list, tuple)) or (
+        isinstance(value, str) and isinstance(expected, str)
+    ):
+        contains = expected in value
+    return contains if op == "contains" else not contains
+
+
+class RecordRuleSet:
+    """
+    Applies ingestion record rules while streaming: records failing any filter
+    are dropped, then the include/exclude projections are applied.
+    Field paths are split once up front since rules run for every record.
+
+    Derived fields are computed from the full record between `matches` and
+    `project`, and the projection keeps them unless they are excluded or
+    `include_fields` names some of them.
+    """
+
+    def __init__(self, rules: RecordRules) -> None:
+        self._filters = [
+            (_split_path(record_filter.field), record_filter)
+            for record_filter in rules.filters
+        ]
+        self._include_paths = [_split_path(field) for field in rules.include_fields]
+        if self._include_paths:
+            self._include_paths.extend(
+                _split_path(field)
+                for field in _REQUIRED_FIELDS
+                if field not in rules.include_fields
+            )
+            if not any(path[0] == DERIVED_FIELD for path in self._include_paths):
+                self._include_paths.append((DERIVED_FIELD,))
+        self._exclude_paths = [
+            _split_path(field)
+            for field in rules.exclude_fields
+            if field not in _REQUIRED_FIELDS
+        ]
+
+    def matches(self, record: json_type) -> bool:
+        return all(
+            _matches(_get_path(record, path), record_filter)
+            for path, record_filter in self._filters
+        )
+
+    def project(self, record: json_type) -> json_type:
+        if self._include_paths:
+            projected: json_type = {}
+            for path in self._include_paths:
+                _copy_path(record, projected, path)
+            record = projected
+
+        for path in self._exclude_paths:
+            _delete_path(record, path)
+
+        return record
+
+    def apply(self, record: json_type) -> json_type | None:
+        return self.project(record) if self.matches(record) else None
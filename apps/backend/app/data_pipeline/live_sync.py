@@ -0,0 +1,349 @@
+"""
+Keeps chunks, embeddings and Elasticsearch in sync with the cards collection by
+following its change stream:
+
+    python -m app.data_pipeline.live_sync
+"""
+
+import asyncio
+from collections.abc import Mapping
+from contextlib import suppress
+from typing import Any
+
+from elasticsearch import AsyncElasticsearch
+from loguru import logger
+from pydantic import ValidationError
+from pymongo.change_stream import CollectionChangeStream
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.core.config import (
+    db_settings,
+    elasticsearch_settings,
+    live_sync_settings,
+)
+from app.core.db import CHUNK_SOURCE_ID_FIELD, Database
+from app.core.elasticsearch import get_elasticsearch_client
+from app.data_pipeline.embeddings import create_chunks, generate_from_chunks
+from app.models.db import EmptyEmbeddingRecord, ScryfallCardRecord
+from app.services.card_indexer import index_cards
+
+_db_instance: Database | None = None
+
+SYNC_STATE_COLLECTION = "sync_state"
+
+_WATCHED_OPERATIONS = ["insert", "update", "replace", "delete"]
+# Dropping or renaming the collection (a bulk load renames its staging collection
+# over it) ends the stream with an invalidate event
+_INVALIDATING_OPERATIONS = ["drop", "rename", "invalidate"]
+# The resume token is older than the oplog: resuming would silently skip changes
+_CHANGE_STREAM_HISTORY_LOST = 286
+# Pause before reopening a change stream that failed
+_RETRY_DELAY_SECONDS = 5.0
+# Attempts at a batch before its changes are applied one by one, skipping the
+# ones that still fail
+_MAX_BATCH_ATTEMPTS = 5
+
+
+def _get_db() -> Database:
+    global _db_instance
+    if _db_instance is None:
+        _db_instance = Database()
+    return _db_instance
+
+
+class LiveSync:
+    """
+    Follows the change stream of a cards collection and applies each batch of
+    changes downstream: chunks are re-rendered incrementally, chunks whose
+    summary changed are re-embedded and cards are re-indexed (or deleted) in
+    Elasticsearch. The resume token is stored after every applied batch, so a
+    restarted worker continues where it stopped.
+    """
+
+    def __init__(
+        self,
+        *,
+        collection: str,
+        target_collection: str,
+        chunk_templates: dict[str | None, str],
+        es: AsyncElasticsearch | None,
+        batch_size: int = 100,
+        max_await_ms: int = 1000,
+    ) -> None:
+        if not chunk_templates:
+            raise ValueError("Live sync requires chunk_mappings or chunk_templates.")
+        self.collection = collection
+        self.target_collection = target_collection
+        self.chunk_templates = chunk_templates
+        self.es = es
+        self.batch_size = batch_size
+        self.max_await_ms = max_await_ms
+        self.state_id = f"live_sync:{collection}:{target_collection}"
+
+    def load_resume_token(self) -> tuple[Mapping[str, Any] | None, bool]:
+        """
+        Returns the stored resume token and whether it is the token of an
+        invalidate event, which a new stream can only start after.
+        """
+        state = (
+            _get_db()
+            .get_collection(SYNC_STATE_COLLECTION)
+            .find_one({"_id": self.state_id})
+        )
+        if not state:
+            return None, False
+        return state.get("resume_token"), state.get("invalidated", False)
+
+    def save_resume_token(
+        self,
+        resume_token: Mapping[str, Any] | None,
+        *,
+        reset: bool = False,
+        invalidated: bool = False,
+    ) -> None:
+        state_collection = _get_db().get_collection(SYNC_STATE_COLLECTION)
+        if reset:
+            state_collection.delete_one({"_id": self.state_id})
+            return
+        if resume_token is None:
+            return
+        state_collection.update_one(
+            {"_id": self.state_id},
+            {"$set": {"resume_token": resume_token, "invalidated": invalidated}},
+            upsert=True,
+        )
+
+    def record_skipped_cards(self, card_ids: list[Any]) -> None:
+        # Kept so the skipped cards can be re-synced, e.g. by a refresh
+        _get_db().get_collection(SYNC_STATE_COLLECTION).update_one(
+            {"_id": self.state_id},
+            {"$addToSet": {"skipped_card_ids": {"$each": card_ids}}},
+            upsert=True,
+        )
+
+    def open_stream(self) -> CollectionChangeStream:
+        resume_token, invalidated = self.load_resume_token()
+        logger.info(
+            f"Watching collection {self.collection} "
+            f"({'resuming' if resume_token else 'from now'})"
+        )
+        return (
+            _get_db()
+            .get_collection(self.collection)
+            .watch(
+                [
+                    {
+                        "$match": {
+                            "operationType": {
+                                "$in": _WATCHED_OPERATIONS + _INVALIDATING_OPERATIONS
+                            }
+                        }
+                    }
+                ],
+                full_document="updateLookup",
+                # Resuming after an invalidate event fails, starting after it does not
+                resume_after=None if invalidated else resume_token,
+                start_after=resume_token if invalidated else None,
+                max_await_time_ms=self.max_await_ms,
+            )
+        )
+
+    def read_events(self, stream: CollectionChangeStream) -> list[dict[str, Any]]:
+        """
+        Collects up to `batch_size` events; returns early once the stream has
+        been idle for `max_await_ms` or was invalidated.
+        """
+        events: list[dict[str, Any]] = []
+        while len(events) < self.batch_size:
+            event = stream.try_next()
+            if event is None:
+                break
+            events.append(event)
+            if event["operationType"] == "invalidate":
+                break
+        return events
+
+    def __render_chunks(
+        self, cards: list[dict[str, Any]]
+    ) -> list[EmptyEmbeddingRecord]:
+        chunks = create_chunks.render_chunks(
+            cards, chunk_templates=self.chunk_templates
+        )
+        # Incremental, so chunks of cards whose text did not change keep embeddings
+        return create_chunks.write_chunks(
+            chunks, target_collection=self.target_collection, incremental=True
+        )
+
+    def __delete_chunks(self, source_ids: list[str]) -> None:
+        _get_db().get_collection(self.target_collection).delete_many(
+            {CHUNK_SOURCE_ID_FIELD: {"$in": source_ids}}
+        )
+
+    def __validate_cards(self, cards: list[dict[str, Any]]) -> list[ScryfallCardRecord]:
+        # One malformed card must not block the changes replayed with it
+        records: list[ScryfallCardRecord] = []
+        for card in cards:
+            try:
+                records.append(ScryfallCardRecord.model_validate(card))
+            except ValidationError as e:
+                logger.warning(
+                    f"Live sync skipped indexing card {card.get('_id')}: {e}"
+                )
+        return records
+
+    async def apply(self, events: list[dict[str, Any]]) -> None:
+        # Only the last change per card matters
+        upserted: dict[Any, dict[str, Any]] = {}
+        deleted: set[Any] = set()
+        for event in events:
+            if event["operationType"] not in _WATCHED_OPERATIONS:
+                continue
+            card_id = event["documentKey"]["_id"]
+            full_document = event.get("fullDocument")
+            if event["operationType"] == "delete" or full_document is None:
+                # An update looked up after a later delete has no document either
+                upserted.pop(card_id, None)
+                deleted.add(card_id)
+            else:
+                deleted.discard(card_id)
+                upserted[card_id] = full_document
+
+        if deleted:
+            source_ids = [str(card_id) for card_id in deleted]
+            await asyncio.to_thread(self.__delete_chunks, source_ids)
+            if self.es is not None:
+                # Indexed cards carry their MongoDB id; it is a single lowercase
+                # token, so a term query matches keyword and text mappings alike
+                await self.es.delete_by_query(
+                    index=elasticsearch_settings.index_name,
+                    query={"terms": {"mongo_id": source_ids}},
+                    conflicts="proceed",
+                )
+
+        embedded = 0
+        if upserted:
+            cards = list(upserted.values())
+            changed_chunks = await asyncio.to_thread(self.__render_chunks, cards)
+            if changed_chunks:
+                # Changes are sparse: only duplicates within the batch are shared
+                embedded = await asyncio.to_thread(
+                    generate_from_chunks.process_batch,
+                    changed_chunks,
+                    target_collection=self.target_collection,
+                )
+            if self.es is not None:
+                await index_cards(self.__validate_cards(cards), self.es)
+
+        logger.info(
+            f"Live sync applied {len(events)} changes: {len(upserted)} upserted, "
+            f"{len(deleted)} deleted, {embedded} chunks re-embedded"
+        )
+
+    async def __apply_one_by_one(self, events: list[dict[str, Any]]) -> None:
+        # The batch keeps failing: apply what can be applied so the stream moves on
+        skipped: list[Any] = []
+        for event in events:
+            try:
+                await self.apply([event])
+            except Exception as e:  # noqa: BLE001
+                card_id = event["documentKey"]["_id"]
+                logger.opt(exception=e).error(
+                    f"Live sync skipped the {event['operationType']} of card "
+                    f"{card_id} after {_MAX_BATCH_ATTEMPTS} attempts: {e}"
+                )
+                skipped.append(card_id)
+        if skipped:
+            await asyncio.to_thread(self.record_skipped_cards, skipped)
+            logger.error(
+                f"Live sync skipped {len(skipped)} changes, recorded as "
+                f"skipped_card_ids in {SYNC_STATE_COLLECTION}. "
+                "Run a full refresh to catch up on them."
+            )
+
+    @staticmethod
+    async def __wait_to_retry(stop: asyncio.Event) -> None:
+        # Returns early on shutdown
+        with suppress(TimeoutError):
+            await asyncio.wait_for(stop.wait(), _RETRY_DELAY_SECONDS)
+
+    async def run(self, stop: asyncio.Event | None = None) -> None:
+        stop = stop or asyncio.Event()
+        await asyncio.to_thread(
+            _get_db().create_chunk_indexes, collection=self.target_collection
+        )
+        # Failed attempts at the batch following the stored resume token
+        failed_attempts = 0
+        while not stop.is_set():
+            try:
+                stream = await asyncio.to_thread(self.open_stream)
+                with stream:
+                    while stream.alive and not stop.is_set():
+                        events = await asyncio.to_thread(self.read_events, stream)
+                        if events and failed_attempts >= _MAX_BATCH_ATTEMPTS - 1:
+                            await self.__apply_one_by_one(events)
+                        elif events:
+                            try:
+                                await self.apply(events)
+                            except Exception:
+                                failed_attempts += 1
+                                raise
+                        failed_attempts = 0
+                        if events and events[-1]["operationType"] == "invalidate":
+                            logger.error(
+                                f"Live sync stream invalidated: collection "
+                                f"{self.collection} was dropped or renamed (e.g. by "
+                                "a bulk load). Watching the new collection from now "
+                                "on. Run a full refresh to catch up on its cards."
+                            )
+                            await asyncio.to_thread(
+                                self.save_resume_token,
+                                events[-1]["_id"],
+                                invalidated=True,
+                            )
+                            break
+                        # Advances on idle batches too, keeping the token fresh
+                        await asyncio.to_thread(
+                            self.save_resume_token, stream.resume_token
+                        )
+            except PyMongoError as e:
+                if (
+                    isinstance(e, OperationFailure)
+                    and e.code == _CHANGE_STREAM_HISTORY_LOST
+                ):
+                    logger.error(
+                        "Live sync resume token expired: watching from now on. "
+                        "Run a full refresh to catch up on the missed changes."
+                    )
+                    await asyncio.to_thread(self.save_resume_token, None, reset=True)
+                    continue
+                logger.error(f"Live sync change stream failed, retrying: {e}")
+                await self.__wait_to_retry(stop)
+            except Exception as e:  # noqa: BLE001
+                # E.g. Elasticsearch or the embedding provider: the unsaved
+                # batch is replayed from the last resume token
+                logger.exception(f"Live sync failed to apply changes, retrying: {e}")
+                await self.__wait_to_retry(stop)
+        logger.info(f"Live sync stopped for collection {self.collection}")
+
+
+def create_live_sync(es: AsyncElasticsearch | None) -> LiveSync:
+    return LiveSync(
+        collection=db_settings.cards_collection,
+        target_collection=db_settings.card_embeddings_collection,
+        chunk_templates=live_sync_settings.named_chunk_mappings,
+        es=es,
+        batch_size=live_sync_settings.batch_size,
+        max_await_ms=live_sync_settings.max_await_ms,
+    )
+
+
+async def main() -> None:
+    es = get_elasticsearch_client()
+    try:
+        await create_live_sync(es).run()
+    finally:
+        await es.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
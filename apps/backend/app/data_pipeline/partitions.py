@@ -0,0 +1,72 @@
+from collections.abc import Iterator
+from itertools import islice, pairwise
+from typing import Any
+
+from pydantic import BaseModel
+from pymongo.collection import Collection
+
+
+class IdRange(BaseModel):
+    """
+    Half-open `_id` range of a collection: `start` is inclusive and `end`
+    exclusive; `None` leaves that side unbounded.
+    """
+
+    start: Any = None
+    end: Any = None
+
+    def to_query(self, query: dict[str, Any] | None = None) -> dict[str, Any]:
+        id_filter: dict[str, Any] = {}
+        if self.start is not None:
+            id_filter["$gte"] = self.start
+        if self.end is not None:
+            id_filter["$lt"] = self.end
+        if not id_filter:
+            return dict(query or {})
+        if not query:
+            return {"_id": id_filter}
+        return {"$and": [query, {"_id": id_filter}]}
+
+
+def split_id_ranges(
+    collection: Collection, *, parts: int, query: dict[str, Any] | None = None
+) -> list[IdRange]:
+    """
+    Splits the documents matching `query` into about `parts` contiguous `_id`
+    ranges of similar size using `$bucketAuto`. The outer ranges are unbounded
+    so documents inserted meanwhile are still covered.
+    """
+    if parts <= 1:
+        return [IdRange()]
+
+    pipeline: list[dict[str, Any]] = []
+    if query:
+        pipeline.append({"$match": query})
+    pipeline.extend(
+        [
+            {"$project": {"_id": 1}},
+            {"$bucketAuto": {"groupBy": "$_id", "buckets": parts}},
+        ]
+    )
+    boundaries = [bucket["_id"]["min"] for bucket in collection.aggregate(pipeline)]
+    bounds = [None, *boundaries[1:], None]
+    return [IdRange(start=start, end=end) for start, end in pairwise(bounds)]
+
+
+def iter_id_range_batches(
+    collection: Collection,
+    id_range: IdRange,
+    *,
+    batch_size: int,
+    projection: dict[str, Any] | None = None,
+    query: dict[str, Any] | None = None,
+) -> Iterator[list[dict[str, Any]]]:
+    """Yields the raw documents of one `_id` range in batches."""
+    range_query = id_range.to_query(query)
+    cursor = iter(
+        collection.find(range_query)
+        if projection is None
+        else collection.find(range_query, projection)
+    )
+    while batch := list(islice(cursor, batch_size)):
+        yield batch
@@ -0,0 +1,251 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterator
+from itertools import islice
+from typing import Any
+
+from elasticsearch import AsyncElasticsearch
+from loguru import logger
+from pydantic import ValidationError
+
+from app.core.config import RefreshSettings, db_settings, refresh_settings
+from app.core.db import Database
+from app.data_pipeline.embeddings import create_chunks, generate_from_chunks
+from app.data_pipeline.ingestion import json_records
+from app.data_pipeline.ingestion.derived_fields import DerivedFieldStage
+from app.data_pipeline.ingestion.json_stream import json_type
+from app.data_pipeline.ingestion.record_rules import RecordRuleSet
+from app.models.db import EmptyEmbeddingRecord, ScryfallCardRecord
+from app.models.ingestion import RecordRules, RefreshResult
+from app.services.card_indexer import index_cards
+
+_db_instance: Database | None = None
+
+_DONE = object()
+
+
+def _get_db() -> Database:
+    global _db_instance
+    if _db_instance is None:
+        _db_instance = Database()
+    return _db_instance
+
+
+def _load_records(collection: str, *, ids: list[str]) -> list[dict[str, Any]]:
+    # Chunks are keyed by the stored `_id`, which new records only get on insert
+    return list(_get_db().get_collection(collection).find({"id": {"$in": ids}}))
+
+
+def _render_and_write_chunks(
+    cards: list[dict[str, Any]],
+    *,
+    target_collection: str,
+    chunk_templates: dict[str | None, str],
+) -> list[EmptyEmbeddingRecord]:
+    chunks = create_chunks.render_chunks(cards, chunk_templates=chunk_templates)
+    # Incremental, so chunks of cards whose text did not change keep embeddings
+    return create_chunks.write_chunks(
+        chunks, target_collection=target_collection, incremental=True
+    )
+
+
+def _surfaced_error(group: ExceptionGroup) -> Exception:
+    """
+    Picks the error of stages failing at the same time to raise, preferring
+    invalid input over other failures, and logs the rest.
+    """
+    errors = list(group.exceptions)
+    surfaced = next((exc for exc in errors if isinstance(exc, ValueError)), errors[0])
+    for exc in errors:
+        if exc is not surfaced:
+            logger.opt(exception=exc).error(f"Refresh stage failed: {exc}")
+    return surfaced
+
+
+async def _run_stage(
+    inbox: asyncio.Queue,
+    handle: Callable[[Any], Awaitable[None]],
+    *,
+    workers: int,
+    outboxes: list[tuple[asyncio.Queue, int]],
+) -> None:
+    """
+    Runs `workers` consumers of `inbox` until each one receives a `_DONE`, then
+    closes the downstream queues with one `_DONE` per downstream worker.
+    """
+
+    async def consume() -> None:
+        while (item := await inbox.get()) is not _DONE:
+            await handle(item)
+
+    await asyncio.gather(*(consume() for _ in range(workers)))
+    for outbox, consumers in outboxes:
+        for _ in range(consumers):
+            await outbox.put(_DONE)
+
+
+async def run_pipeline_refresh(
+    records: Iterator[json_type],
+    *,
+    collection: str,
+    target_collection: str,
+    chunk_templates: dict[str | None, str],
+    es: AsyncElasticsearch | None,
+    limit: int | None = None,
+    rules: RecordRules | None = None,
+    derived_fields: list[str] | None = None,
+    normalize_embeddings: bool = True,
+    batch_size: int | None = None,
+    concurrency: RefreshSettings | None = None,
+) -> RefreshResult:
+    """
+    Streams dataset records through ingest -> chunk -> embed -> index in one pass.
+    Stages run concurrently and hand batches over bounded queues, so memory stays
+    bounded and the refresh takes about as long as its slowest stage.
+
+    Only records whose content changed go past the ingest stage, and chunks are
+    written incrementally, so only chunks whose summary changed are embedded.
+    Without `es`, the Elasticsearch stage is skipped.
+    """
+    concurrency = concurrency or refresh_settings
+    batch_size = batch_size or db_settings.batch_size
+    rule_set = RecordRuleSet(rules or RecordRules())
+    derived_stage = DerivedFieldStage(derived_fields)
+    result = RefreshResult()
+    logger.info(
+        f"Starting refresh pipeline: collection={collection}, "
+        f"target={target_collection}, chunks={list(chunk_templates)}, "
+        f"index={es is not None}, concurrency={concurrency}"
+    )
+
+    def kept_records() -> Iterator[json_type]:
+        for record in records:
+            if not rule_set.matches(record):
+                result.ingestion.filtered += 1
+                continue
+            # Derived fields read the full record, before the projection
+            yield rule_set.project(derived_stage.apply(record))
+
+    kept: Iterator[json_type] = kept_records()
+    if limit is not None:
+        kept = islice(kept, limit)
+
+    def next_batch() -> list[json_type]:
+        return list(islice(kept, batch_size))
+
+    ingest_queue: asyncio.Queue = asyncio.Queue(concurrency.queue_size)
+    chunk_queue: asyncio.Queue = asyncio.Queue(concurrency.queue_size)
+    embed_queue: asyncio.Queue = asyncio.Queue(concurrency.queue_size)
+    index_queue: asyncio.Queue = asyncio.Queue(concurrency.queue_size)
+
+    async def read() -> None:
+        # Parsing is blocking work, so batches are assembled in a thread
+        while batch := await asyncio.to_thread(next_batch):
+            await ingest_queue.put(batch)
+        for _ in range(concurrency.ingest_workers):
+            await ingest_queue.put(_DONE)
+
+    async def ingest(batch: list[json_type]) -> None:
+        ingestion, changed_ids = await asyncio.to_thread(
+            json_records.upsert_record_batch, records=batch, collection=collection
+        )
+        result.ingestion.merge(ingestion)
+        if not changed_ids:
+            return
+        cards = await asyncio.to_thread(_load_records, collection, ids=changed_ids)
+        await chunk_queue.put(cards)
+        if es is not None:
+            await index_queue.put(cards)
+
+    async def chunk(cards: list[dict[str, Any]]) -> None:
+        changed_chunks = await asyncio.to_thread(
+            _render_and_write_chunks,
+            cards,
+            target_collection=target_collection,
+            chunk_templates=chunk_templates,
+        )
+        if changed_chunks:
+            await embed_queue.put(changed_chunks)
+
+    # Summaries shared by cards of this refresh are embedded once
+    summary_cache = generate_from_chunks.new_summary_cache()
+
+    async def embed(chunks: list[EmptyEmbeddingRecord]) -> None:
+        embedded = await asyncio.to_thread(
+            generate_from_chunks.process_batch,
+            chunks,
+            target_collection=target_collection,
+            normalize_embeddings=normalize_embeddings,
+            summary_cache=summary_cache,
+        )
+        # Added after the await: embed workers finish concurrently
+        result.chunks_embedded += embedded
+
+    async def index(cards: list[dict[str, Any]]) -> None:
+        if es is None:
+            return
+        # Non-card records or projected cards fail validation; skip them
+        # rather than aborting a refresh that already wrote its batches
+        records: list[ScryfallCardRecord] = []
+        for card in cards:
+            try:
+                records.append(ScryfallCardRecord.model_validate(card))
+            except ValidationError as e:
+                logger.warning(f"Failed to parse MongoDB record: {e}")
+                result.index_failed += 1
+        success, failed = await index_cards(records, es)
+        result.indexed += success
+        result.index_failed += failed
+
+    # Upserts filter on `id`; without the index each one scans the collection
+    _get_db().create_record_indexes(collection=collection)
+    downstream = [(chunk_queue, concurrency.chunk_workers)]
+    if es is not None:
+        downstream.append((index_queue, concurrency.index_workers))
+
+    try:
+        async with asyncio.TaskGroup() as stages:
+            stages.create_task(read())
+            stages.create_task(
+                _run_stage(
+                    ingest_queue,
+                    ingest,
+                    workers=concurrency.ingest_workers,
+                    outboxes=downstream,
+                )
+            )
+            stages.create_task(
+                _run_stage(
+                    chunk_queue,
+                    chunk,
+                    workers=concurrency.chunk_workers,
+                    outboxes=[(embed_queue, concurrency.embed_workers)],
+                )
+            )
+            stages.create_task(
+                _run_stage(
+                    embed_queue, embed, workers=concurrency.embed_workers, outboxes=[]
+                )
+            )
+            if es is not None:
+                stages.create_task(
+                    _run_stage(
+                        index_queue,
+                        index,
+                        workers=concurrency.index_workers,
+                        outboxes=[],
+                    )
+                )
+    except ExceptionGroup as e:
+        # Surface a failing stage's error like the single-stage pipelines do
+        raise _surfaced_error(e) from None
+
+    logger.info(
+        f"Refresh finished: inserted={result.ingestion.inserted}, "
+        f"updated={result.ingestion.updated}, "
+        f"unchanged={result.ingestion.unchanged}, "
+        f"filtered={result.ingestion.filtered}, "
+        f"duplicates={result.ingestion.duplicates}, "
+        f"chunks embedded={result.chunks_embedded}, indexed={result.indexed}, "
+        f"index failures={result.index_failed}"
+    )
+    return result
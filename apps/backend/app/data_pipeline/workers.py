@@ -0,0 +1,198 @@
+import os
+import queue
+import time
+from collections.abc import Callable, Iterable, Iterator
+from multiprocessing.pool import Pool
+from typing import Any
+
+from loguru import logger
+from pydantic import BaseModel
+
+from app.core.config import app_settings, embedding_settings
+from app.core.resources import available_cpus, cgroup_memory_limit
+
+_EXHAUSTED = object()
+
+
+class InFlightStats(BaseModel):
+    """
+    Queue depth of a bounded pool run. A window that is mostly full means the
+    workers are the bottleneck; a mostly empty one means reading is.
+    """
+
+    max_in_flight: int
+    submitted: int = 0
+    depth_total: int = 0
+    peak_depth: int = 0
+    read_seconds: float = 0.0
+    wait_seconds: float = 0.0
+
+    @property
+    def mean_depth(self) -> float:
+        return self.depth_total / self.submitted if self.submitted else 0.0
+
+    @property
+    def bottleneck(self) -> str:
+        return "compute" if self.mean_depth >= self.max_in_flight * 0.75 else "read"
+
+    def record_depth(self, depth: int) -> None:
+        self.depth_total += depth
+        self.peak_depth = max(self.peak_depth, depth)
+
+
+class WorkerPoolPlan(BaseModel):
+    """Worker processes and the compute threads each of them may use."""
+
+    processes: int
+    threads_per_worker: int
+
+
+def plan_worker_pool(
+    *,
+    max_workers: int | None = None,
+    memory_per_worker_mb: int | None = None,
+) -> WorkerPoolPlan:
+    """
+    Sizes a pool from the cores and memory granted to the container, so that
+    workers x threads matches the cores instead of oversubscribing them.
+    """
+    cpus = available_cpus()
+    processes = min(cpus, max_workers) if max_workers else cpus
+
+    memory_limit = cgroup_memory_limit()
+    if memory_limit is not None and memory_per_worker_mb:
+        processes = min(processes, memory_limit // (memory_per_worker_mb * 2**20))
+
+    processes = max(processes, 1)
+    plan = WorkerPoolPlan(
+        processes=processes, threads_per_worker=max(cpus // processes, 1)
+    )
+    logger.info(
+        f"Worker pool: {plan.processes} processes x "
+        f"{plan.threads_per_worker} threads ({cpus} cores available)"
+    )
+    return plan
+
+
+def plan_embedding_worker_pool() -> WorkerPoolPlan:
+    return plan_worker_pool(
+        max_workers=app_settings.embeddings_max_workers,
+        memory_per_worker_mb=app_settings.embeddings_worker_memory_mb,
+    )
+
+
+def initialize_worker(
+    threads: int,
+    reset_state: Callable[[], None] | None = None,
+    limit_torch_threads: bool = False,
+) -> None:
+    """
+    Pool initializer: caps the compute threads of the worker and resets state
+    that must not be shared across processes.
+
+    A pool replaces a worker whose initializer raises, again and again, so
+    nothing that may fail belongs here: the embedding model is loaded by the
+    worker's first task, whose error reaches the caller.
+    """
+    # Read by OpenMP/MKL when they start, before torch is imported
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    if reset_state is not None:
+        reset_state()
+
+    # Remote providers hold no local model or thread pool
+    if not limit_torch_threads:
+        return
+    if embedding_settings.provider != "sentence_transformers":
+        return
+
+    import torch
+
+    torch.set_num_threads(threads)
+
+
+def default_max_in_flight(processes: int) -> int:
+    # Two batches per worker: one being processed, one queued behind it
+    return app_settings.pipeline_max_in_flight_batches or processes * 2
+
+
+class BoundedImap[T, R]:
+    """
+    Unordered `Pool.imap` that pulls the next item only while fewer than
+    `max_in_flight` tasks are outstanding. `Pool.imap_unordered` drains its
+    input in a feeder thread, so a fast cursor piles the whole collection up
+    in memory when the workers lag behind.
+    """
+
+    def __init__(
+        self,
+        pool: Pool,
+        func: Callable[[T], R],
+        items: Iterable[T],
+        *,
+        max_in_flight: int,
+    ) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        self._pool = pool
+        self._func = func
+        self._items = items
+        self.stats = InFlightStats(max_in_flight=max_in_flight)
+
+    def __iter__(self) -> Iterator[R]:
+        done: queue.Queue[tuple[bool, Any]] = queue.Queue()
+        items = iter(self._items)
+        in_flight = 0
+        exhausted = False
+
+        while True:
+            # Hand back finished results before reading more
+            while in_flight:
+                try:
+                    outcome = done.get_nowait()
+                except queue.Empty:
+                    break
+                in_flight -= 1
+                yield self._unwrap(outcome)
+
+            if not exhausted and in_flight < self.stats.max_in_flight:
+                started = time.perf_counter()
+                item = next(items, _EXHAUSTED)
+                self.stats.read_seconds += time.perf_counter() - started
+                if item is _EXHAUSTED:
+                    exhausted = True
+                else:
+                    self._pool.apply_async(
+                        self._func,
+                        (item,),
+                        callback=lambda result: done.put((True, result)),
+                        error_callback=lambda exc: done.put((False, exc)),
+                    )
+                    in_flight += 1
+                    self.stats.submitted += 1
+                    self.stats.record_depth(in_flight)
+                    continue
+
+            if not in_flight:
+                break
+
+            started = time.perf_counter()
+            outcome = done.get()
+            self.stats.wait_seconds += time.perf_counter() - started
+            in_flight -= 1
+            yield self._unwrap(outcome)
+
+        logger.info(
+            f"Pool run finished: {self.stats.submitted} tasks, mean queue depth "
+            f"{self.stats.mean_depth:.1f}/{self.stats.max_in_flight}, "
+            f"read {self.stats.read_seconds:.1f}s, "
+            f"waited on workers {self.stats.wait_seconds:.1f}s "
+            f"({self.stats.bottleneck} bound)"
+        )
+
+    @staticmethod
+    def _unwrap(outcome: tuple[bool, Any]) -> Any:
+        succeeded, value = outcome
+        if not succeeded:
+            raise value
+        return value
@@ -1,6 +1,7 @@
+import asyncio
 import sys
 
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from pymongo import MongoClient
@@ -8,10 +9,23 @@ from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 
 from app.api.main import api_router
-from app.core.config import app_settings, db_settings
+from app.core.config import app_settings, db_settings, live_sync_settings
+from app.core.db import Database
 from app.core.elasticsearch import get_elasticsearch_client, init_elasticsearch
+from app.data_pipeline.live_sync import create_live_sync
 from app.models.api import HealthCheckResponse
 
+# Live sync stops after its current batch; it is cancelled if that takes longer
+LIVE_SYNC_STOP_TIMEOUT_SECONDS = 30.0
+
+
+def _log_live_sync_exit(task: asyncio.Task) -> None:
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.opt(exception=exc).error(f"Live sync worker stopped on error: {exc}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -23,6 +37,9 @@ async def lifespan(app: FastAPI):
         # Verify connectivity and node state
         mongo_client.admin.command("ping")
         logger.info("MongoDB ping successful.")
+        Database(db_client=mongo_client).create_record_indexes(
+            collection=db_settings.cards_collection
+        )
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
         # We don't raise here but we should log it clearly
@@ -34,8 +51,29 @@ async def lifespan(app: FastAPI):
     app.state.es = es_client
     await init_elasticsearch(es_client)
 
+    live_sync_stop = asyncio.Event()
+    live_sync_task: asyncio.Task | None = None
+    if live_sync_settings.enabled:
+        logger.info("Starting up application: starting live sync worker.")
+        live_sync_task = asyncio.create_task(
+            create_live_sync(es_client).run(live_sync_stop)
+        )
+        live_sync_task.add_done_callback(_log_live_sync_exit)
+
     yield
 
+    if live_sync_task is not None:
+        logger.info("Shutting down application: stopping live sync worker.")
+        live_sync_stop.set()
+        # Wait for the worker before closing the clients it uses
+        _, pending = await asyncio.wait(
+            {live_sync_task}, timeout=LIVE_SYNC_STOP_TIMEOUT_SECONDS
+        )
+        if pending:
+            live_sync_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await live_sync_task
+
     logger.info("Shutting down application: closing MongoDB connection.")
     mongo_client.close()
 
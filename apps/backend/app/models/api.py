@@ -1,8 +1,10 @@
-from typing import Literal
+from typing import Literal, Self
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
+from app.core.chunk_mappings import named_chunk_templates
 from app.models.embedding import Similarity
+from app.models.ingestion import IngestionMode, RecordFilter
 from app.models.scryfall import ScryfallCard
 
 
@@ -22,6 +24,11 @@ class CardSearchParams(BaseModel):
     set: str | None = Field(default=None)
     released_at_from: str | None = Field(default=None, pattern=r"^\d{4}-\d{2}-\d{2}$")
     released_at_to: str | None = Field(default=None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+    legal_format: str | None = Field(default=None)
+    card_type: str | None = Field(default=None)
+    price_usd_min: float | None = Field(default=None, ge=0)
+    price_usd_max: float | None = Field(default=None, ge=0)
+    power_min: float | None = Field(default=None)
     page: int = Field(default=1, ge=1)
     page_size: int = Field(default=20, ge=1, le=100)
 
@@ -41,19 +48,91 @@ class SearchQueryParams(BaseModel):
 class IngestJsonDatasetParams(BaseModel):
     collection: str = Field(min_length=1)
     limit: int | None = Field(default=None, ge=1)
+    mode: IngestionMode = "upsert"
+    parallel: bool = False
+    include_fields: list[str] = Field(default_factory=list)
+    exclude_fields: list[str] = Field(default_factory=list)
+    filters: list[RecordFilter] = Field(default_factory=list)
+    derive_fields: bool = True
+
+
+class IngestJsonDatasetResponse(BaseModel):
+    message: str
+    inserted: int
+    updated: int
+    unchanged: int
+    filtered: int
+    duplicates: int
+
+
+class RefreshPipelineParams(BaseModel):
+    collection: str = Field(min_length=1)
+    target_collection: str = Field(min_length=1)
+    # Chunk templates by name; an unnamed `chunk_mappings` is keyed by None
+    chunk_templates: dict[str | None, str] = Field(min_length=1)
+    limit: int | None = Field(default=None, ge=1)
+    include_fields: list[str] = Field(default_factory=list)
+    exclude_fields: list[str] = Field(default_factory=list)
+    filters: list[RecordFilter] = Field(default_factory=list)
+    derive_fields: bool = True
+    normalize_embeddings: bool = True
+    index_cards: bool = True
+
+
+class RefreshPipelineResponse(BaseModel):
+    message: str
+    inserted: int
+    updated: int
+    unchanged: int
+    filtered: int
+    duplicates: int
+    chunks_embedded: int
+    indexed: int
+    index_failed: int
+
+
+class BuildOracleCardsParams(BaseModel):
+    source_collection: str = Field(min_length=1)
+    target_collection: str = Field(min_length=1)
+
+
+class BuildOracleCardsResponse(BaseModel):
+    message: str
+    oracle_cards: int
+    removed: int
 
 
 class CreateEmbeddingChunksParams(BaseModel):
     source_collection: str = Field(min_length=1)
     target_collection: str = Field(min_length=1)
-    chunk_mappings: str = Field(min_length=1)
+    chunk_mappings: str | None = Field(default=None, min_length=1)
+    # Named templates, e.g. {"name": "{name}", "rules": "{oracle_text}"}
+    chunk_templates: dict[str, str] = Field(default_factory=dict)
     limit: int | None = Field(default=None, ge=1)
+    server_side: bool = False
+    incremental: bool = False
+
+    @model_validator(mode="after")
+    def _check_templates(self) -> Self:
+        # Raises unless exactly one kind of template is given
+        named_chunk_templates(
+            chunk_mappings=self.chunk_mappings, chunk_templates=self.chunk_templates
+        )
+        return self
+
+    @property
+    def named_chunk_mappings(self) -> dict[str | None, str]:
+        """Templates by chunk name; an unnamed `chunk_mappings` has no name."""
+        return named_chunk_templates(
+            chunk_mappings=self.chunk_mappings, chunk_templates=self.chunk_templates
+        )
 
 
 class GenerateEmbeddingsParams(BaseModel):
     collection: str = Field(min_length=1)
     limit: int | None = Field(default=None, ge=1)
     normalize_embeddings: bool = True
+    missing_only: bool = False
 
 
 class CreateSearchIndexParams(BaseModel):
@@ -65,7 +144,10 @@ class CreateSearchIndexParams(BaseModel):
 class SearchResult(BaseModel):
     source_id: str
     summary: str
+    # Best vector similarity among the card's matched chunks
     score: float
+    # Reciprocal rank fusion score over those chunks, which orders the results
+    fused_score: float
 
 
 class SearchResponse(BaseModel):
@@ -12,14 +12,22 @@ class MongoCollectionRecord(BaseModel):
 
 class EmptyEmbeddingRecord(BaseModel):
     mongo_id: PydanticObjectId = Field(alias="_id")
+    source_id: str | None = None
+    chunk_name: str | None = None
     summary: str
+    summary_hash: str | None = None
+    template_hash: str | None = None
     embeddings: list[float] = Field(default_factory=list)
+    embeddings_pending: bool = True
 
 
 class GeneratedEmbeddingRecord(BaseModel):
     mongo_id: PydanticObjectId = Field(alias="_id")
     summary: str
     embeddings: list[float] = Field(default_factory=list)
+    # Known for providers with a local tokenizer only
+    token_count: int | None = None
+    truncated: bool | None = None
 
 
 class CardEmbeddingRecord(BaseModel):
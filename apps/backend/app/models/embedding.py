@@ -8,6 +8,7 @@ MongoSimilarity = Literal["dotProduct", "cosine", "euclidean"]
 
 class CardEmbeddingVectorSearchResult(BaseModel):
     source_id: str
+    chunk_name: str | None = None
     summary: str
     score: float
 
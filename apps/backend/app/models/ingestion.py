@@ -0,0 +1,88 @@
+from typing import Any, Literal, Self
+
+from pydantic import BaseModel, Field, model_validator
+
+IngestionMode = Literal["upsert", "bulk_load"]
+DatasetCompression = Literal["none", "gzip", "zstd"]
+DatasetLayout = Literal["json", "ndjson"]
+
+DATASET_COMPRESSION_SUFFIXES: dict[str, DatasetCompression] = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+}
+DATASET_LAYOUT_SUFFIXES: dict[str, DatasetLayout] = {
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+SUPPORTED_DATASET_SUFFIXES = tuple(
+    layout_suffix + compression_suffix
+    for layout_suffix in DATASET_LAYOUT_SUFFIXES
+    for compression_suffix in ("", *DATASET_COMPRESSION_SUFFIXES)
+)
+RecordFilterOperator = Literal[
+    "eq", "ne", "in", "not_in", "contains", "not_contains", "exists"
+]
+
+
+class RecordFilter(BaseModel):
+    """
+    Predicate on a (dotted) record field, e.g. `lang eq "en"`,
+    `digital eq false` or `games contains "paper"`.
+    `exists` takes a bool (true when omitted), `in` and `not_in` take a list.
+    """
+
+    field: str = Field(min_length=1)
+    op: RecordFilterOperator = "eq"
+    value: Any = None
+
+    @model_validator(mode="after")
+    def _check_value(self) -> Self:
+        if self.op == "exists":
+            if self.value is None:
+                self.value = True
+            elif not isinstance(self.value, bool):
+                raise ValueError("`exists` filters take a boolean value.")
+        elif self.op in ("in", "not_in") and not isinstance(self.value, list):
+            raise ValueError(f"`{self.op}` filters take a list value.")
+        return self
+
+
+class RecordRules(BaseModel):
+    include_fields: list[str] = Field(default_factory=list)
+    exclude_fields: list[str] = Field(default_factory=list)
+    filters: list[RecordFilter] = Field(default_factory=list)
+
+
+class IngestionResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    filtered: int = 0
+    # Records dropped because a later record in the same batch had the same id
+    duplicates: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+    def merge(self, other: "IngestionResult") -> None:
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.filtered += other.filtered
+        self.duplicates += other.duplicates
+
+
+class OracleCardsResult(BaseModel):
+    oracle_cards: int = 0
+    removed: int = 0
+
+
+class RefreshResult(BaseModel):
+    ingestion: IngestionResult = Field(default_factory=IngestionResult)
+    chunks_embedded: int = 0
+    indexed: int = 0
+    index_failed: int = 0
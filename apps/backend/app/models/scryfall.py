@@ -50,6 +50,32 @@ class ScryfallCardPurchaseUris(BaseModel):
     cardhoarder: str | None = None
 
 
+class ScryfallCardManaPips(BaseModel):
+    W: int = 0
+    U: int = 0
+    B: int = 0
+    R: int = 0
+    G: int = 0
+    C: int = 0
+
+
+class ScryfallCardDerived(BaseModel):
+    """Normalized fields computed once at ingest time."""
+
+    model_config = ConfigDict(extra="allow")
+
+    mana_pips: ScryfallCardManaPips | None = None
+    power_value: float | None = None
+    toughness_value: float | None = None
+    price_usd: float | None = None
+    price_usd_foil: float | None = None
+    price_eur: float | None = None
+    legal_formats: list[str] = Field(default_factory=list)
+    oracle_text_full: str | None = None
+    types: list[str] = Field(default_factory=list)
+    subtypes: list[str] = Field(default_factory=list)
+
+
 class ScryfallCardBase(BaseModel):
     model_config = ConfigDict(extra="ignore", populate_by_name=True)
     object: Literal["card"]
@@ -121,6 +147,7 @@ class ScryfallCardBase(BaseModel):
     prices: ScryfallCardPrices
     related_uris: ScryfallCardRelatedUris | None = None
     purchase_uris: ScryfallCardPurchaseUris | None = None
+    derived: ScryfallCardDerived | None = None
 
 
 class ScryfallCard(ScryfallCardBase):
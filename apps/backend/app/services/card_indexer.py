@@ -1,23 +1,27 @@
-from typing import Any, Dict, List, Tuple, Union
+import asyncio
+from typing import Any
 
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.helpers import async_bulk
 from loguru import logger
+from pydantic import ValidationError
+from pymongo.collection import Collection
 
 from app.core.config import elasticsearch_settings
+from app.data_pipeline.partitions import IdRange, iter_id_range_batches
 from app.models.db import ScryfallCardRecord
 
 
 async def index_cards(
-    cards: List[ScryfallCardRecord], es: AsyncElasticsearch
-) -> Tuple[int, int]:
+    cards: list[ScryfallCardRecord], es: AsyncElasticsearch
+) -> tuple[int, int]:
     """
     Indexes a list of ScryfallCard objects into Elasticsearch using bulk operations.
     Returns a tuple of (success_count, failure_count).
     """
     index_name = elasticsearch_settings.index_name
 
-    actions: List[Dict[str, Any]] = []
+    actions: list[dict[str, Any]] = []
     for card in cards:
         # Convert Pydantic model to JSON-serializable dict for Elasticsearch
         card_data = card.model_dump(mode="json")
@@ -37,7 +41,7 @@ async def index_cards(
     try:
         # async_bulk with stats_only=True returns (success_count, failed_count)
         # We explicitly cast to ensure mypy is happy with the return types
-        result: Tuple[int, Union[int, List[Any]]] = await async_bulk(
+        result: tuple[int, int | list[Any]] = await async_bulk(
             client=es,
             actions=actions,
             stats_only=True,
@@ -58,3 +62,40 @@ async def index_cards(
     except Exception as e:
         logger.error(f"Failed to perform bulk indexing: {e}")
         return 0, len(actions)
+
+
+async def index_card_id_range(
+    collection: Collection,
+    id_range: IdRange,
+    es: AsyncElasticsearch,
+    *,
+    batch_size: int,
+) -> tuple[int, int]:
+    """
+    Indexes one `_id` range of the cards collection with its own cursor.
+    Batches are fetched in a worker thread so several ranges are read at once.
+    Returns a tuple of (success_count, failure_count).
+    """
+    batches = iter_id_range_batches(collection, id_range, batch_size=batch_size)
+    total_success = 0
+    total_failed = 0
+
+    while True:
+        records = await asyncio.to_thread(next, batches, None)
+        if records is None:
+            break
+
+        cards: list[ScryfallCardRecord] = []
+        for record in records:
+            try:
+                # Parse MongoDB record into ScryfallCardRecord (which includes mongo_id)
+                cards.append(ScryfallCardRecord.model_validate(record))
+            except ValidationError as e:
+                logger.warning(f"Failed to parse MongoDB record: {e}")
+                total_failed += 1
+
+        success, failed = await index_cards(cards, es)
+        total_success += success
+        total_failed += failed
+
+    return total_success, total_failed
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmarks chunk mapping rendering against the cost of reading the same cards
+from MongoDB (BSON decoding), to check chunk creation is I/O bound.
+
+    python -m scripts.benchmark_chunk_mappings --records 20000
+"""
+
+import argparse
+import time
+from collections.abc import Callable
+from typing import Any
+
+import bson
+from bson import ObjectId
+
+from app.core.chunk_mappings import (
+    FIELD_TOKEN_PATTERN,
+    compile_chunk_mapping,
+    escape_template_literal,
+)
+from app.models.db import MongoCollectionRecord
+
+DEFAULT_TEMPLATE = (
+    "Name: {name}\nMana cost: {mana_cost}\nType: {type_line}\n"
+    "Text: {oracle_text}\nStats: {power}/{toughness}\nPrice: {prices.usd}"
+)
+
+
+def _card(index: int) -> dict[str, Any]:
+    card: dict[str, Any] = {
+        "_id": ObjectId(),
+        "id": f"card-{index}",
+        "name": f"Card {index}",
+        "mana_cost": "{2}{U}{U}",
+        "type_line": "Creature — Human Wizard",
+        "oracle_text": "Flying\nWhen this creature enters, draw a card. " * 3,
+        "power": "2",
+        "toughness": "3",
+        "prices": {"usd": "0.25", "usd_foil": "1.00", "eur": "0.20"},
+        "legalities": {f"format_{i}": "legal" for i in range(20)},
+    }
+    # Pad to the ~80 top-level fields of a Scryfall card
+    card.update({f"extra_field_{i}": f"value {i}" for i in range(80 - len(card))})
+    return card
+
+
+def _legacy_render(source_record: MongoCollectionRecord, chunk_mappings: str) -> str:
+    """The previous implementation: re-parses the template and dumps per field."""
+    if "{" in FIELD_TOKEN_PATTERN.sub("", chunk_mappings):
+        raise ValueError("Invalid chunk_mappings syntax.")
+    output_parts: list[str] = []
+    current_pos = 0
+    for match in FIELD_TOKEN_PATTERN.finditer(chunk_mappings):
+        start, end = match.span()
+        output_parts.append(
+            escape_template_literal(value=chunk_mappings[current_pos:start])
+        )
+        current: Any = source_record.model_dump()
+        for part in match.group(1).split("."):
+            current = current.get(part) if isinstance(current, dict) else None
+        output_parts.append("" if current is None else str(current))
+        current_pos = end
+    output_parts.append(escape_template_literal(value=chunk_mappings[current_pos:]))
+    return "".join(output_parts)
+
+
+def _time(label: str, records: int, fn: Callable[[], None]) -> float:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {records / elapsed:>12,.0f} records/s")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE)
+    args = parser.parse_args()
+
+    cards = [_card(i) for i in range(args.records)]
+    encoded = [bson.encode(card) for card in cards]
+    chunk_mapping = compile_chunk_mapping(args.template)
+
+    def decode() -> None:
+        for document in encoded:
+            bson.decode(document)
+
+    def render_legacy() -> None:
+        for card in cards:
+            record = MongoCollectionRecord.model_validate(card)
+            _legacy_render(record, args.template)
+
+    def render_compiled() -> None:
+        for card in cards:
+            chunk_mapping.render(card)
+
+    read = _time("BSON decode (MongoDB read side)", args.records, decode)
+    legacy = _time("validate + legacy render", args.records, render_legacy)
+    compiled = _time("compiled render on raw documents", args.records, render_compiled)
+
+    print(f"\nCompiled render speedup: {legacy / compiled:.1f}x")
+    print(f"Render cost relative to BSON decoding: {compiled / read:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+from bson import ObjectId
+
+from app.api.routes.cards import _card_lookup_query
+
+
+def test_card_lookup_query_matches_scryfall_id() -> None:
+    query = _card_lookup_query("77c6fa74-5543-42ac-9ead-0e890b188e99")
+
+    assert {"id": "77c6fa74-5543-42ac-9ead-0e890b188e99"} in query["$or"]
+    assert len(query["$or"]) == 2
+
+
+def test_card_lookup_query_accepts_mongo_object_id() -> None:
+    object_id = ObjectId()
+
+    query = _card_lookup_query(str(object_id))
+
+    assert {"_id": object_id} in query["$or"]
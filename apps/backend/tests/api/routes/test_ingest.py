@@ -0,0 +1,242 @@
+import gzip
+import io
+import json
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.core.elasticsearch import get_es
+from app.main import app
+from app.models.ingestion import IngestionResult, OracleCardsResult, RefreshResult
+
+
+def test_ingest_json_records_stream_writes_batches_from_body() -> None:
+    client = TestClient(app)
+    records = [{"id": str(i), "name": f"Card {i}"} for i in range(3)]
+
+    with patch("app.data_pipeline.ingestion.json_records._get_db") as mock_get_db:
+        mock_collection = MagicMock()
+        mock_get_db.return_value.get_collection.return_value = mock_collection
+
+        response = client.post(
+            "/data-pipeline/ingestion/json-records/stream",
+            params={"collection": "cards", "limit": 2},
+            content=json.dumps(records).encode("utf-8"),
+            headers={"content-type": "application/json"},
+        )
+
+    assert response.status_code == 200
+    operations = mock_collection.bulk_write.call_args.args[0]
+    assert len(operations) == 2
+
+
+def test_ingest_json_records_stream_rejects_non_json_body() -> None:
+    client = TestClient(app)
+
+    response = client.post(
+        "/data-pipeline/ingestion/json-records/stream",
+        params={"collection": "cards"},
+        content=b"id,name",
+        headers={"content-type": "text/csv"},
+    )
+
+    assert response.status_code == 400
+
+
+def test_ingest_json_records_stream_rejects_malformed_body() -> None:
+    client = TestClient(app)
+
+    with patch("app.data_pipeline.ingestion.json_records._get_db"):
+        malformed = client.post(
+            "/data-pipeline/ingestion/json-records/stream",
+            params={"collection": "cards"},
+            content=b'{"id": "1"}\n{"id": ',
+            headers={"content-type": "application/x-ndjson"},
+        )
+        corrupt = client.post(
+            "/data-pipeline/ingestion/json-records/stream",
+            params={"collection": "cards"},
+            content=b"not gzip",
+            headers={"content-type": "application/json", "content-encoding": "gzip"},
+        )
+
+    assert malformed.status_code == 400
+    assert corrupt.status_code == 400
+    assert "gzip" in corrupt.json()["detail"]
+
+
+def test_ingest_json_records_accepts_gzip_ndjson_upload() -> None:
+    client = TestClient(app)
+    records = [{"id": str(i), "name": f"Card {i}"} for i in range(3)]
+    payload = "\n".join(json.dumps(record) for record in records).encode("utf-8")
+
+    with patch("app.data_pipeline.ingestion.json_records._get_db") as mock_get_db:
+        mock_collection = MagicMock()
+        mock_get_db.return_value.get_collection.return_value = mock_collection
+
+        response = client.post(
+            "/data-pipeline/ingestion/json-records",
+            files={
+                "file": (
+                    "cards.ndjson.gz",
+                    io.BytesIO(gzip.compress(payload)),
+                    "application/gzip",
+                )
+            },
+            data={"collection": "cards"},
+        )
+
+    assert response.status_code == 200
+    operations = mock_collection.bulk_write.call_args.args[0]
+    assert len(operations) == 3
+
+
+def test_ingest_json_records_rejects_unsupported_file() -> None:
+    client = TestClient(app)
+
+    response = client.post(
+        "/data-pipeline/ingestion/json-records",
+        files={"file": ("cards.csv", io.BytesIO(b"id,name"), "text/csv")},
+        data={"collection": "cards"},
+    )
+
+    assert response.status_code == 400
+
+
+def test_ingest_json_records_rejects_parallel_for_compressed_upload() -> None:
+    client = TestClient(app)
+
+    response = client.post(
+        "/data-pipeline/ingestion/json-records",
+        files={
+            "file": (
+                "cards.ndjson.gz",
+                io.BytesIO(gzip.compress(b'{"id": "a"}')),
+                "application/gzip",
+            )
+        },
+        data={"collection": "cards", "parallel": "true"},
+    )
+
+    assert response.status_code == 400
+
+
+def test_ingest_json_records_applies_filters_and_projection() -> None:
+    client = TestClient(app)
+    records = [
+        {"id": "1", "lang": "en", "name": "Bolt", "image_uris": {"png": "x"}},
+        {"id": "2", "lang": "ja", "name": "Bolt", "image_uris": {"png": "y"}},
+    ]
+
+    with patch("app.data_pipeline.ingestion.json_records._get_db") as mock_get_db:
+        mock_collection = MagicMock()
+        mock_get_db.return_value.get_collection.return_value = mock_collection
+
+        response = client.post(
+            "/data-pipeline/ingestion/json-records",
+            files={
+                "file": (
+                    "cards.json",
+                    io.BytesIO(json.dumps(records).encode("utf-8")),
+                    "application/json",
+                )
+            },
+            data={
+                "collection": "cards",
+                "exclude_fields": "image_uris",
+                "filters": json.dumps([{"field": "lang", "value": "en"}]),
+            },
+        )
+
+    assert response.status_code == 200
+    assert response.json()["filtered"] == 1
+    operations = mock_collection.bulk_write.call_args.args[0]
+    assert len(operations) == 1
+    assert "image_uris" not in operations[0]._doc["$set"]
+
+
+def test_ingest_json_records_rejects_invalid_filters() -> None:
+    client = TestClient(app)
+
+    response = client.post(
+        "/data-pipeline/ingestion/json-records",
+        files={"file": ("cards.json", io.BytesIO(b"[]"), "application/json")},
+        data={"collection": "cards", "filters": '[{"field": "lang", "op": "like"}]'},
+    )
+
+    assert response.status_code == 400
+
+
+def test_build_oracle_cards_defaults_to_configured_collections() -> None:
+    client = TestClient(app)
+
+    with patch("app.api.routes.ingest.run_pipeline_build_oracle_cards") as mock_build:
+        mock_build.return_value = OracleCardsResult(oracle_cards=5, removed=1)
+
+        response = client.post("/data-pipeline/ingestion/oracle-cards")
+
+    assert response.status_code == 200
+    assert response.json()["oracle_cards"] == 5
+    mock_build.assert_called_once_with(
+        source_collection="cards", target_collection="oracle_cards"
+    )
+
+
+def test_refresh_runs_the_fused_pipeline_with_named_templates() -> None:
+    client = TestClient(app)
+    es = MagicMock()
+    app.dependency_overrides[get_es] = lambda: es
+    records = [{"id": "1", "name": "Opt"}]
+
+    with patch("app.api.routes.ingest.run_pipeline_refresh") as mock_refresh:
+        mock_refresh.return_value = RefreshResult(
+            ingestion=IngestionResult(inserted=1), chunks_embedded=2, indexed=1
+        )
+        response = client.post(
+            "/data-pipeline/ingestion/refresh",
+            files={"file": ("cards.json", json.dumps(records), "application/json")},
+            data={
+                "chunk_templates": json.dumps(
+                    {"name": "{name}", "rules": "{oracle_text}"}
+                )
+            },
+        )
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json()["chunks_embedded"] == 2
+    kwargs = mock_refresh.call_args.kwargs
+    assert kwargs["collection"] == "cards"
+    assert kwargs["target_collection"] == "card_embeddings"
+    assert kwargs["chunk_templates"] == {"name": "{name}", "rules": "{oracle_text}"}
+    assert kwargs["es"] is es
+
+
+def test_refresh_requires_exactly_one_kind_of_chunk_template() -> None:
+    client = TestClient(app)
+    app.dependency_overrides[get_es] = lambda: MagicMock()
+
+    response = client.post(
+        "/data-pipeline/ingestion/refresh",
+        files={"file": ("cards.json", "[]", "application/json")},
+    )
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 400
+
+
+def test_refresh_rejects_a_malformed_dataset() -> None:
+    client = TestClient(app)
+    app.dependency_overrides[get_es] = lambda: MagicMock()
+
+    with patch("app.api.routes.ingest.run_pipeline_refresh") as mock_refresh:
+        mock_refresh.side_effect = ValueError("Invalid JSON dataset")
+        response = client.post(
+            "/data-pipeline/ingestion/refresh",
+            files={"file": ("cards.json", '[{"id": "1",', "application/json")},
+            data={"chunk_mappings": "{name}"},
+        )
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid JSON dataset"
@@ -0,0 +1,110 @@
+from itertools import count
+from pathlib import Path
+
+from app.core.embeddings import cache as cache_module
+from app.core.embeddings.cache import (
+    CachedEmbeddingProvider,
+    EmbeddingCache,
+    embedding_cache_entries,
+)
+
+
+class _CountingProvider:
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def embed_text(self, text: str, *, normalize: bool) -> list[float]:
+        return self.embed_texts([text], normalize=normalize)[0]
+
+    def embed_texts(self, texts: list[str], *, normalize: bool) -> list[list[float]]:
+        self.calls.append(texts)
+        scale = 1.0 if normalize else 2.0
+        return [[float(len(text)) * scale, 0.5] for text in texts]
+
+
+def test_cached_provider_only_embeds_unseen_texts(tmp_path: Path) -> None:
+    inner = _CountingProvider()
+    path = tmp_path / "embeddings.sqlite3"
+    provider = CachedEmbeddingProvider(
+        inner, cache=EmbeddingCache(path, max_entries=100), model_key="st:model:2"
+    )
+
+    first = provider.embed_texts(["Opt", "Ponder"], normalize=True)
+    # A new process (or deploy) reads the same file
+    reopened = CachedEmbeddingProvider(
+        inner, cache=EmbeddingCache(path, max_entries=100), model_key="st:model:2"
+    )
+    second = reopened.embed_texts(["Ponder", "Opt", "Brainstorm"], normalize=True)
+
+    assert inner.calls == [["Opt", "Ponder"], ["Brainstorm"]]
+    assert first == [[3.0, 0.5], [6.0, 0.5]]
+    assert second == [[6.0, 0.5], [3.0, 0.5], [10.0, 0.5]]
+
+
+def test_cached_texts_are_not_tokenized_again(tmp_path: Path) -> None:
+    class _TokenizingProvider(_CountingProvider):
+        max_tokens = 8
+
+        def embed_texts_counting_tokens(self, texts: list[str], *, normalize: bool):
+            vectors = self.embed_texts(texts, normalize=normalize)
+            return vectors, [len(text) for text in texts]
+
+    inner = _TokenizingProvider()
+    provider = CachedEmbeddingProvider(
+        inner,
+        cache=EmbeddingCache(tmp_path / "embeddings.sqlite3", max_entries=100),
+        model_key="m",
+    )
+
+    provider.embed_texts(["Opt"], normalize=True)
+    _, token_counts = provider.embed_texts_counting_tokens(
+        ["Opt", "Ponder"], normalize=True
+    )
+
+    assert inner.calls == [["Opt"], ["Ponder"]]
+    assert token_counts == [None, 6]
+    assert provider.max_tokens == 8
+
+
+def test_cache_keys_include_model_and_normalization(tmp_path: Path) -> None:
+    inner = _CountingProvider()
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite3", max_entries=100)
+
+    CachedEmbeddingProvider(inner, cache=cache, model_key="a").embed_texts(
+        ["Opt"], normalize=True
+    )
+    CachedEmbeddingProvider(inner, cache=cache, model_key="a").embed_texts(
+        ["Opt"], normalize=False
+    )
+    CachedEmbeddingProvider(inner, cache=cache, model_key="b").embed_texts(
+        ["Opt"], normalize=True
+    )
+
+    assert inner.calls == [["Opt"], ["Opt"], ["Opt"]]
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path: Path, monkeypatch) -> None:
+    # Every call happens an hour after the previous one
+    hours = count()
+    monkeypatch.setattr(cache_module.time, "time", lambda: next(hours) * 3600.0)
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite3", max_entries=2)
+    cache.put_many("m", {"a": [1.0]})
+    cache.put_many("m", {"b": [2.0]})
+    # Reading "a" makes "b" the least recently used entry
+    cache.get_many("m", ["a"])
+    cache.put_many("m", {"c": [3.0]})
+
+    assert cache.get_many("m", ["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+
+
+def test_recent_hits_do_not_write(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite3", max_entries=100)
+    cache.put_many("m", {"a": [1.0]})
+    changes = cache._connect().total_changes
+
+    assert cache.get_many("m", ["a"]) == {"a": [1.0]}
+    assert cache._connect().total_changes == changes
+
+
+def test_cache_entries_fit_the_size_cap() -> None:
+    assert embedding_cache_entries(max_mb=1, dimensions=384) == 2**20 // 1696
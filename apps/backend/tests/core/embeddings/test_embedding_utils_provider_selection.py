@@ -1,8 +1,10 @@
+from pathlib import Path
 from types import SimpleNamespace
 
 import pytest
 
 from app.core.embeddings import utils
+from app.core.embeddings.cache import CachedEmbeddingProvider
 
 
 @pytest.fixture(autouse=True)
@@ -22,6 +24,12 @@ def test_get_embedding_provider_selects_sentence_transformers(
             model_name="all-MiniLM-L6-v2",
             model_path="models/all-MiniLM-L6-v2",
             model_dimensions=384,
+            cache_path=None,
+            cache_max_mb=0,
+            token_budget=1024,
+            backend="torch",
+            onnx_quantization=None,
+            onnx_parity_min_similarity=0.98,
         ),
     )
     monkeypatch.setattr(
@@ -45,6 +53,12 @@ def test_get_embedding_provider_selects_openai(
             model_name="text-embedding-3-small",
             model_path="unused",
             model_dimensions=256,
+            cache_path=None,
+            cache_max_mb=0,
+            token_budget=1024,
+            backend="torch",
+            onnx_quantization=None,
+            onnx_parity_min_similarity=0.98,
         ),
     )
     monkeypatch.setattr(
@@ -72,6 +86,12 @@ def test_get_embedding_provider_unsupported_provider_raises(
             model_name="x",
             model_path="y",
             model_dimensions=1,
+            cache_path=None,
+            cache_max_mb=0,
+            token_budget=1024,
+            backend="torch",
+            onnx_quantization=None,
+            onnx_parity_min_similarity=0.98,
         ),
     )
 
@@ -80,3 +100,99 @@ def test_get_embedding_provider_unsupported_provider_raises(
         match="Unsupported EMBEDDING_PROVIDER: unsupported",
     ):
         utils.get_embedding_provider()
+
+
+def test_get_embedding_provider_wraps_provider_with_cache(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(
+        utils,
+        "embedding_settings",
+        SimpleNamespace(
+            provider="sentence_transformers",
+            model_name="all-MiniLM-L6-v2",
+            model_path="models/all-MiniLM-L6-v2",
+            model_dimensions=384,
+            cache_path=tmp_path / "embeddings.sqlite3",
+            cache_max_mb=1,
+            token_budget=1024,
+            backend="torch",
+            onnx_quantization=None,
+            onnx_parity_min_similarity=0.98,
+        ),
+    )
+    monkeypatch.setattr(
+        utils,
+        "SentenceTransformerEmbeddingProvider",
+        lambda **_kwargs: object(),
+    )
+
+    assert isinstance(utils.get_embedding_provider(), CachedEmbeddingProvider)
+
+
+def test_get_embedding_provider_keys_cache_by_onnx_backend(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(
+        utils,
+        "embedding_settings",
+        SimpleNamespace(
+            provider="sentence_transformers",
+            model_name="all-MiniLM-L6-v2",
+            model_path="models/all-MiniLM-L6-v2",
+            model_dimensions=384,
+            cache_path=tmp_path / "embeddings.sqlite3",
+            cache_max_mb=1,
+            token_budget=1024,
+            backend="onnx",
+            onnx_quantization="avx2",
+            onnx_parity_min_similarity=0.98,
+        ),
+    )
+    received: dict[str, object] = {}
+    monkeypatch.setattr(
+        utils,
+        "SentenceTransformerEmbeddingProvider",
+        lambda **kwargs: received.update(kwargs) or object(),
+    )
+
+    provider = utils.get_embedding_provider()
+
+    assert received["backend"] == "onnx"
+    assert received["onnx_quantization"] == "avx2"
+    assert isinstance(provider, CachedEmbeddingProvider)
+    assert provider._model_key.endswith(":onnx:avx2")
+
+
+@pytest.mark.parametrize("backend", ["torch", "onnx"])
+def test_prepare_embedding_model_exports_onnx_models_only(
+    monkeypatch: pytest.MonkeyPatch, backend: str
+) -> None:
+    monkeypatch.setattr(
+        utils,
+        "embedding_settings",
+        SimpleNamespace(
+            provider="sentence_transformers",
+            model_name="all-MiniLM-L6-v2",
+            model_path=Path("models/all-MiniLM-L6-v2"),
+            backend=backend,
+            onnx_quantization="avx2",
+            onnx_parity_min_similarity=0.98,
+        ),
+    )
+    exports: list[dict[str, object]] = []
+    monkeypatch.setattr(
+        utils,
+        "SentenceTransformerEmbeddingProvider",
+        SimpleNamespace(ensure_onnx_export=lambda **kwargs: exports.append(kwargs)),
+    )
+
+    utils.prepare_embedding_model()
+
+    expected = {
+        "model_name": "all-MiniLM-L6-v2",
+        "model_path": Path("models/all-MiniLM-L6-v2"),
+        "quantization": "avx2",
+        "parity_min_similarity": 0.98,
+    }
+    assert exports == ([expected] if backend == "onnx" else [])
@@ -0,0 +1,23 @@
+from app.core.embeddings.length_batching import plan_length_batches
+
+
+def test_plan_length_batches_groups_similar_lengths_under_budget() -> None:
+    token_counts = [10, 100, 12, 90, 11, 300]
+
+    batches = plan_length_batches(token_counts, token_budget=200, max_batch_size=8)
+
+    # Each batch pads to its first (longest) text and stays within the budget
+    assert batches == [[5], [1, 3], [2, 4, 0]]
+    for batch in batches[1:]:
+        assert len(batch) * token_counts[batch[0]] <= 200
+    assert sorted(position for batch in batches for position in batch) == list(
+        range(len(token_counts))
+    )
+
+
+def test_plan_length_batches_caps_batch_size() -> None:
+    assert plan_length_batches([1] * 5, token_budget=100, max_batch_size=2) == [
+        [0, 1],
+        [2, 3],
+        [4],
+    ]
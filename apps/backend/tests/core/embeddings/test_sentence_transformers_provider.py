@@ -1,10 +1,15 @@
+import json
 from pathlib import Path
+from typing import ClassVar
 
 import pytest
 
 from app.core.embeddings import sentence_transformers as st_provider_module
 from app.core.embeddings.sentence_transformers import (
     SentenceTransformerEmbeddingProvider,
+    onnx_file_name,
+    onnx_model_path,
+    parity_similarity,
 )
 
 
@@ -17,24 +22,38 @@ class _FakeArray:
 
 
 class _FakeSentenceTransformer:
-    return_values: list[list[float]] = [[1.0, 2.0]]
-    last_encode_kwargs: dict[str, object] | None = None
+    return_values: ClassVar[list[list[float]] | None] = [[1.0, 2.0]]
+    last_encode_kwargs: ClassVar[dict[str, object] | None] = None
+    encoded_batches: ClassVar[list[list[str]]] = []
+    max_seq_length = 4
 
-    def __init__(self, _model_ref: str, device: str) -> None:
+    def __init__(self, _model_ref: str, device: str, **_kwargs) -> None:
         self.device = device
 
-    def encode(self, _texts: list[str], **kwargs):
+    @staticmethod
+    def tokenizer(texts: list[str], **_kwargs) -> dict[str, list[list[int]]]:
+        # One token per word
+        return {"input_ids": [[0] * len(text.split()) for text in texts]}
+
+    def encode(self, texts: list[str], **kwargs):
         self.__class__.last_encode_kwargs = kwargs
+        self.__class__.encoded_batches.append(texts)
+        if self.return_values is None:
+            return _FakeArray([[float(len(text.split())), 0.0] for text in texts])
         return _FakeArray(self.return_values)
 
-    def save(self, _path: str) -> None:
-        return
+    def save(self, path: str) -> None:
+        # What an ONNX export writes: the model next to its tokenizer
+        (Path(path) / "onnx").mkdir(parents=True, exist_ok=True)
+        (Path(path) / "onnx" / "model.onnx").write_bytes(b"onnx")
+        (Path(path) / "tokenizer.json").write_text("{}")
 
 
 def _set_fake_dependencies(monkeypatch: pytest.MonkeyPatch) -> None:
     SentenceTransformerEmbeddingProvider._load_transformer.cache_clear()
     _FakeSentenceTransformer.return_values = [[1.0, 2.0]]
     _FakeSentenceTransformer.last_encode_kwargs = None
+    _FakeSentenceTransformer.encoded_batches = []
     monkeypatch.setattr(
         st_provider_module,
         "SentenceTransformer",
@@ -80,3 +99,162 @@ def test_sentence_transformer_embedding_provider_raises_on_dimension_mismatch(
 
     with pytest.raises(RuntimeError, match="dimension mismatch"):
         provider.embed_text("a", normalize=False)
+
+
+def test_sentence_transformer_embedding_provider_batches_by_token_length(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    _set_fake_dependencies(monkeypatch)
+    _FakeSentenceTransformer.return_values = None
+
+    provider = SentenceTransformerEmbeddingProvider(
+        model_name="all-MiniLM-L6-v2",
+        model_path=tmp_path,
+        model_dimensions=2,
+        token_budget=4,
+    )
+    texts = ["a", "a b c", "a b", "a b c d e f", "b"]
+
+    vectors = provider.embed_texts(texts, normalize=True)
+
+    # Longest first; the 6-word text is truncated to the 4-token model limit
+    assert _FakeSentenceTransformer.encoded_batches == [
+        ["a b c d e f"],
+        ["a b c"],
+        ["a b", "a"],
+        ["b"],
+    ]
+    assert vectors == [[float(len(text.split())), 0.0] for text in texts]
+    # Counts are reported before truncation
+    _, token_counts = provider.embed_texts_counting_tokens(texts, normalize=True)
+    assert token_counts == [1, 3, 2, 6, 1]
+
+
+def test_onnx_export_is_cached_next_to_the_model_path() -> None:
+    model_path = Path("models/mixedbread-ai/mxbai-embed-xsmall-v1")
+
+    assert onnx_model_path(model_path) == Path(
+        "models/mixedbread-ai/mxbai-embed-xsmall-v1-onnx"
+    )
+    assert onnx_file_name(None) == "onnx/model.onnx"
+    assert onnx_file_name("avx2") == "onnx/model_qint8_avx2.onnx"
+
+
+def test_onnx_backend_requires_a_model_path(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _set_fake_dependencies(monkeypatch)
+    SentenceTransformerEmbeddingProvider._load_onnx_transformer.cache_clear()
+
+    with pytest.raises(RuntimeError, match="EMBEDDING_MODEL_PATH is required"):
+        SentenceTransformerEmbeddingProvider(
+            model_name="all-MiniLM-L6-v2",
+            model_path=None,
+            model_dimensions=2,
+            backend="onnx",
+        )
+
+
+class _FixedVectorsModel:
+    def __init__(self, vector: list[float]) -> None:
+        self.vector = vector
+
+    def encode(self, texts: list[str], **_kwargs) -> _FakeArray:
+        return _FakeArray([self.vector for _ in texts])
+
+
+def test_parity_similarity_is_the_lowest_cosine_similarity() -> None:
+    reference = _FixedVectorsModel([1.0, 0.0])
+
+    assert parity_similarity(reference, _FixedVectorsModel([1.0, 0.0])) == 1.0  # type: ignore[arg-type]
+    assert parity_similarity(reference, _FixedVectorsModel([0.6, 0.8])) == 0.6  # type: ignore[arg-type]
+
+
+def test_onnx_export_failing_parity_is_discarded(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    _set_fake_dependencies(monkeypatch)
+    # Every fake-loaded model, including the ONNX candidate, returns [0, 1]
+    _FakeSentenceTransformer.return_values = [[0.0, 1.0]] * 6
+    model_path = tmp_path / "model"
+
+    with pytest.raises(RuntimeError, match="does not match the torch model"):
+        SentenceTransformerEmbeddingProvider._export_onnx(
+            reference=_FixedVectorsModel([1.0, 0.0]),  # type: ignore[arg-type]
+            model_name="all-MiniLM-L6-v2",
+            model_path=model_path,
+            quantization=None,
+            parity_min_similarity=0.98,
+        )
+    # The rejected export never left its staging directory, only its record did
+    export_path = onnx_model_path(model_path)
+    assert list(tmp_path.iterdir()) == [export_path]
+    assert [path.name for path in (export_path / "onnx").iterdir()] == [
+        "model.onnx.parity-failed.json"
+    ]
+
+
+def test_onnx_export_failing_parity_is_not_retried_until_the_config_changes(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    _set_fake_dependencies(monkeypatch)
+    model_path = tmp_path / "model"
+    exports: list[str] = []
+
+    def export_onnx(*, model_name: str, **_kwargs) -> None:
+        exports.append(model_name)
+        failure_path = (
+            onnx_model_path(model_path) / "onnx/model.onnx.parity-failed.json"
+        )
+        failure_path.parent.mkdir(parents=True, exist_ok=True)
+        failure_path.write_text(
+            json.dumps({"model_name": model_name, "similarity": 0.9})
+        )
+        raise RuntimeError("does not match the torch model")
+
+    monkeypatch.setattr(
+        SentenceTransformerEmbeddingProvider, "_export_onnx", export_onnx
+    )
+
+    def ensure_onnx_export(model_name: str, parity_min_similarity: float) -> None:
+        with pytest.raises(RuntimeError, match="does not match the torch model"):
+            SentenceTransformerEmbeddingProvider.ensure_onnx_export(
+                model_name=model_name,
+                model_path=model_path,
+                quantization=None,
+                parity_min_similarity=parity_min_similarity,
+            )
+
+    ensure_onnx_export("all-MiniLM-L6-v2", 0.98)
+    ensure_onnx_export("all-MiniLM-L6-v2", 0.98)
+    assert exports == ["all-MiniLM-L6-v2"]
+
+    # A lower threshold or another model exports again
+    ensure_onnx_export("all-MiniLM-L6-v2", 0.85)
+    ensure_onnx_export("all-mpnet-base-v2", 0.85)
+    assert exports == ["all-MiniLM-L6-v2"] * 2 + ["all-mpnet-base-v2"]
+
+
+def test_onnx_export_is_moved_into_place_once_checked(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    _set_fake_dependencies(monkeypatch)
+    _FakeSentenceTransformer.return_values = [[0.0, 1.0]] * 6
+    model_path = tmp_path / "model"
+
+    SentenceTransformerEmbeddingProvider._export_onnx(
+        reference=_FixedVectorsModel([0.0, 1.0]),  # type: ignore[arg-type]
+        model_name="all-MiniLM-L6-v2",
+        model_path=model_path,
+        quantization=None,
+        parity_min_similarity=0.98,
+    )
+
+    export_path = onnx_model_path(model_path)
+    assert (export_path / onnx_file_name(None)).read_bytes() == b"onnx"
+    assert (export_path / "tokenizer.json").exists()
+    assert list(tmp_path.iterdir()) == [export_path]
@@ -0,0 +1,42 @@
+from app.core.rag.search import RRF_K, fuse_chunk_results
+from app.models.embedding import CardEmbeddingVectorSearchResult
+
+
+def _chunk(source_id: str, chunk_name: str | None, summary: str, score: float):
+    return CardEmbeddingVectorSearchResult(
+        source_id=source_id, chunk_name=chunk_name, summary=summary, score=score
+    )
+
+
+def test_cards_matching_through_several_chunks_rank_first() -> None:
+    results = fuse_chunk_results(
+        [
+            _chunk("bolt", "name", "Lightning Bolt", 0.95),
+            _chunk("shock", "rules", "Shock deals 2 damage.", 0.9),
+            _chunk("shock", "name", "Shock", 0.8),
+            _chunk("bolt", "rules", "Bolt deals 3 damage.", 0.7),
+            _chunk("opt", "rules", "Scry 1.", 0.6),
+        ],
+        limit=2,
+    )
+
+    assert [result.source_id for result in results] == ["bolt", "shock"]
+    assert results[0].fused_score == 1 / (RRF_K + 1) + 1 / (RRF_K + 2)
+    assert results[0].summary == "Lightning Bolt\nBolt deals 3 damage."
+    # The cosine similarity stays the score
+    assert results[0].score == 0.95
+
+
+def test_single_template_results_keep_their_order() -> None:
+    results = fuse_chunk_results(
+        [
+            _chunk("a", None, "A", 0.9),
+            _chunk("b", None, "B", 0.8),
+        ],
+        limit=5,
+    )
+
+    assert [(result.source_id, result.summary, result.score) for result in results] == [
+        ("a", "A", 0.9),
+        ("b", "B", 0.8),
+    ]
@@ -1,3 +1,6 @@
+from unittest.mock import MagicMock
+
+from app.core.config import embedding_settings
 from app.core.rag.search import RagSearch
 
 
@@ -44,3 +47,55 @@ def test_search_stream_uses_requested_embedding_normalization(monkeypatch) -> No
     rag_search = RagSearch(db=None)  # type: ignore
     _ = list(rag_search.search_stream("hello", normalize_embeddings=False))
     assert fake_embedder.last_normalize is False
+
+
+def _embeddings_collection(name: str) -> MagicMock:
+    db = MagicMock()
+    db.embeddings_collection.name = name
+    return db
+
+
+def test_vector_search_queries_each_chunk_template_in_one_aggregation(
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr(embedding_settings, "vector_limit", 2)
+    db = _embeddings_collection("chunks_named")
+    db.embeddings_collection.distinct.return_value = ["name", "rules"]
+    db.embeddings_collection.aggregate.return_value = [
+        {"source_id": "bolt", "chunk_name": "name", "summary": "Bolt", "score": 0.9},
+        {"source_id": "bolt", "chunk_name": "rules", "summary": "3 dmg", "score": 0.7},
+    ]
+
+    search = RagSearch(db=db)
+    results = search._RagSearch__vector_search([0.1, 0.2])  # type: ignore[attr-defined]
+    search._RagSearch__vector_search([0.1, 0.2])  # type: ignore[attr-defined]
+
+    # Chunk names are cached between queries
+    db.embeddings_collection.distinct.assert_called_once_with("chunk_name")
+    pipeline = db.embeddings_collection.aggregate.call_args.args[0]
+    unions = [stage["$unionWith"] for stage in pipeline if "$unionWith" in stage]
+    searches = [pipeline[0]["$vectorSearch"]] + [
+        union["pipeline"][0]["$vectorSearch"] for union in unions
+    ]
+    assert all(union["coll"] == "chunks_named" for union in unions)
+    # Unnamed chunks are still searched next to the named ones
+    assert [search["filter"] for search in searches] == [
+        {"chunk_name": {"$eq": "name"}},
+        {"chunk_name": {"$eq": "rules"}},
+        {"chunk_name": {"$eq": None}},
+    ]
+    assert all(search["limit"] == 2 for search in searches)
+    assert [(result.source_id, result.score) for result in results] == [("bolt", 0.9)]
+    assert results[0].fused_score == 2 / 61
+
+
+def test_vector_search_runs_one_unfiltered_query_for_a_single_template() -> None:
+    db = _embeddings_collection("chunks_single")
+    db.embeddings_collection.distinct.return_value = [None]
+    db.embeddings_collection.aggregate.return_value = []
+
+    RagSearch(db=db)._RagSearch__vector_search([0.1, 0.2])  # type: ignore[attr-defined]
+
+    (call,) = db.embeddings_collection.aggregate.call_args_list
+    assert "filter" not in call.args[0][0]["$vectorSearch"]
+    assert not any("$unionWith" in stage for stage in call.args[0])
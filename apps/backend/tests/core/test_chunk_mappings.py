@@ -2,9 +2,13 @@ import pytest
 from bson import ObjectId
 
 from app.core.chunk_mappings import (
+    compile_chunk_mapping,
     extract_chunk_mapping_fields,
+    named_chunk_templates,
+    parse_chunk_templates,
     render_chunk_mapping,
 )
+from app.models.api import CreateEmbeddingChunksParams
 from app.models.db import MongoCollectionRecord
 
 
@@ -38,3 +42,75 @@ def test_render_chunk_mapping_escapes_template_literal_segments() -> None:
         ),
     )
     assert rendered == "prefix '' value"
+
+
+def test_compiled_chunk_mapping_renders_raw_documents() -> None:
+    chunk_mapping = compile_chunk_mapping("{name} costs {prices.usd}\n{missing.field}")
+
+    rendered = chunk_mapping.render(
+        {"_id": ObjectId(), "name": "Opt", "prices": {"usd": "0.10"}}
+    )
+
+    assert rendered == "Opt costs 0.10\\n"
+    assert chunk_mapping.fields == {"name", "prices.usd", "missing.field"}
+
+
+def test_compile_chunk_mapping_reuses_render_plans() -> None:
+    assert compile_chunk_mapping("{name}") is compile_chunk_mapping("{name}")
+
+
+def test_compile_chunk_mapping_raises_on_invalid_placeholder() -> None:
+    with pytest.raises(ValueError):
+        compile_chunk_mapping("{name} {")
+
+
+def test_compiled_chunk_mapping_projection_collapses_nested_paths() -> None:
+    chunk_mapping = compile_chunk_mapping(
+        "{prices.usd} {name} {prices} {card_faces.name} {card_faces.mana_cost}"
+    )
+
+    assert chunk_mapping.projection == {
+        "card_faces.mana_cost": 1,
+        "card_faces.name": 1,
+        "name": 1,
+        "prices": 1,
+    }
+
+
+def test_parse_chunk_templates_reads_named_templates() -> None:
+    assert parse_chunk_templates('{"name": "{name}", "rules": "{oracle_text}"}') == {
+        "name": "{name}",
+        "rules": "{oracle_text}",
+    }
+    assert parse_chunk_templates(None) == {}
+
+
+@pytest.mark.parametrize("value", ["[1, 2]", '{"name": ""}', '{"": "{name}"}'])
+def test_parse_chunk_templates_rejects_invalid_templates(value: str) -> None:
+    with pytest.raises(ValueError):
+        parse_chunk_templates(value)
+
+
+def test_named_chunk_templates_takes_exactly_one_kind_of_template() -> None:
+    assert named_chunk_templates(chunk_mappings="{name}", chunk_templates={}) == {
+        None: "{name}"
+    }
+    assert named_chunk_templates(
+        chunk_mappings=None, chunk_templates={"rules": "{oracle_text}"}
+    ) == {"rules": "{oracle_text}"}
+    with pytest.raises(ValueError, match="Provide either"):
+        named_chunk_templates(chunk_mappings=None, chunk_templates={})
+
+
+@pytest.mark.parametrize(
+    "templates",
+    [{}, {"chunk_mappings": "{name}", "chunk_templates": {"rules": "{oracle_text}"}}],
+)
+def test_create_chunks_params_require_exactly_one_kind_of_template(
+    templates: dict,
+) -> None:
+    # Also enforced for callers building the params without the form
+    with pytest.raises(ValueError, match="Provide either"):
+        CreateEmbeddingChunksParams(
+            source_collection="cards", target_collection="chunks", **templates
+        )
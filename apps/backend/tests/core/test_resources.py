@@ -0,0 +1,45 @@
+import pytest
+
+from app.core import resources
+
+
+@pytest.fixture
+def cgroup_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(resources, "CGROUP_ROOT", tmp_path)
+    return tmp_path
+
+
+def test_cgroup_v2_limits_are_read(cgroup_root) -> None:
+    (cgroup_root / "cpu.max").write_text("250000 100000\n")
+    (cgroup_root / "memory.max").write_text("4294967296\n")
+
+    assert resources.cgroup_cpu_limit() == 2.5
+    assert resources.cgroup_memory_limit() == 4 * 2**30
+
+
+def test_cgroup_v2_unlimited_values_are_none(cgroup_root) -> None:
+    (cgroup_root / "cpu.max").write_text("max 100000\n")
+    (cgroup_root / "memory.max").write_text("max\n")
+
+    assert resources.cgroup_cpu_limit() is None
+    assert resources.cgroup_memory_limit() is None
+
+
+def test_cgroup_v1_limits_are_read(cgroup_root) -> None:
+    (cgroup_root / "cpu").mkdir()
+    (cgroup_root / "cpu" / "cpu.cfs_quota_us").write_text("200000\n")
+    (cgroup_root / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (cgroup_root / "memory").mkdir()
+    (cgroup_root / "memory" / "memory.limit_in_bytes").write_text(
+        "9223372036854771712\n"
+    )
+
+    assert resources.cgroup_cpu_limit() == 2.0
+    assert resources.cgroup_memory_limit() is None
+
+
+def test_available_cpus_is_capped_by_the_quota(cgroup_root, monkeypatch) -> None:
+    monkeypatch.setattr(resources.os, "sched_getaffinity", lambda _pid: set(range(16)))
+    (cgroup_root / "cpu.max").write_text("150000 100000\n")
+
+    assert resources.available_cpus() == 1
@@ -0,0 +1,219 @@
+from unittest.mock import MagicMock
+
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+
+from app.core.chunk_mappings import compile_chunk_mapping
+from app.core.hashing import hash_text
+from app.data_pipeline.embeddings import create_chunks as pipeline
+
+
+class _DummyPool:
+    def __init__(self, *, processes: int | None, initializer=None, initargs=()) -> None:
+        self.processes = processes
+        if initializer is not None:
+            initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def imap_unordered(self, func, batches):
+        return [func(batch) for batch in batches]
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        callback(func(*args))
+
+
+def test_run_pipeline_projects_mapped_fields_and_renders_raw_documents(
+    monkeypatch,
+) -> None:
+    card_id = ObjectId()
+    db = MagicMock()
+    db.get_collection.return_value.find.return_value.limit.return_value = [
+        {"_id": card_id, "name": "Opt", "prices": {"usd": "0.10"}}
+    ]
+    monkeypatch.setattr(pipeline, "_db_instance", db)
+    monkeypatch.setattr(pipeline.multiprocessing, "Pool", _DummyPool)
+    monkeypatch.setattr(pipeline, "_reset_db_instance", lambda: None)
+
+    pipeline.run_pipeline_create_embedding_chunks(
+        source_collection="cards",
+        target_collection="chunks",
+        chunk_templates={None: "{name}: {prices.usd} ({prices})"},
+        limit=1,
+    )
+
+    db_collection = db.get_collection.return_value
+    db_collection.find.assert_called_once_with(
+        {}, {"name": 1, "prices": 1, "chunk_source_id": 1}
+    )
+    operation = db_collection.bulk_write.call_args.args[0][0]
+    assert operation._filter == {"_id": card_id}
+    assert operation._doc["summary"] == "Opt: 0.10 ({'usd': '0.10'})"
+
+
+def test_run_pipeline_renders_string_fields_server_side(monkeypatch) -> None:
+    db = MagicMock()
+    db_collection = db.get_collection.return_value
+    db_collection.find_one.return_value = None
+    monkeypatch.setattr(pipeline, "_db_instance", db)
+    monkeypatch.setattr(pipeline.multiprocessing, "Pool", None)
+
+    pipeline.run_pipeline_create_embedding_chunks(
+        source_collection="cards",
+        target_collection="chunks",
+        chunk_templates={None: "Name: {name}"},
+        limit=10,
+        server_side=True,
+    )
+
+    stages = db_collection.aggregate.call_args.args[0]
+    assert stages[0] == {"$limit": 10}
+    assert stages[1]["$project"]["summary"] == {
+        "$concat": [{"$literal": "Name: "}, {"$ifNull": ["$name", ""]}]
+    }
+    assert stages[2]["$merge"]["into"] == "chunks"
+    db_collection.find.assert_not_called()
+
+
+def test_run_pipeline_falls_back_to_python_for_non_string_fields(
+    monkeypatch,
+) -> None:
+    db = MagicMock()
+    db_collection = db.get_collection.return_value
+    db_collection.find_one.return_value = {"_id": ObjectId()}
+    db_collection.find.return_value = [{"_id": ObjectId(), "cmc": 2.0}]
+    db_collection.aggregate.return_value = []
+    monkeypatch.setattr(pipeline, "_db_instance", db)
+    monkeypatch.setattr(pipeline.multiprocessing, "Pool", _DummyPool)
+    monkeypatch.setattr(pipeline, "_reset_db_instance", lambda: None)
+
+    pipeline.run_pipeline_create_embedding_chunks(
+        source_collection="cards",
+        target_collection="chunks",
+        chunk_templates={None: "CMC {cmc}"},
+        server_side=True,
+    )
+
+    # Only the partitioning aggregation ran, no server-side `$merge`
+    (stages,) = db_collection.aggregate.call_args.args
+    assert "$bucketAuto" in stages[-1]
+    operation = db_collection.bulk_write.call_args.args[0][0]
+    assert operation._doc["summary"] == "CMC 2.0"
+
+
+def test_incremental_batch_rewrites_only_changed_chunks(monkeypatch) -> None:
+    unchanged_id, changed_id, new_id, retemplated_id = (ObjectId() for _ in range(4))
+    chunk_mapping = compile_chunk_mapping("{name}")
+    db = MagicMock()
+    db_collection = db.get_collection.return_value
+    db_collection.find.return_value = [
+        {
+            "_id": unchanged_id,
+            "summary_hash": hash_text("Opt"),
+            "template_hash": chunk_mapping.template_hash,
+        },
+        {
+            "_id": changed_id,
+            "summary_hash": hash_text("Old"),
+            "template_hash": chunk_mapping.template_hash,
+        },
+        # Rendered server-side: no summary hash, only the summary text
+        {"_id": retemplated_id, "summary": "Ponder", "template_hash": "old"},
+    ]
+    monkeypatch.setattr(pipeline, "_db_instance", db)
+
+    pipeline.process_batch_empty_embeddings(
+        [
+            {"_id": unchanged_id, "name": "Opt"},
+            {"_id": changed_id, "name": "New"},
+            {"_id": new_id, "name": "Brainstorm"},
+            {"_id": retemplated_id, "name": "Ponder"},
+        ],
+        target_collection="chunks",
+        chunk_templates={None: "{name}"},
+        incremental=True,
+    )
+
+    operations = db_collection.bulk_write.call_args.args[0]
+    replaced = {
+        op._filter["_id"]: op._doc for op in operations if isinstance(op, ReplaceOne)
+    }
+    updated = [op for op in operations if isinstance(op, UpdateOne)]
+    assert set(replaced) == {changed_id, new_id}
+    assert replaced[changed_id]["embeddings"] == []
+    assert replaced[changed_id]["summary_hash"] == hash_text("New")
+    assert len(updated) == 1
+    assert updated[0]._filter == {"_id": retemplated_id}
+    assert updated[0]._doc == {"$set": {"template_hash": chunk_mapping.template_hash}}
+
+
+def test_named_chunks_get_stable_ids_per_template(monkeypatch) -> None:
+    card_id = ObjectId()
+    db = MagicMock()
+    monkeypatch.setattr(pipeline, "_db_instance", db)
+
+    pipeline.process_batch_empty_embeddings(
+        [{"_id": card_id, "name": "Opt", "oracle_text": "Scry 1."}],
+        target_collection="chunks",
+        chunk_templates={"name": "{name}", "rules": "{oracle_text}"},
+    )
+
+    # Every template is rendered and written in one pass over the batch
+    (call,) = db.get_collection().bulk_write.call_args_list
+    name_chunk, rules_chunk = (operation._doc for operation in call.args[0])
+    assert name_chunk["_id"] == pipeline.chunk_id(card_id, "name")
+    assert rules_chunk["_id"] == pipeline.chunk_id(card_id, "rules")
+    assert name_chunk["_id"] != rules_chunk["_id"]
+    assert name_chunk["source_id"] == rules_chunk["source_id"] == str(card_id)
+    assert (name_chunk["chunk_name"], name_chunk["summary"]) == ("name", "Opt")
+    assert (rules_chunk["chunk_name"], rules_chunk["summary"]) == ("rules", "Scry 1.")
+    # Unnamed chunks keep the source id, as before
+    assert pipeline.chunk_id(card_id, None) == card_id
+
+
+def test_run_pipeline_reads_the_source_once_for_every_template(monkeypatch) -> None:
+    db = MagicMock()
+    db_collection = db.get_collection.return_value
+    db_collection.find.return_value.limit.return_value = [
+        {"_id": ObjectId(), "name": "Opt", "prices": {"usd": "0.10"}}
+    ]
+    monkeypatch.setattr(pipeline, "_db_instance", db)
+    monkeypatch.setattr(pipeline.multiprocessing, "Pool", _DummyPool)
+    monkeypatch.setattr(pipeline, "_reset_db_instance", lambda: None)
+
+    pipeline.run_pipeline_create_embedding_chunks(
+        source_collection="cards",
+        target_collection="chunks",
+        chunk_templates={"name": "{name}", "price": "{prices.usd} ({prices})"},
+        limit=1,
+        server_side=True,
+    )
+
+    db_collection.find.assert_called_once_with(
+        {}, {"name": 1, "prices": 1, "chunk_source_id": 1}
+    )
+    operations = db_collection.bulk_write.call_args.args[0]
+    assert [operation._doc["chunk_name"] for operation in operations] == [
+        "name",
+        "price",
+    ]
+
+
+def test_chunks_of_oracle_cards_point_at_the_canonical_printing(monkeypatch) -> None:
+    oracle_id, printing_id = ObjectId(), ObjectId()
+    db = MagicMock()
+    monkeypatch.setattr(pipeline, "_db_instance", db)
+
+    pipeline.process_batch_empty_embeddings(
+        [{"_id": oracle_id, "chunk_source_id": str(printing_id), "name": "Opt"}],
+        target_collection="chunks",
+        chunk_templates={None: "{name}"},
+    )
+
+    chunk = db.get_collection().bulk_write.call_args.args[0][0]._doc
+    assert chunk["_id"] == oracle_id
+    assert chunk["source_id"] == str(printing_id)
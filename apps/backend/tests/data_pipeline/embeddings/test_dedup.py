@@ -0,0 +1,35 @@
+from app.core.hashing import hash_text
+from app.data_pipeline.embeddings.dedup import SummaryEmbeddingCache, embed_distinct
+
+
+def test_embed_distinct_embeds_each_summary_once() -> None:
+    calls: list[list[str]] = []
+
+    def _embed_texts(texts: list[str]) -> list[list[float]]:
+        calls.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    cache = SummaryEmbeddingCache(max_size=10)
+    deduped = embed_distinct(
+        ["Island", "Opt", "Island"], embed_texts=_embed_texts, cache=cache
+    )
+    again = embed_distinct(["Opt", "Ponder"], embed_texts=_embed_texts, cache=cache)
+
+    assert calls == [["Island", "Opt"], ["Ponder"]]
+    assert deduped.vectors == [[6.0], [3.0], [6.0]]
+    assert deduped.embedded_hashes == [hash_text("Island"), hash_text("Opt")]
+    assert again.vectors == [[3.0], [6.0]]
+    assert again.embedded_hashes == [hash_text("Ponder")]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_summary_cache_evicts_least_recently_used() -> None:
+    cache = SummaryEmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
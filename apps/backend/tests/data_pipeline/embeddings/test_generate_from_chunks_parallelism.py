@@ -1,12 +1,19 @@
 from types import SimpleNamespace
+from unittest.mock import MagicMock
 
+from bson import ObjectId
+
+from app.core.embeddings.provider import EmbeddingProvider
 from app.data_pipeline.embeddings import generate_from_chunks as pipeline
+from app.data_pipeline.partitions import IdRange
+from app.data_pipeline.workers import WorkerPoolPlan
+from app.models.db import EmptyEmbeddingRecord
 
 
 class _DummyPool:
     used = False
 
-    def __init__(self, *, processes: int) -> None:
+    def __init__(self, *, processes: int, initializer=None, initargs=()) -> None:
         self.processes = processes
         self.__class__.used = True
 
@@ -25,6 +32,9 @@ class _DummyPool:
             func(batch)
         return []
 
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        callback(func(*args))
+
 
 def test_run_pipeline_uses_sequential_for_openai(monkeypatch) -> None:
     _DummyPool.used = False
@@ -35,18 +45,20 @@ def test_run_pipeline_uses_sequential_for_openai(monkeypatch) -> None:
         "embedding_settings",
         SimpleNamespace(provider="openai"),
     )
+    monkeypatch.setattr(pipeline, "_get_db", MagicMock())
     monkeypatch.setattr(
         pipeline,
         "__load_db_records",
-        lambda _collection, *, limit=None: iter([["a"], ["b"]]),
-    )
-    monkeypatch.setattr(
-        pipeline,
-        "process_batch",
-        lambda records, *, target_collection, normalize_embeddings=True: calls.append(
-            (records, target_collection, normalize_embeddings)
-        ),
+        lambda _collection, *, limit=None, missing_only=False: iter([["a"], ["b"]]),
     )
+
+    def _process_batch(
+        records, *, target_collection, normalize_embeddings=True, summary_cache=None
+    ):
+        calls.append((records, target_collection, normalize_embeddings))
+        return len(records)
+
+    monkeypatch.setattr(pipeline, "process_batch", _process_batch)
     monkeypatch.setattr(pipeline.multiprocessing, "Pool", _DummyPool)
 
     pipeline.run_pipeline_generate_embeddings_from_chunks(
@@ -70,26 +82,249 @@ def test_run_pipeline_uses_multiprocessing_for_sentence_transformers(
         "embedding_settings",
         SimpleNamespace(provider="sentence_transformers"),
     )
+    monkeypatch.setattr(pipeline, "_get_db", MagicMock())
     monkeypatch.setattr(
         pipeline,
         "__load_db_records",
-        lambda _collection, *, limit=None: iter([["a"], ["b"]]),
+        lambda _collection, *, limit=None, missing_only=False: iter([["a"], ["b"]]),
     )
+
+    def _process_batch(
+        records, *, target_collection, normalize_embeddings=True, summary_cache=None
+    ):
+        calls.append((records, target_collection, normalize_embeddings))
+        return len(records)
+
+    monkeypatch.setattr(pipeline, "process_batch", _process_batch)
+    monkeypatch.setattr(pipeline.multiprocessing, "Pool", _DummyPool)
     monkeypatch.setattr(
         pipeline,
-        "process_batch",
-        lambda records, *, target_collection, normalize_embeddings=True: calls.append(
-            (records, target_collection, normalize_embeddings)
-        ),
+        "plan_embedding_worker_pool",
+        lambda: WorkerPoolPlan(processes=2, threads_per_worker=1),
     )
-    monkeypatch.setattr(pipeline.multiprocessing, "Pool", _DummyPool)
-    monkeypatch.setattr(pipeline.os, "cpu_count", lambda: 2)
 
     pipeline.run_pipeline_generate_embeddings_from_chunks(
         target_collection="target",
         normalize_embeddings=True,
-        limit=None,
+        limit=10,
     )
 
     assert _DummyPool.used is True
     assert calls == [(["a"], "target", True), (["b"], "target", True)]
+
+
+def test_run_pipeline_partitions_cursors_across_workers(monkeypatch) -> None:
+    _DummyPool.used = False
+    id_ranges = [IdRange(end=5), IdRange(start=5)]
+    calls: list[tuple[IdRange, str, bool]] = []
+
+    monkeypatch.setattr(
+        pipeline,
+        "embedding_settings",
+        SimpleNamespace(provider="sentence_transformers"),
+    )
+    monkeypatch.setattr(pipeline, "_get_db", MagicMock())
+    monkeypatch.setattr(
+        pipeline,
+        "split_id_ranges",
+        lambda _collection, *, parts, query: id_ranges,
+    )
+
+    def _process_id_range(
+        id_range,
+        *,
+        target_collection,
+        normalize_embeddings,
+        missing_only,
+        summary_cache,
+    ):
+        calls.append((id_range, target_collection, missing_only))
+        return 0
+
+    monkeypatch.setattr(pipeline, "process_id_range", _process_id_range)
+    monkeypatch.setattr(pipeline.multiprocessing, "Pool", _DummyPool)
+    monkeypatch.setattr(
+        pipeline,
+        "plan_embedding_worker_pool",
+        lambda: WorkerPoolPlan(processes=2, threads_per_worker=1),
+    )
+
+    pipeline.run_pipeline_generate_embeddings_from_chunks(
+        target_collection="target", missing_only=True
+    )
+
+    assert _DummyPool.used is True
+    assert calls == [(id_ranges[0], "target", True), (id_ranges[1], "target", True)]
+
+
+def test_run_pipeline_checkpoints_progress_and_failure(monkeypatch) -> None:
+    db = MagicMock()
+    monkeypatch.setattr(pipeline, "_get_db", lambda: db)
+    monkeypatch.setattr(
+        pipeline, "embedding_settings", SimpleNamespace(provider="openai")
+    )
+    monkeypatch.setattr(
+        pipeline,
+        "__load_db_records",
+        lambda _collection, *, limit=None, missing_only=False: iter(
+            [["a", "b"], ["c"]]
+        ),
+    )
+
+    def _process_batch(
+        records, *, target_collection, normalize_embeddings=True, summary_cache=None
+    ):
+        if records == ["c"]:
+            raise RuntimeError("rate limited")
+        return len(records)
+
+    monkeypatch.setattr(pipeline, "process_batch", _process_batch)
+
+    try:
+        pipeline.run_pipeline_generate_embeddings_from_chunks(
+            target_collection="target", missing_only=True
+        )
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("expected the batch failure to propagate")
+
+    updates = [
+        call.args[1]
+        for call in db.get_collection.return_value.update_one.call_args_list
+    ]
+    assert updates[0]["$set"]["status"] == "running"
+    assert updates[1]["$inc"] == {"embedded": 2}
+    assert updates[-1]["$set"]["status"] == "failed"
+    assert "rate limited" in updates[-1]["$set"]["error"]
+
+
+def test_missing_only_reads_pending_chunks_from_the_partial_index(
+    monkeypatch,
+) -> None:
+    db = MagicMock()
+    db_collection = db.get_collection.return_value
+    db_collection.index_information.return_value = {"_id_": {}}
+    monkeypatch.setattr(pipeline, "_get_db", lambda: db)
+
+    getattr(pipeline, "__ensure_pending_index")("target")
+
+    # Legacy chunks without embeddings are flagged once, before the index exists
+    flagged_query, flag = db_collection.update_many.call_args.args
+    assert flagged_query["embeddings.0"] == {"$exists": False}
+    assert flag == {"$set": {"embeddings_pending": True}}
+    db.create_chunk_indexes.assert_called_once_with(collection="target")
+    assert pipeline._chunk_query(missing_only=True) == {"embeddings_pending": True}
+
+    db_collection.index_information.return_value = {"embeddings_pending": {}}
+    db_collection.update_many.reset_mock()
+    getattr(pipeline, "__ensure_pending_index")("target")
+    db_collection.update_many.assert_not_called()
+
+
+def test_stored_embeddings_clear_the_pending_flag(monkeypatch) -> None:
+    db = MagicMock()
+    # The chunk and two pending reprints sharing its summary
+    db.get_collection.return_value.bulk_write.return_value.matched_count = 3
+    monkeypatch.setattr(pipeline, "_get_db", lambda: db)
+    embedder = MagicMock(spec=EmbeddingProvider)
+    embedder.embed_texts.return_value = [[0.1, 0.2]]
+    monkeypatch.setattr(pipeline, "get_embedding_provider", lambda: embedder)
+
+    embedded = pipeline.process_batch(
+        [EmptyEmbeddingRecord(_id=ObjectId(), summary="Opt")],
+        target_collection="target",
+    )
+
+    assert embedded == 3
+    operation = db.get_collection.return_value.bulk_write.call_args.args[0][0]
+    assert operation._doc == {
+        "$set": {"embeddings": [0.1, 0.2]},
+        "$unset": {"embeddings_pending": ""},
+    }
+
+
+def test_duplicate_summaries_are_embedded_once_and_fanned_out(monkeypatch) -> None:
+    db = MagicMock()
+    monkeypatch.setattr(pipeline, "_get_db", lambda: db)
+    embedder = MagicMock(spec=EmbeddingProvider)
+    embedder.embed_texts.side_effect = lambda texts, normalize: [
+        [float(len(text))] for text in texts
+    ]
+    monkeypatch.setattr(pipeline, "get_embedding_provider", lambda: embedder)
+    forest_ids = [ObjectId(), ObjectId()]
+    summary_cache = pipeline.new_summary_cache()
+
+    pipeline.process_batch(
+        [
+            EmptyEmbeddingRecord(_id=forest_ids[0], summary="Forest"),
+            EmptyEmbeddingRecord(_id=ObjectId(), summary="Opt"),
+            EmptyEmbeddingRecord(_id=forest_ids[1], summary="Forest"),
+        ],
+        target_collection="target",
+        summary_cache=summary_cache,
+    )
+    # A later batch of the same run reuses the vector
+    pipeline.process_batch(
+        [EmptyEmbeddingRecord(_id=ObjectId(), summary="Forest")],
+        target_collection="target",
+        summary_cache=summary_cache,
+    )
+
+    assert [call.args[0] for call in embedder.embed_texts.call_args_list] == [
+        ["Forest", "Opt"]
+    ]
+    first_batch, second_batch = (
+        call.args[0]
+        for call in db.get_collection.return_value.bulk_write.call_args_list
+    )
+    stored = {
+        op._filter["_id"]: op._doc["$set"]["embeddings"] for op in first_batch[:3]
+    }
+    assert stored[forest_ids[0]] == stored[forest_ids[1]] == [6.0]
+    # Newly embedded summaries also fill other pending chunks sharing them
+    fanned_out = [op._filter for op in first_batch[3:]]
+    assert [f["summary"] for f in fanned_out] == ["Forest", "Opt"]
+    assert all(f["embeddings_pending"] is True for f in fanned_out)
+    # Chunks of the batch are stored once, by their own update
+    assert fanned_out[0]["_id"] == {"$nin": forest_ids}
+    assert len(second_batch) == 1
+
+
+def test_chunks_record_token_counts_and_truncation(monkeypatch) -> None:
+    db = MagicMock()
+    monkeypatch.setattr(pipeline, "_get_db", lambda: db)
+
+    tokenized: list[list[str]] = []
+
+    class _TokenizingEmbedder:
+        max_tokens = 3
+
+        def embed_text(self, text: str, *, normalize: bool) -> list[float]:
+            return [1.0]
+
+        def embed_texts(self, texts: list[str], *, normalize: bool):
+            raise AssertionError("token counts come from the embedding pass")
+
+        def embed_texts_counting_tokens(self, texts: list[str], *, normalize: bool):
+            tokenized.append(texts)
+            return [[1.0] for _ in texts], [len(text.split()) for text in texts]
+
+    monkeypatch.setattr(pipeline, "get_embedding_provider", _TokenizingEmbedder)
+
+    pipeline.process_batch(
+        [
+            EmptyEmbeddingRecord(_id=ObjectId(), summary="Opt"),
+            EmptyEmbeddingRecord(_id=ObjectId(), summary="Draw four cards now"),
+            EmptyEmbeddingRecord(_id=ObjectId(), summary="Opt"),
+        ],
+        target_collection="target",
+    )
+
+    # Each distinct summary is tokenized once, by the pass that embeds it
+    assert tokenized == [["Opt", "Draw four cards now"]]
+    operations = db.get_collection.return_value.bulk_write.call_args.args[0]
+    assert [
+        (op._doc["$set"]["token_count"], op._doc["$set"]["truncated"])
+        for op in operations[:3]
+    ] == [(1, False), (4, True), (1, False)]
@@ -0,0 +1,107 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from app.data_pipeline.ingestion.dataset_formats import (
+    DatasetFormat,
+    DatasetRecordDecoder,
+    detect_dataset_format,
+    iter_dataset_records,
+)
+
+_RECORDS = [{"id": str(i), "name": f"Card {i}"} for i in range(10)]
+
+
+def _ndjson_bytes() -> bytes:
+    return "\n".join(json.dumps(record) for record in _RECORDS).encode("utf-8")
+
+
+@pytest.mark.parametrize(
+    ("filename", "expected"),
+    [
+        ("cards.json", DatasetFormat(layout="json", compression="none")),
+        ("cards.JSON.GZ", DatasetFormat(layout="json", compression="gzip")),
+        ("cards.json.zst", DatasetFormat(layout="json", compression="zstd")),
+        ("cards.ndjson", DatasetFormat(layout="ndjson", compression="none")),
+        ("cards.jsonl.gz", DatasetFormat(layout="ndjson", compression="gzip")),
+    ],
+)
+def test_detect_dataset_format_from_suffix(
+    filename: str, expected: DatasetFormat
+) -> None:
+    assert detect_dataset_format(filename=filename) == expected
+
+
+def test_detect_dataset_format_from_content_type_and_encoding() -> None:
+    dataset_format = detect_dataset_format(
+        content_type="application/x-ndjson; charset=utf-8",
+        content_encoding="gzip",
+    )
+    assert dataset_format == DatasetFormat(layout="ndjson", compression="gzip")
+
+
+def test_detect_dataset_format_rejects_unknown_suffix() -> None:
+    with pytest.raises(ValueError, match="Unsupported dataset file"):
+        detect_dataset_format(filename="cards.csv")
+
+
+def test_iter_dataset_records_reads_gzip_json_array() -> None:
+    file_obj = io.BytesIO(gzip.compress(json.dumps(_RECORDS).encode("utf-8")))
+
+    records = iter_dataset_records(
+        file_obj,
+        dataset_format=DatasetFormat(layout="json", compression="gzip"),
+        read_size=16,
+    )
+    assert list(records) == _RECORDS
+
+
+def test_iter_dataset_records_reads_multi_member_gzip_ndjson() -> None:
+    payload = _ndjson_bytes()
+    midpoint = payload.index(b"\n", len(payload) // 2) + 1
+    file_obj = io.BytesIO(
+        gzip.compress(payload[:midpoint]) + gzip.compress(payload[midpoint:])
+    )
+
+    records = iter_dataset_records(
+        file_obj,
+        dataset_format=DatasetFormat(layout="ndjson", compression="gzip"),
+        read_size=8,
+    )
+    assert list(records) == _RECORDS
+
+
+def test_iter_dataset_records_reads_zstd_ndjson() -> None:
+    zstandard = pytest.importorskip("zstandard")
+    file_obj = io.BytesIO(zstandard.ZstdCompressor().compress(_ndjson_bytes()))
+
+    records = iter_dataset_records(
+        file_obj,
+        dataset_format=DatasetFormat(layout="ndjson", compression="zstd"),
+        read_size=8,
+    )
+    assert list(records) == _RECORDS
+
+
+def test_iter_dataset_records_reads_multi_frame_zstd() -> None:
+    zstandard = pytest.importorskip("zstandard")
+    compressor = zstandard.ZstdCompressor()
+    lines = _ndjson_bytes().splitlines(keepends=True)
+    # Concatenated frames, as written by pzstd
+    file_obj = io.BytesIO(b"".join(compressor.compress(line) for line in lines))
+
+    records = iter_dataset_records(
+        file_obj,
+        dataset_format=DatasetFormat(layout="ndjson", compression="zstd"),
+        read_size=8,
+    )
+    assert list(records) == _RECORDS
+
+
+def test_ndjson_decoder_reports_invalid_line() -> None:
+    decoder = DatasetRecordDecoder(DatasetFormat(layout="ndjson"))
+
+    with pytest.raises(ValueError, match="NDJSON line 2"):
+        list(decoder.feed(b'{"id": "a"}\n{"id": \n'))
@@ -0,0 +1,77 @@
+import asyncio
+import io
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core.hashing import CONTENT_HASH_FIELD, hash_record
+from app.data_pipeline.ingestion import json_records as pipeline
+from app.data_pipeline.ingestion.derived_fields import (
+    DERIVED_FIELD,
+    DerivedFieldStage,
+)
+
+_SPLIT_CARD = {
+    "id": "split",
+    "prices": {"usd": "0.25", "usd_foil": None, "eur": "bad"},
+    "legalities": {"modern": "legal", "standard": "not_legal", "legacy": "legal"},
+    "type_line": "Legendary Creature — Human Wizard // Sorcery",
+    "card_faces": [
+        {"mana_cost": "{1}{W/U}{U}", "oracle_text": "Flying", "power": "2"},
+        {"mana_cost": "{X}{G/P}{C}", "oracle_text": "Draw a card.", "power": "*"},
+    ],
+}
+
+
+def test_stage_computes_all_registered_fields() -> None:
+    derived = DerivedFieldStage().apply(dict(_SPLIT_CARD))[DERIVED_FIELD]
+
+    assert derived["mana_pips"] == {"W": 1, "U": 2, "B": 0, "R": 0, "G": 1, "C": 1}
+    assert derived["power_value"] == 2.0
+    assert derived["toughness_value"] is None
+    assert derived["price_usd"] == 0.25
+    assert derived["price_usd_foil"] is None
+    assert derived["price_eur"] is None
+    assert derived["legal_formats"] == ["legacy", "modern"]
+    assert derived["oracle_text_full"] == "Flying\n//\nDraw a card."
+    assert derived["types"] == ["Legendary", "Creature", "Sorcery"]
+    assert derived["subtypes"] == ["Human", "Wizard"]
+
+
+def test_stage_computes_selected_fields_only() -> None:
+    record = DerivedFieldStage(["price_usd"]).apply({"prices": {"usd": "1.5"}})
+
+    assert record[DERIVED_FIELD] == {"price_usd": 1.5}
+
+
+def test_stage_with_no_fields_leaves_record_untouched() -> None:
+    assert DerivedFieldStage([]).apply({"id": "a"}) == {"id": "a"}
+
+
+def test_stage_rejects_unknown_fields() -> None:
+    with pytest.raises(ValueError, match="Unknown derived fields: nope"):
+        DerivedFieldStage(["nope"])
+
+
+def test_ingestion_stores_derived_fields_in_content_hash() -> None:
+    collection = MagicMock()
+    collection.find.return_value = []
+    db = MagicMock()
+    db.get_collection.return_value = collection
+    pipeline._db_instance = db
+    try:
+        asyncio.run(
+            pipeline.run_pipeline_insert_json_dataset(
+                file_obj=io.BytesIO(json.dumps([_SPLIT_CARD]).encode("utf-8")),
+                collection="cards",
+                limit=None,
+                derived_fields=["price_usd"],
+            )
+        )
+    finally:
+        pipeline._db_instance = None
+
+    stored = collection.bulk_write.call_args.args[0][0]._doc["$set"]
+    assert stored[DERIVED_FIELD] == {"price_usd": 0.25}
+    assert stored[CONTENT_HASH_FIELD] == hash_record(stored)
@@ -0,0 +1,82 @@
+import gzip
+import json
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.data_pipeline.ingestion import json_records as pipeline
+from app.data_pipeline.ingestion.__main__ import run
+from app.data_pipeline.ingestion.byte_ranges import ByteRange, iter_mmap_chunks
+
+_RECORDS = [{"id": str(i), "name": f"Card {i}"} for i in range(5)]
+
+
+def test_iter_mmap_chunks_yields_views_over_the_file(tmp_path: Path) -> None:
+    path = tmp_path / "cards.ndjson"
+    path.write_bytes(b"0123456789")
+
+    chunks = [bytes(chunk) for chunk in iter_mmap_chunks(path, read_size=4)]
+    ranged = [
+        bytes(chunk)
+        for chunk in iter_mmap_chunks(path, ByteRange(start=3, end=8), read_size=4)
+    ]
+
+    assert chunks == [b"0123", b"4567", b"89"]
+    assert ranged == [b"3456", b"7"]
+
+
+def test_iter_mmap_chunks_handles_empty_files(tmp_path: Path) -> None:
+    path = tmp_path / "cards.ndjson"
+    path.write_bytes(b"")
+
+    assert list(iter_mmap_chunks(path)) == []
+
+
+def test_cli_ingests_local_compressed_file_in_batches(tmp_path: Path) -> None:
+    path = tmp_path / "cards.jsonl.gz"
+    path.write_bytes(
+        gzip.compress("\n".join(json.dumps(r) for r in _RECORDS).encode("utf-8"))
+    )
+    collection = MagicMock()
+    collection.find.return_value = []
+    db = MagicMock()
+    db.get_collection.return_value = collection
+    pipeline._db_instance = db
+    try:
+        result = run(
+            [
+                str(path),
+                "--collection",
+                "local_cards",
+                "--limit",
+                "4",
+                "--batch-size",
+                "3",
+                "--no-derive-fields",
+            ]
+        )
+    finally:
+        pipeline._db_instance = None
+
+    assert result.inserted == 4
+    db.get_collection.assert_called_with("local_cards")
+    batch_sizes = [len(call.args[0]) for call in collection.bulk_write.call_args_list]
+    assert batch_sizes == [3, 1]
+    assert "derived" not in collection.bulk_write.call_args.args[0][0]._doc["$set"]
+
+
+def test_cli_rejects_unsupported_files(tmp_path: Path) -> None:
+    path = tmp_path / "cards.csv"
+    path.write_text("id,name")
+
+    with pytest.raises(SystemExit):
+        run([str(path)])
+
+
+def test_cli_rejects_parallel_compressed_files(tmp_path: Path) -> None:
+    path = tmp_path / "cards.ndjson.gz"
+    path.write_bytes(gzip.compress(b"{}"))
+
+    with pytest.raises(SystemExit):
+        run([str(path), "--parallel"])
@@ -0,0 +1,223 @@
+import asyncio
+import io
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.hashing import CONTENT_HASH_FIELD, hash_record
+from app.data_pipeline.ingestion import json_records as pipeline
+
+
+def _run(records: list[dict], collection: MagicMock):
+    db = MagicMock()
+    db.get_collection.return_value = collection
+    pipeline._db_instance = db
+    try:
+        return asyncio.run(
+            pipeline.run_pipeline_insert_json_dataset(
+                file_obj=io.BytesIO(json.dumps(records).encode("utf-8")),
+                collection="cards",
+                limit=None,
+                derived_fields=[],
+            )
+        )
+    finally:
+        pipeline._db_instance = None
+
+
+def test_hash_record_ignores_key_order_and_stored_hash() -> None:
+    first = {"id": "a", "prices": {"usd": "1.00", "eur": None}}
+    second = {"prices": {"eur": None, "usd": "1.00"}, "id": "a"}
+    second[CONTENT_HASH_FIELD] = "stale"
+
+    assert hash_record(first) == hash_record(second)
+
+
+def test_ingestion_writes_only_new_and_changed_records() -> None:
+    unchanged = {"id": "same", "prices": {"usd": "1.00"}}
+    changed = {"id": "changed", "prices": {"usd": "2.00"}}
+    new = {"id": "new", "prices": {"usd": "3.00"}}
+
+    collection = MagicMock()
+    collection.find.return_value = [
+        {"id": "same", CONTENT_HASH_FIELD: hash_record(unchanged)},
+        {"id": "changed", CONTENT_HASH_FIELD: "outdated"},
+    ]
+
+    result = _run([unchanged, changed, new], collection)
+
+    assert (result.inserted, result.updated, result.unchanged) == (1, 1, 1)
+
+    operations = collection.bulk_write.call_args.args[0]
+    assert all(isinstance(operation, UpdateOne) for operation in operations)
+    assert sorted(operation._filter["id"] for operation in operations) == [
+        "changed",
+        "new",
+    ]
+
+
+def test_ingestion_skips_bulk_write_when_nothing_changed() -> None:
+    record = {"id": "same", "name": "Card"}
+    collection = MagicMock()
+    collection.find.return_value = [
+        {"id": "same", CONTENT_HASH_FIELD: hash_record(record)}
+    ]
+
+    result = _run([record], collection)
+
+    assert result.unchanged == 1
+    collection.bulk_write.assert_not_called()
+
+
+def test_bulk_load_inserts_into_staging_and_swaps_collection() -> None:
+    records = [{"id": "a"}, {"id": "b"}]
+    inserted: list[dict] = []
+    db = MagicMock()
+    staging = db.get_collection.return_value
+    staging.with_options.return_value.insert_many.side_effect = (
+        lambda batch, **_kwargs: inserted.extend(batch)
+    )
+    pipeline._db_instance = db
+    try:
+        result = asyncio.run(
+            pipeline.run_pipeline_insert_json_dataset(
+                file_obj=io.BytesIO(json.dumps(records).encode("utf-8")),
+                collection="cards",
+                limit=None,
+                mode="bulk_load",
+            )
+        )
+    finally:
+        pipeline._db_instance = None
+
+    assert result.inserted == 2
+    db.db.drop_collection.assert_called_once_with("cards__staging")
+    db.get_collection.assert_any_call("cards__staging")
+    assert [record["id"] for record in inserted] == ["a", "b"]
+    assert all(CONTENT_HASH_FIELD in record for record in inserted)
+    db.create_record_indexes.assert_called_once_with(collection="cards__staging")
+    staging.rename.assert_called_once_with("cards", dropTarget=True)
+
+
+def test_bulk_load_drops_staging_collection_on_failure() -> None:
+    db = MagicMock()
+    db.get_collection.return_value.with_options.return_value.insert_many.side_effect = (
+        RuntimeError("boom")
+    )
+    pipeline._db_instance = db
+    try:
+        try:
+            asyncio.run(
+                pipeline.run_pipeline_insert_json_dataset(
+                    file_obj=io.BytesIO(b'[{"id": "a"}]'),
+                    collection="cards",
+                    limit=None,
+                    mode="bulk_load",
+                )
+            )
+        except RuntimeError:
+            pass
+    finally:
+        pipeline._db_instance = None
+
+    assert db.db.drop_collection.call_count == 2
+    db.get_collection.return_value.rename.assert_not_called()
+
+
+def test_upsert_ensures_indexes_and_keys_keyless_records_by_hash() -> None:
+    keyless = {"name": "Token"}
+    collection = MagicMock()
+    collection.find.return_value = []
+    db = MagicMock()
+    db.get_collection.return_value = collection
+    pipeline._db_instance = db
+    try:
+        result = asyncio.run(
+            pipeline.run_pipeline_insert_json_dataset(
+                file_obj=io.BytesIO(json.dumps([keyless]).encode("utf-8")),
+                collection="cards",
+                limit=None,
+                derived_fields=[],
+            )
+        )
+    finally:
+        pipeline._db_instance = None
+
+    db.create_record_indexes.assert_called_once_with(collection="cards")
+    assert result.inserted == 1
+    operation = collection.bulk_write.call_args.args[0][0]
+    assert operation._filter == {"id": hash_record(keyless)}
+
+
+def test_ingestion_counts_duplicate_ids_within_a_batch() -> None:
+    collection = MagicMock()
+    collection.find.return_value = []
+
+    result = _run(
+        [{"id": "a", "name": "Old"}, {"id": "b"}, {"id": "a", "name": "New"}],
+        collection,
+    )
+
+    assert (result.inserted, result.duplicates) == (2, 1)
+    operations = collection.bulk_write.call_args.args[0]
+    # The last record with an id wins
+    assert operations[0]._doc["$set"]["name"] == "New"
+
+
+def test_upsert_record_batch_returns_the_changed_ids() -> None:
+    unchanged = {"id": "same"}
+    collection = MagicMock()
+    collection.find.return_value = [
+        {"id": "same", CONTENT_HASH_FIELD: hash_record(unchanged)}
+    ]
+    db = MagicMock()
+    db.get_collection.return_value = collection
+    pipeline._db_instance = db
+    try:
+        result, changed_ids = pipeline.upsert_record_batch(
+            records=[unchanged, {"id": "new"}], collection="cards"
+        )
+    finally:
+        pipeline._db_instance = None
+
+    assert (result.inserted, result.unchanged) == (1, 1)
+    assert changed_ids == ["new"]
+
+
+def test_upsert_counts_records_inserted_concurrently_as_duplicates() -> None:
+    collection = MagicMock()
+    collection.find.return_value = []
+    collection.bulk_write.side_effect = BulkWriteError(
+        {"writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000"}]}
+    )
+    db = MagicMock()
+    db.get_collection.return_value = collection
+    pipeline._db_instance = db
+    try:
+        result, changed_ids = pipeline.upsert_record_batch(
+            records=[{"id": "raced"}, {"id": "new"}], collection="cards"
+        )
+    finally:
+        pipeline._db_instance = None
+
+    assert (result.inserted, result.duplicates) == (1, 1)
+    assert changed_ids == ["new"]
+
+
+def test_upsert_reraises_other_write_errors() -> None:
+    collection = MagicMock()
+    collection.find.return_value = []
+    collection.bulk_write.side_effect = BulkWriteError(
+        {"writeErrors": [{"index": 0, "code": 121, "errmsg": "invalid"}]}
+    )
+    db = MagicMock()
+    db.get_collection.return_value = collection
+    pipeline._db_instance = db
+    try:
+        with pytest.raises(BulkWriteError):
+            pipeline.upsert_record_batch(records=[{"id": "a"}], collection="cards")
+    finally:
+        pipeline._db_instance = None
@@ -0,0 +1,45 @@
+import io
+import json
+
+import pytest
+
+from app.data_pipeline.ingestion.json_stream import (
+    JsonArrayStreamParser,
+    iter_json_array_records,
+)
+
+
+def test_iter_json_array_records_yields_records_across_small_reads() -> None:
+    records = [
+        {"id": str(i), "name": f"Card ñ {i}", "nested": {"v": [i]}} for i in range(25)
+    ]
+    file_obj = io.BytesIO(json.dumps(records, indent=2).encode("utf-8"))
+
+    assert list(iter_json_array_records(file_obj, read_size=7)) == records
+
+
+def test_iter_json_array_records_handles_empty_array() -> None:
+    assert list(iter_json_array_records(io.BytesIO(b" [ ] "))) == []
+
+
+def test_parser_yields_records_before_array_is_complete() -> None:
+    parser = JsonArrayStreamParser()
+
+    assert list(parser.feed(b'[{"id": "a"}, {"id"')) == [{"id": "a"}]
+    assert list(parser.feed(b': "b"}]')) == [{"id": "b"}]
+    assert list(parser.close()) == []
+
+
+def test_parser_rejects_non_array_dataset() -> None:
+    with pytest.raises(ValueError, match="Expected record list"):
+        list(iter_json_array_records(io.BytesIO(b'{"id": "a"}')))
+
+
+def test_parser_rejects_unterminated_array() -> None:
+    with pytest.raises(ValueError):
+        list(iter_json_array_records(io.BytesIO(b'[{"id": "a"}, {"id": ')))
+
+
+def test_parser_rejects_non_object_records() -> None:
+    with pytest.raises(ValueError, match="Expected JSON object record"):
+        list(iter_json_array_records(io.BytesIO(b'[{"id": "a"}, 1]')))
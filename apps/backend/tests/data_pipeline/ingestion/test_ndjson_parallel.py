@@ -0,0 +1,98 @@
+import json
+from itertools import pairwise
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from app.data_pipeline.ingestion import json_records as pipeline
+from app.data_pipeline.ingestion.byte_ranges import (
+    iter_range_chunks,
+    split_line_ranges,
+)
+from app.data_pipeline.ingestion.json_stream import NdjsonStreamParser
+
+
+class _DummyPool:
+    processes: int | None = None
+
+    def __init__(self, *, processes: int, initializer=None) -> None:
+        self.__class__.processes = processes
+        if initializer is not None:
+            initializer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def imap_unordered(self, func, items):
+        return (func(item) for item in items)
+
+
+def _write_ndjson(path: Path, count: int) -> list[dict]:
+    records = [{"id": f"card-{i}", "text": "x" * (i % 17)} for i in range(count)]
+    path.write_text("\n".join(json.dumps(record) for record in records) + "\n")
+    return records
+
+
+def test_split_line_ranges_cover_file_on_line_boundaries(tmp_path: Path) -> None:
+    path = tmp_path / "cards.ndjson"
+    records = _write_ndjson(path, 200)
+
+    byte_ranges = split_line_ranges(path, parts=7, min_range_bytes=1)
+
+    assert len(byte_ranges) > 1
+    assert byte_ranges[0].start == 0
+    assert byte_ranges[-1].end == path.stat().st_size
+    parsed: list[dict] = []
+    for previous, current in pairwise(byte_ranges):
+        assert previous.end == current.start
+    for byte_range in byte_ranges:
+        parser = NdjsonStreamParser()
+        for chunk in iter_range_chunks(path, byte_range, read_size=5):
+            parsed.extend(parser.feed(chunk))
+        parsed.extend(parser.close())
+    assert parsed == records
+
+
+def test_split_line_ranges_keeps_small_files_in_one_range(tmp_path: Path) -> None:
+    path = tmp_path / "cards.ndjson"
+    _write_ndjson(path, 10)
+
+    byte_ranges = split_line_ranges(path, parts=8)
+
+    assert len(byte_ranges) == 1
+
+
+def test_run_pipeline_insert_ndjson_parallel_merges_worker_results(
+    monkeypatch, tmp_path: Path
+) -> None:
+    path = tmp_path / "cards.ndjson"
+    _write_ndjson(path, 50)
+    collection = MagicMock()
+    collection.find.return_value = []
+    db = MagicMock()
+    db.get_collection.return_value = collection
+
+    monkeypatch.setattr(pipeline, "_pool_context", SimpleNamespace(Pool=_DummyPool))
+    monkeypatch.setattr(pipeline, "_get_db", lambda: db)
+    monkeypatch.setattr(
+        pipeline,
+        "split_line_ranges",
+        lambda p, *, parts: split_line_ranges(p, parts=parts, min_range_bytes=1),
+    )
+
+    result = pipeline.run_pipeline_insert_ndjson_parallel(
+        path=path, collection="cards", processes=2
+    )
+
+    assert _DummyPool.processes == 2
+    assert result.inserted == 50
+    assert result.duplicates == 0
+    db.create_record_indexes.assert_called_once_with(collection="cards")
+    assert collection.bulk_write.call_count == 8
+
+
+def test_parallel_ingestion_spawns_workers_instead_of_forking() -> None:
+    assert pipeline._pool_context.get_start_method() == "spawn"
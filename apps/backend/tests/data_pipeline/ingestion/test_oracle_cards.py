@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.data_pipeline.ingestion import oracle_cards as pipeline
+
+
+def test_build_oracle_cards_merges_by_oracle_id_and_prunes_stale_cards() -> None:
+    db = MagicMock()
+    source = MagicMock()
+    target = MagicMock()
+    locks = MagicMock()
+    collections = {"cards": source, "oracle_card_build_locks": locks}
+    db.get_collection.side_effect = lambda name: collections.get(name, target)
+    target.delete_many.return_value.deleted_count = 2
+    target.count_documents.return_value = 3
+    pipeline._db_instance = db
+    try:
+        result = pipeline.run_pipeline_build_oracle_cards(
+            source_collection="cards", target_collection="oracle_cards"
+        )
+    finally:
+        pipeline._db_instance = None
+
+    assert (result.oracle_cards, result.removed) == (3, 2)
+    db.create_oracle_card_indexes.assert_called_once_with(collection="oracle_cards")
+
+    stages = source.aggregate.call_args.args[0]
+    assert source.aggregate.call_args.kwargs == {"allowDiskUse": True}
+    assert stages[-1]["$merge"] == {
+        "into": "oracle_cards",
+        "on": "oracle_id",
+        "whenMatched": "replace",
+        "whenNotMatched": "insert",
+    }
+    assert "_id" in stages[-2]["$unset"]
+
+    oracle_fields = stages[-3]["$replaceRoot"]["newRoot"]["$mergeObjects"][1]
+    assert oracle_fields["chunk_source_id"] == {"$toString": "$canonical._id"}
+    build_id = oracle_fields["oracle_build_id"]
+    target.delete_many.assert_called_once_with({"oracle_build_id": {"$ne": build_id}})
+    target.count_documents.assert_called_once_with({"oracle_build_id": build_id})
+    locks.delete_one.assert_called_once_with(
+        {"_id": "oracle_cards", "oracle_build_id": build_id}
+    )
+
+
+def test_build_oracle_cards_refuses_to_run_next_to_another_build() -> None:
+    db = MagicMock()
+    db.get_collection.return_value.update_one.side_effect = DuplicateKeyError("dup")
+    pipeline._db_instance = db
+    try:
+        with pytest.raises(pipeline.OracleBuildInProgressError):
+            pipeline.run_pipeline_build_oracle_cards(
+                source_collection="cards", target_collection="oracle_cards"
+            )
+    finally:
+        pipeline._db_instance = None
+
+    db.get_collection.return_value.aggregate.assert_not_called()
+    db.get_collection.return_value.delete_many.assert_not_called()
@@ -0,0 +1,97 @@
+import copy
+from typing import Any
+
+import pytest
+from pydantic import ValidationError
+
+from app.data_pipeline.ingestion.derived_fields import DerivedFieldStage
+from app.data_pipeline.ingestion.record_rules import RecordRuleSet
+from app.models.ingestion import RecordFilter, RecordRules
+
+_CARD: dict[str, Any] = {
+    "id": "1",
+    "name": "Lightning Bolt",
+    "lang": "en",
+    "digital": False,
+    "games": ["paper", "mtgo"],
+    "prices": {"usd": "1.00", "eur": "0.90"},
+    "related_uris": {"gatherer": "https://example.com"},
+}
+
+
+def _apply(rules: RecordRules) -> dict | None:
+    return RecordRuleSet(rules).apply(copy.deepcopy(_CARD))
+
+
+def test_filters_keep_matching_records() -> None:
+    rules = RecordRules(
+        filters=[
+            RecordFilter(field="lang", op="eq", value="en"),
+            RecordFilter(field="digital", op="eq", value=False),
+            RecordFilter(field="games", op="contains", value="paper"),
+            RecordFilter(field="prices.usd", op="exists", value=True),
+        ]
+    )
+
+    assert _apply(rules) is not None
+
+
+def test_filters_drop_non_matching_records() -> None:
+    assert _apply(RecordRules(filters=[RecordFilter(field="lang", value="ja")])) is None
+    assert (
+        _apply(
+            RecordRules(
+                filters=[RecordFilter(field="games", op="not_contains", value="mtgo")]
+            )
+        )
+        is None
+    )
+    assert (
+        _apply(RecordRules(filters=[RecordFilter(field="set", op="in", value=["lea"])]))
+        is None
+    )
+
+
+def test_exists_filter_defaults_to_requiring_the_field() -> None:
+    assert _apply(RecordRules(filters=[RecordFilter(field="lang", op="exists")]))
+    assert _apply(RecordRules(filters=[RecordFilter(field="set", op="exists")])) is None
+
+
+@pytest.mark.parametrize(
+    ("op", "value"), [("exists", "yes"), ("in", "lea"), ("not_in", None)]
+)
+def test_filters_reject_values_of_the_wrong_type(op: str, value: Any) -> None:
+    with pytest.raises(ValidationError):
+        RecordFilter.model_validate({"field": "set", "op": op, "value": value})
+
+
+def test_include_fields_projects_nested_paths_and_keeps_id() -> None:
+    record = _apply(RecordRules(include_fields=["name", "prices.usd"]))
+
+    assert record == {"id": "1", "name": "Lightning Bolt", "prices": {"usd": "1.00"}}
+
+
+def test_exclude_fields_removes_nested_paths() -> None:
+    record = _apply(RecordRules(exclude_fields=["related_uris", "prices.eur", "id"]))
+
+    assert record is not None
+    assert "related_uris" not in record
+    assert record["prices"] == {"usd": "1.00"}
+    assert record["id"] == "1"
+
+
+def test_derived_fields_read_fields_left_out_by_the_projection() -> None:
+    rule_set = RecordRuleSet(RecordRules(include_fields=["name"]))
+    stage = DerivedFieldStage(["price_usd", "price_eur"])
+
+    record = rule_set.project(stage.apply(copy.deepcopy(_CARD)))
+    excluded = RecordRuleSet(
+        RecordRules(include_fields=["name"], exclude_fields=["derived.price_eur"])
+    ).project(stage.apply(copy.deepcopy(_CARD)))
+
+    assert record == {
+        "id": "1",
+        "name": "Lightning Bolt",
+        "derived": {"price_usd": 1.0, "price_eur": 0.9},
+    }
+    assert excluded["derived"] == {"price_usd": 1.0}
@@ -0,0 +1,288 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import OperationFailure
+
+from app.data_pipeline import live_sync
+from app.data_pipeline.embeddings import create_chunks, generate_from_chunks
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = MagicMock()
+    monkeypatch.setattr(live_sync, "_db_instance", db)
+    monkeypatch.setattr(live_sync, "ScryfallCardRecord", MagicMock())
+    return db
+
+
+def _sync(es=None) -> live_sync.LiveSync:
+    return live_sync.LiveSync(
+        collection="cards",
+        target_collection="chunks",
+        chunk_templates={"name": "{name}"},
+        es=es,
+        batch_size=10,
+    )
+
+
+def test_apply_rerenders_upserts_and_deletes_removed_cards(monkeypatch, db) -> None:
+    kept_id, deleted_id, recreated_id = ObjectId(), ObjectId(), ObjectId()
+    written: list = []
+    embedded: list = []
+
+    def write_chunks(chunks, *, target_collection, incremental):
+        written.extend(chunks)
+        # Only the first card's summary changed
+        return chunks[:1]
+
+    def process_batch(chunks, *, target_collection):
+        embedded.extend(chunks)
+        return len(chunks)
+
+    monkeypatch.setattr(create_chunks, "write_chunks", write_chunks)
+    monkeypatch.setattr(generate_from_chunks, "process_batch", process_batch)
+    index_cards = AsyncMock(return_value=(2, 0))
+    monkeypatch.setattr(live_sync, "index_cards", index_cards)
+    es = MagicMock(delete_by_query=AsyncMock())
+
+    asyncio.run(
+        _sync(es).apply(
+            [
+                {
+                    "operationType": "insert",
+                    "documentKey": {"_id": kept_id},
+                    "fullDocument": {"_id": kept_id, "name": "Opt"},
+                },
+                {
+                    "operationType": "update",
+                    "documentKey": {"_id": kept_id},
+                    "fullDocument": {"_id": kept_id, "name": "Opt v2"},
+                },
+                {"operationType": "delete", "documentKey": {"_id": recreated_id}},
+                {
+                    "operationType": "replace",
+                    "documentKey": {"_id": recreated_id},
+                    "fullDocument": {"_id": recreated_id, "name": "Ponder"},
+                },
+                # Looked up after the card was deleted: no document
+                {
+                    "operationType": "update",
+                    "documentKey": {"_id": deleted_id},
+                    "fullDocument": None,
+                },
+            ]
+        )
+    )
+
+    assert [chunk.summary for chunk in written] == ["Opt v2", "Ponder"]
+    assert len(embedded) == 1
+    index_cards.assert_awaited_once()
+    db.get_collection.return_value.delete_many.assert_called_once_with(
+        {"source_id": {"$in": [str(deleted_id)]}}
+    )
+    assert es.delete_by_query.call_args.kwargs["query"] == {
+        "terms": {"mongo_id": [str(deleted_id)]}
+    }
+
+
+def test_run_resumes_from_and_stores_the_resume_token(monkeypatch, db) -> None:
+    stop = asyncio.Event()
+    sync = _sync()
+    state = db.get_collection.return_value
+    state.find_one.return_value = {"resume_token": {"_data": "old"}}
+    stream = MagicMock(alive=True, resume_token={"_data": "new"})
+    stream.__enter__.return_value = stream
+    stream.try_next.side_effect = [
+        {"operationType": "delete", "documentKey": {"_id": ObjectId()}},
+        None,
+    ]
+    state.watch.return_value = stream
+
+    async def apply(events) -> None:
+        stop.set()
+
+    monkeypatch.setattr(sync, "apply", apply)
+
+    asyncio.run(sync.run(stop))
+
+    assert state.watch.call_args.kwargs["resume_after"] == {"_data": "old"}
+    assert state.watch.call_args.kwargs["start_after"] is None
+    state.update_one.assert_called_once_with(
+        {"_id": "live_sync:cards:chunks"},
+        {"$set": {"resume_token": {"_data": "new"}, "invalidated": False}},
+        upsert=True,
+    )
+
+
+def test_run_starts_after_an_invalidated_stream(monkeypatch, db) -> None:
+    stop = asyncio.Event()
+    sync = _sync()
+    state = db.get_collection.return_value
+    state.find_one.return_value = None
+    stream = MagicMock(alive=True, resume_token={"_data": "new"})
+    stream.__enter__.return_value = stream
+    card_id = ObjectId()
+    stream.try_next.side_effect = [
+        {"operationType": "delete", "documentKey": {"_id": card_id}},
+        {"_id": {"_data": "rename"}, "operationType": "rename"},
+        {"_id": {"_data": "invalidate"}, "operationType": "invalidate"},
+    ]
+    reopened = MagicMock(alive=True, resume_token={"_data": "after"})
+    reopened.__enter__.return_value = reopened
+    reopened.try_next.return_value = None
+    state.watch.side_effect = [stream, reopened]
+    applied: list = []
+
+    async def apply(events) -> None:
+        applied.append(events)
+
+    def save_resume_token(resume_token, **kwargs) -> None:
+        state.find_one.return_value = {"resume_token": resume_token, **kwargs}
+        if resume_token == {"_data": "after"}:
+            stop.set()
+
+    monkeypatch.setattr(sync, "apply", apply)
+    monkeypatch.setattr(sync, "save_resume_token", save_resume_token)
+
+    asyncio.run(sync.run(stop))
+
+    assert [len(events) for events in applied] == [3]
+    reopened_with = state.watch.call_args.kwargs
+    assert reopened_with["start_after"] == {"_data": "invalidate"}
+    assert reopened_with["resume_after"] is None
+
+
+def test_run_restarts_from_now_when_the_resume_token_expired(monkeypatch, db) -> None:
+    stop = asyncio.Event()
+    sync = _sync()
+    state = db.get_collection.return_value
+    state.find_one.return_value = {"resume_token": {"_data": "expired"}}
+
+    def watch(*_args, **_kwargs):
+        stop.set()
+        raise OperationFailure("history lost", code=286)
+
+    state.watch.side_effect = watch
+
+    asyncio.run(sync.run(stop))
+
+    state.delete_one.assert_called_once_with({"_id": "live_sync:cards:chunks"})
+
+
+def test_apply_skips_cards_that_fail_validation(monkeypatch, db) -> None:
+    def model_validate(card):
+        if card["name"] == "Broken":
+            raise ValidationError.from_exception_data("ScryfallCardRecord", [])
+        return card
+
+    monkeypatch.setattr(
+        live_sync, "ScryfallCardRecord", MagicMock(model_validate=model_validate)
+    )
+    monkeypatch.setattr(create_chunks, "write_chunks", lambda chunks, **_kwargs: [])
+    index_cards = AsyncMock(return_value=(1, 0))
+    monkeypatch.setattr(live_sync, "index_cards", index_cards)
+    card_ids = [ObjectId(), ObjectId()]
+
+    asyncio.run(
+        _sync(MagicMock()).apply(
+            [
+                {
+                    "operationType": "insert",
+                    "documentKey": {"_id": card_id},
+                    "fullDocument": {"_id": card_id, "name": name},
+                }
+                for card_id, name in zip(card_ids, ["Opt", "Broken"], strict=True)
+            ]
+        )
+    )
+
+    (indexed,) = index_cards.await_args_list
+    assert [card["name"] for card in indexed.args[0]] == ["Opt"]
+
+
+def test_run_retries_a_batch_that_failed_to_apply(monkeypatch, db) -> None:
+    stop = asyncio.Event()
+    sync = _sync()
+    state = db.get_collection.return_value
+    state.find_one.return_value = None
+    stream = MagicMock(alive=True, resume_token={"_data": "new"})
+    stream.__enter__.return_value = stream
+    stream.try_next.return_value = {
+        "operationType": "delete",
+        "documentKey": {"_id": ObjectId()},
+    }
+    state.watch.return_value = stream
+    attempts: list = []
+
+    async def apply(events) -> None:
+        attempts.append(events)
+        if len(attempts) == 1:
+            raise RuntimeError("Elasticsearch unavailable")
+        stop.set()
+
+    monkeypatch.setattr(sync, "apply", apply)
+    monkeypatch.setattr(live_sync, "_RETRY_DELAY_SECONDS", 0)
+
+    asyncio.run(sync.run(stop))
+
+    assert len(attempts) == 2
+    assert state.watch.call_count == 2
+    # The failed batch was not acknowledged
+    state.update_one.assert_called_once()
+
+
+def test_run_skips_changes_that_keep_failing(monkeypatch, db) -> None:
+    stop = asyncio.Event()
+    sync = _sync()
+    state = db.get_collection.return_value
+    state.find_one.return_value = None
+    poisoned_id, card_id = ObjectId(), ObjectId()
+    events = [
+        {"operationType": "delete", "documentKey": {"_id": poisoned_id}},
+        {"operationType": "delete", "documentKey": {"_id": card_id}},
+    ]
+    stream = MagicMock(alive=True, resume_token={"_data": "new"})
+    stream.__enter__.return_value = stream
+
+    def watch(*_args, **_kwargs):
+        # Every reopened stream replays the batch after the stored token
+        stream.try_next.side_effect = [*events, None]
+        return stream
+
+    state.watch.side_effect = watch
+    applied: list = []
+
+    async def apply(batch) -> None:
+        if any(event["documentKey"]["_id"] == poisoned_id for event in batch):
+            raise RuntimeError("unindexable card")
+        applied.append(batch)
+        stop.set()
+
+    monkeypatch.setattr(sync, "apply", apply)
+    monkeypatch.setattr(live_sync, "_RETRY_DELAY_SECONDS", 0)
+
+    asyncio.run(sync.run(stop))
+
+    assert state.watch.call_count == live_sync._MAX_BATCH_ATTEMPTS
+    assert applied == [events[1:]]
+    state.update_one.assert_any_call(
+        {"_id": "live_sync:cards:chunks"},
+        {"$addToSet": {"skipped_card_ids": {"$each": [poisoned_id]}}},
+        upsert=True,
+    )
+    # The token moved past the skipped change
+    state.update_one.assert_called_with(
+        {"_id": "live_sync:cards:chunks"},
+        {"$set": {"resume_token": {"_data": "new"}, "invalidated": False}},
+        upsert=True,
+    )
+
+
+def test_live_sync_requires_a_chunk_template() -> None:
+    with pytest.raises(ValueError):
+        live_sync.LiveSync(
+            collection="cards", target_collection="chunks", chunk_templates={}, es=None
+        )
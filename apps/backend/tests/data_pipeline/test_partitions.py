@@ -0,0 +1,52 @@
+from unittest.mock import MagicMock
+
+from app.data_pipeline.partitions import (
+    IdRange,
+    iter_id_range_batches,
+    split_id_ranges,
+)
+
+
+def test_split_id_ranges_uses_bucket_boundaries_with_open_ends() -> None:
+    collection = MagicMock()
+    collection.aggregate.return_value = [
+        {"_id": {"min": 1, "max": 4}, "count": 4},
+        {"_id": {"min": 5, "max": 8}, "count": 4},
+        {"_id": {"min": 9, "max": 9}, "count": 1},
+    ]
+
+    id_ranges = split_id_ranges(collection, parts=3, query={"lang": "en"})
+
+    assert id_ranges == [IdRange(end=5), IdRange(start=5, end=9), IdRange(start=9)]
+    stages = collection.aggregate.call_args.args[0]
+    assert stages[0] == {"$match": {"lang": "en"}}
+    assert stages[-1] == {"$bucketAuto": {"groupBy": "$_id", "buckets": 3}}
+
+
+def test_split_id_ranges_skips_aggregation_for_a_single_part() -> None:
+    collection = MagicMock()
+
+    assert split_id_ranges(collection, parts=1) == [IdRange()]
+    collection.aggregate.assert_not_called()
+
+
+def test_id_range_query_combines_bounds_with_filter() -> None:
+    assert IdRange().to_query() == {}
+    assert IdRange(start=5).to_query() == {"_id": {"$gte": 5}}
+    assert IdRange(start=1, end=5).to_query({"lang": "en"}) == {
+        "$and": [{"lang": "en"}, {"_id": {"$gte": 1, "$lt": 5}}]
+    }
+
+
+def test_iter_id_range_batches_reads_range_with_projection() -> None:
+    collection = MagicMock()
+    collection.find.return_value = [{"_id": i} for i in range(5)]
+
+    batches = list(
+        iter_id_range_batches(
+            collection, IdRange(end=9), batch_size=2, projection={"name": 1}
+        )
+    )
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    collection.find.assert_called_once_with({"_id": {"$lt": 9}}, {"name": 1})
@@ -0,0 +1,189 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+from pydantic import ValidationError
+
+from app.core.config import RefreshSettings
+from app.data_pipeline import refresh
+from app.data_pipeline.embeddings import create_chunks, generate_from_chunks
+from app.data_pipeline.ingestion import json_records
+from app.models.ingestion import IngestionResult, RecordFilter, RecordRules
+
+CONCURRENCY = RefreshSettings(
+    ingest_workers=2, chunk_workers=2, embed_workers=2, index_workers=2, queue_size=1
+)
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    stored: dict[str, dict] = {}
+    written_chunks: list = []
+    embedded: list = []
+
+    def upsert_record_batch(*, records, collection):
+        changed_ids = []
+        for record in records:
+            if record["name"] != "Unchanged":
+                stored[record["id"]] = {"_id": ObjectId(), **record}
+                changed_ids.append(record["id"])
+        return (
+            IngestionResult(
+                updated=len(changed_ids), unchanged=len(records) - len(changed_ids)
+            ),
+            changed_ids,
+        )
+
+    def write_chunks(chunks, *, target_collection, incremental):
+        assert incremental is True
+        written_chunks.extend(chunks)
+        return chunks
+
+    db = MagicMock()
+    db.get_collection.return_value.find.side_effect = lambda query: [
+        stored[record_id] for record_id in query["id"]["$in"]
+    ]
+    monkeypatch.setattr(refresh, "_db_instance", db)
+    monkeypatch.setattr(json_records, "upsert_record_batch", upsert_record_batch)
+    monkeypatch.setattr(create_chunks, "write_chunks", write_chunks)
+
+    def process_batch(
+        chunks, *, target_collection, normalize_embeddings, summary_cache
+    ):
+        embedded.extend(chunks)
+        return len(chunks)
+
+    monkeypatch.setattr(generate_from_chunks, "process_batch", process_batch)
+    monkeypatch.setattr(refresh, "ScryfallCardRecord", MagicMock())
+    return written_chunks, embedded
+
+
+def _records() -> list[dict]:
+    return [
+        {"id": "1", "name": "Opt", "lang": "en"},
+        {"id": "2", "name": "Unchanged", "lang": "en"},
+        {"id": "3", "name": "Ponder", "lang": "en"},
+        {"id": "4", "name": "Preordain", "lang": "ja"},
+        {"id": "5", "name": "Brainstorm", "lang": "en"},
+    ]
+
+
+def test_refresh_streams_changed_records_through_every_stage(
+    monkeypatch, stages
+) -> None:
+    written_chunks, embedded = stages
+    index_cards = AsyncMock(side_effect=lambda cards, _es: (len(cards), 0))
+    monkeypatch.setattr(refresh, "index_cards", index_cards)
+
+    result = asyncio.run(
+        refresh.run_pipeline_refresh(
+            iter(_records()),
+            collection="cards",
+            target_collection="chunks",
+            chunk_templates={"name": "{name}", "lang": "{lang}"},
+            es=MagicMock(),
+            rules=RecordRules(filters=[RecordFilter(field="lang", value="en")]),
+            derived_fields=[],
+            batch_size=2,
+            concurrency=CONCURRENCY,
+        )
+    )
+
+    assert (result.ingestion.updated, result.ingestion.unchanged) == (3, 1)
+    assert result.ingestion.filtered == 1
+    assert sorted((chunk.chunk_name, chunk.summary) for chunk in written_chunks) == [
+        ("lang", "en"),
+        ("lang", "en"),
+        ("lang", "en"),
+        ("name", "Brainstorm"),
+        ("name", "Opt"),
+        ("name", "Ponder"),
+    ]
+    assert result.chunks_embedded == len(embedded) == 6
+    assert result.indexed == 3
+    assert index_cards.await_count == 2
+
+
+def test_refresh_skips_indexing_without_elasticsearch(monkeypatch, stages) -> None:
+    index_cards = AsyncMock()
+    monkeypatch.setattr(refresh, "index_cards", index_cards)
+
+    result = asyncio.run(
+        refresh.run_pipeline_refresh(
+            iter(_records()),
+            collection="cards",
+            target_collection="chunks",
+            chunk_templates={None: "{name}"},
+            es=None,
+            limit=2,
+            derived_fields=[],
+            concurrency=CONCURRENCY,
+        )
+    )
+
+    assert result.chunks_embedded == 1
+    index_cards.assert_not_awaited()
+
+
+def test_refresh_surfaces_stage_errors(monkeypatch, stages) -> None:
+    def fail(chunks, *, target_collection, incremental):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(create_chunks, "write_chunks", fail)
+
+    with pytest.raises(RuntimeError, match="write failed"):
+        asyncio.run(
+            refresh.run_pipeline_refresh(
+                iter(_records() * 10),
+                collection="cards",
+                target_collection="chunks",
+                chunk_templates={None: "{name}"},
+                es=None,
+                derived_fields=[],
+                batch_size=1,
+                concurrency=CONCURRENCY,
+            )
+        )
+
+
+def test_refresh_surfaces_one_error_when_stages_fail_together() -> None:
+    invalid = ValueError("bad record")
+    group = ExceptionGroup(
+        "stages failed", [RuntimeError("write failed"), invalid, OSError()]
+    )
+
+    assert refresh._surfaced_error(group) is invalid
+    assert isinstance(
+        refresh._surfaced_error(ExceptionGroup("", [OSError(), RuntimeError()])),
+        OSError,
+    )
+
+
+def test_refresh_counts_cards_failing_validation_as_index_failures(
+    monkeypatch, stages
+) -> None:
+    def model_validate(card):
+        if card["name"] == "Ponder":
+            raise ValidationError.from_exception_data("ScryfallCardRecord", [])
+        return card
+
+    monkeypatch.setattr(
+        refresh, "ScryfallCardRecord", MagicMock(model_validate=model_validate)
+    )
+    index_cards = AsyncMock(side_effect=lambda cards, _es: (len(cards), 0))
+    monkeypatch.setattr(refresh, "index_cards", index_cards)
+
+    result = asyncio.run(
+        refresh.run_pipeline_refresh(
+            iter(_records()),
+            collection="cards",
+            target_collection="chunks",
+            chunk_templates={None: "{name}"},
+            es=MagicMock(),
+            derived_fields=[],
+            concurrency=CONCURRENCY,
+        )
+    )
+
+    assert (result.indexed, result.index_failed) == (3, 1)
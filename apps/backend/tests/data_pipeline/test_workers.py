@@ -0,0 +1,106 @@
+import threading
+from multiprocessing.pool import ThreadPool
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.data_pipeline import workers
+from app.data_pipeline.workers import BoundedImap, WorkerPoolPlan
+
+
+def test_bounded_imap_limits_items_read_ahead_of_workers() -> None:
+    release = threading.Event()
+    pulled: list[int] = []
+
+    def items():
+        for item in range(20):
+            pulled.append(item)
+            yield item
+
+    def work(item: int) -> int:
+        release.wait()
+        return item * 2
+
+    with ThreadPool(processes=2) as pool:
+        bounded = BoundedImap(pool, work, items(), max_in_flight=3)
+        results = iter(bounded)
+        reader = threading.Thread(target=lambda: next(results))
+        reader.start()
+        reader.join(timeout=0.2)
+
+        # Workers are blocked, so the window stays full and reading stops
+        assert pulled == [0, 1, 2]
+        release.set()
+        reader.join()
+        rest = list(results)
+
+    assert len(rest) == 19
+    assert bounded.stats.submitted == 20
+    assert bounded.stats.peak_depth == 3
+
+
+def test_bounded_imap_returns_all_results_and_reraises_worker_errors() -> None:
+    def work(item: int) -> int:
+        if item == 3:
+            raise ValueError("bad batch")
+        return item
+
+    with ThreadPool(processes=2) as pool:
+        assert sorted(BoundedImap(pool, str, range(5), max_in_flight=2)) == list(
+            "01234"
+        )
+        with pytest.raises(ValueError, match="bad batch"):
+            list(BoundedImap(pool, work, range(5), max_in_flight=2))
+
+
+def test_bounded_imap_rejects_an_empty_window() -> None:
+    with ThreadPool(processes=1) as pool, pytest.raises(ValueError):
+        BoundedImap(pool, str, [], max_in_flight=0)
+
+
+def test_plan_worker_pool_divides_cores_between_workers(monkeypatch) -> None:
+    monkeypatch.setattr(workers, "available_cpus", lambda: 8)
+    monkeypatch.setattr(workers, "cgroup_memory_limit", lambda: None)
+
+    assert workers.plan_worker_pool(max_workers=2) == WorkerPoolPlan(
+        processes=2, threads_per_worker=4
+    )
+    assert workers.plan_worker_pool() == WorkerPoolPlan(
+        processes=8, threads_per_worker=1
+    )
+
+
+def test_plan_worker_pool_fits_workers_in_the_memory_limit(monkeypatch) -> None:
+    monkeypatch.setattr(workers, "available_cpus", lambda: 8)
+    monkeypatch.setattr(workers, "cgroup_memory_limit", lambda: 3 * 2**30)
+
+    assert workers.plan_worker_pool(
+        max_workers=8, memory_per_worker_mb=1024
+    ) == WorkerPoolPlan(processes=3, threads_per_worker=2)
+    assert workers.plan_worker_pool(memory_per_worker_mb=8192) == WorkerPoolPlan(
+        processes=1, threads_per_worker=8
+    )
+
+
+def test_initialize_worker_leaves_the_model_to_the_first_task(monkeypatch) -> None:
+    import torch
+
+    from app.core.embeddings import utils
+
+    # A pool respawns workers whose initializer raises, so a failing model load
+    # there would hang the run instead of failing it
+    def _fail() -> None:
+        raise RuntimeError("model download failed")
+
+    monkeypatch.setattr(utils, "get_embedding_provider", _fail)
+    monkeypatch.setattr(
+        workers, "embedding_settings", SimpleNamespace(provider="sentence_transformers")
+    )
+    monkeypatch.setenv("OMP_NUM_THREADS", "")
+    monkeypatch.setenv("MKL_NUM_THREADS", "")
+    reset = MagicMock()
+
+    workers.initialize_worker(torch.get_num_threads(), reset, True)
+
+    reset.assert_called_once_with()